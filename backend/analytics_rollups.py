@@ -0,0 +1,337 @@
+"""
+Hourly and daily rollups of order and reservation activity.
+
+Every order and reservation event is folded into four ``analytics_rollups``
+documents: its hour and its day, for its restaurant and for the platform.
+Each document counts orders, reservations, covers, paid revenue and
+cancellations. Activity is bucketed by the booking's ``created_at`` in UTC,
+so a later payment or cancellation lands in the bucket of the booking it
+belongs to. That is also what makes the backfill exact.
+
+Every increment also bumps the bucket's ``touch`` counter. The backfill reads
+those counters before it aggregates and only overwrites a bucket whose counter
+has not moved since, so live increments are never lost to a rebuild; a bucket
+touched mid-rebuild is rebuilt again on its own.
+
+A date range is answered by summing whole-day buckets for the full days it
+covers and hourly buckets for the partial days at either end. A year is at
+most a few hundred small documents, however many orders it contains.
+"""
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+PLATFORM_SCOPE = "platform"
+METRICS = (
+    "orders",
+    "reservations",
+    "covers",
+    "order_revenue",
+    "reservation_revenue",
+    "order_cancellations",
+    "reservation_cancellations",
+)
+MAX_HOURLY_SERIES_HOURS = 31 * 24
+
+
+def bucket_keys(created_at) -> Tuple[str, str]:
+    if isinstance(created_at, datetime):
+        created_at = created_at.astimezone(timezone.utc).isoformat()
+    return created_at[:13], created_at[:10]
+
+
+def cancellation_delta(old_status: Optional[str], new_status: Optional[str]) -> int:
+    return int(new_status == "CANCELLED") - int(old_status == "CANCELLED")
+
+
+def parse_range_bound(value: str, end: bool = False) -> datetime:
+    """Hour-precision UTC bound; a date-only end bound includes that whole day."""
+    try:
+        if len(value) == 10:
+            parsed = datetime.combine(date.fromisoformat(value), datetime.min.time(), timezone.utc)
+            return parsed + timedelta(days=1) if end else parsed
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    parsed = parsed.astimezone(timezone.utc)
+    floored = parsed.replace(minute=0, second=0, microsecond=0)
+    # An end bound inside an hour includes that hour
+    return floored + timedelta(hours=1) if end and floored != parsed else floored
+
+
+def plan_buckets(start: datetime, end: datetime) -> Tuple[List[str], List[str]]:
+    """Cover [start, end) with as many whole days as possible and hours at the edges."""
+    days, hours = [], []
+    cursor = start
+    while cursor < end:
+        if cursor.hour == 0 and cursor + timedelta(days=1) <= end:
+            days.append(cursor.date().isoformat())
+            cursor += timedelta(days=1)
+        else:
+            hours.append(cursor.strftime("%Y-%m-%dT%H"))
+            cursor += timedelta(hours=1)
+    return days, hours
+
+
+def empty_totals() -> Dict[str, float]:
+    return {metric: 0 for metric in METRICS}
+
+
+def next_bucket(grain: str, bucket: str) -> str:
+    if grain == "hour":
+        return (datetime.strptime(bucket, "%Y-%m-%dT%H") + timedelta(hours=1)).strftime("%Y-%m-%dT%H")
+    return (date.fromisoformat(bucket) + timedelta(days=1)).isoformat()
+
+
+def touch_filter(bucket_id: str, touch: Optional[int]) -> dict:
+    # A bucket that had no counter (or did not exist) must still have none
+    return {"_id": bucket_id, "touch": touch if touch is not None else {"$exists": False}}
+
+
+class AnalyticsRollups:
+    def __init__(self):
+        self.backfill_state = {"running": False, "started_at": None, "finished_at": None, "buckets_written": 0, "error": None}
+
+    async def _apply(self, db, restaurant_id: Optional[str], created_at, inc: Dict[str, float]):
+        inc = {metric: value for metric, value in inc.items() if value}
+        if not inc:
+            return
+        hour, day = bucket_keys(created_at)
+        scopes = [PLATFORM_SCOPE] + ([restaurant_id] if restaurant_id else [])
+        ops = [
+            UpdateOne(
+                {"_id": f"{grain}:{scope}:{bucket}"},
+                {"$inc": {**inc, "touch": 1}, "$setOnInsert": {"grain": grain, "scope": scope, "bucket": bucket}},
+                upsert=True
+            )
+            for scope in scopes
+            for grain, bucket in (("hour", hour), ("day", day))
+        ]
+        try:
+            await db.analytics_rollups.bulk_write(ops, ordered=False)
+        except Exception as e:
+            # Rollups are derived data; the backfill repairs a missed increment
+            logger.error(f"Analytics rollup update failed: {str(e)}")
+
+    # Domain event hooks, called by the routes after their write succeeds
+
+    async def order_created(self, db, order: dict):
+        await self._apply(db, order['restaurant_id'], order['created_at'], {
+            "orders": 1,
+            "order_revenue": order.get('total_amount', 0) if order.get('payment_status') == "paid" else 0,
+            "order_cancellations": int(order.get('status') == "CANCELLED"),
+        })
+
+    async def order_paid(self, db, order: dict):
+        await self._apply(db, order['restaurant_id'], order['created_at'], {"order_revenue": order.get('total_amount', 0)})
+
+    async def order_status_changed(self, db, order: dict, old_status: Optional[str], new_status: str):
+        await self._apply(db, order['restaurant_id'], order['created_at'], {
+            "order_cancellations": cancellation_delta(old_status, new_status)
+        })
+
+    async def reservation_created(self, db, reservation: dict):
+        await self._apply(db, reservation['restaurant_id'], reservation['created_at'], {
+            "reservations": 1,
+            "covers": reservation.get('party_size', 0),
+        })
+
+    async def reservation_paid(self, db, reservation: dict):
+        await self._apply(db, reservation['restaurant_id'], reservation['created_at'], {
+            "reservation_revenue": reservation.get('amount', 0)
+        })
+
+    async def reservation_status_changed(self, db, reservation: dict, old_status: Optional[str], new_status: str):
+        await self._apply(db, reservation['restaurant_id'], reservation['created_at'], {
+            "reservation_cancellations": cancellation_delta(old_status, new_status)
+        })
+
+    async def query(self, db, scope: str, start: datetime, end: datetime, granularity: str = "day") -> dict:
+        if granularity == "hour":
+            if end - start > timedelta(hours=MAX_HOURLY_SERIES_HOURS):
+                raise ValueError("Hourly series are limited to 31 days")
+            days, hours = [], []
+            cursor = start
+            while cursor < end:
+                hours.append(cursor.strftime("%Y-%m-%dT%H"))
+                cursor += timedelta(hours=1)
+        else:
+            days, hours = plan_buckets(start, end)
+
+        clauses = []
+        if days:
+            clauses.append({"grain": "day", "bucket": {"$gte": days[0], "$lte": days[-1]}})
+        if hours:
+            clauses.append({"grain": "hour", "bucket": {"$in": hours}})
+        rows = await db.analytics_rollups.find(
+            {"scope": scope, "$or": clauses},
+            {"_id": 0, "scope": 0, "generation": 0, "touch": 0}
+        ).to_list(None) if clauses else []
+
+        totals = empty_totals()
+        series: Dict[str, Dict[str, float]] = {}
+        for row in rows:
+            # Partial days at the range edges are folded into their day
+            key = row['bucket'] if granularity == "hour" else row['bucket'][:10]
+            point = series.setdefault(key, empty_totals())
+            for metric in METRICS:
+                value = row.get(metric, 0)
+                point[metric] += value
+                totals[metric] += value
+
+        totals['revenue'] = totals['order_revenue'] + totals['reservation_revenue']
+        return {
+            "scope": scope,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "granularity": granularity,
+            "totals": totals,
+            "series": [{"bucket": key, **series[key]} for key in sorted(series)],
+        }
+
+    async def _aggregate(self, db, match: dict) -> Dict[Tuple[str, str, str], Dict[str, float]]:
+        """Every (grain, scope, bucket) the matching orders and reservations fold into."""
+        hourly: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+        def add(restaurant_id, hour, inc):
+            for scope in (PLATFORM_SCOPE, restaurant_id):
+                bucket = hourly.setdefault((scope, hour), empty_totals())
+                for metric, value in inc.items():
+                    bucket[metric] += value or 0
+
+        order_rows = await db.orders.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {"restaurant_id": "$restaurant_id", "hour": {"$substr": ["$created_at", 0, 13]}},
+                "orders": {"$sum": 1},
+                "order_revenue": {"$sum": {"$cond": [{"$eq": ["$payment_status", "paid"]}, "$total_amount", 0]}},
+                "order_cancellations": {"$sum": {"$cond": [{"$eq": ["$status", "CANCELLED"]}, 1, 0]}},
+            }}
+        ]).to_list(None)
+        for row in order_rows:
+            add(row['_id']['restaurant_id'], row['_id']['hour'], {
+                "orders": row['orders'],
+                "order_revenue": row['order_revenue'],
+                "order_cancellations": row['order_cancellations'],
+            })
+
+        reservation_rows = await db.reservations.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {"restaurant_id": "$restaurant_id", "hour": {"$substr": ["$created_at", 0, 13]}},
+                "reservations": {"$sum": 1},
+                "covers": {"$sum": "$party_size"},
+                "reservation_revenue": {"$sum": {"$cond": [{"$eq": ["$payment_status", "paid"]}, "$amount", 0]}},
+                "reservation_cancellations": {"$sum": {"$cond": [{"$eq": ["$status", "CANCELLED"]}, 1, 0]}},
+            }}
+        ]).to_list(None)
+        for row in reservation_rows:
+            add(row['_id']['restaurant_id'], row['_id']['hour'], {
+                "reservations": row['reservations'],
+                "covers": row['covers'],
+                "reservation_revenue": row['reservation_revenue'],
+                "reservation_cancellations": row['reservation_cancellations'],
+            })
+
+        buckets: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+        for (scope, hour), values in hourly.items():
+            buckets[("hour", scope, hour)] = values
+            day = buckets.setdefault(("day", scope, hour[:10]), empty_totals())
+            for metric in METRICS:
+                day[metric] += values[metric]
+        return buckets
+
+    async def _write(self, db, ops) -> int:
+        try:
+            result = await db.analytics_rollups.bulk_write(ops, ordered=False)
+            return result.matched_count + result.upserted_count
+        except BulkWriteError as e:
+            # An upsert raced a live increment that created the bucket first
+            return e.details.get('nMatched', 0) + e.details.get('nUpserted', 0)
+
+    async def _rebuild_bucket(self, db, bucket_id: str, generation: int, attempts: int) -> bool:
+        grain, scope, bucket = bucket_id.split(":", 2)
+        match = {"created_at": {"$gte": bucket, "$lt": next_bucket(grain, bucket)}}
+        if scope != PLATFORM_SCOPE:
+            match["restaurant_id"] = scope
+        for _ in range(attempts):
+            current = await db.analytics_rollups.find_one({"_id": bucket_id}, {"touch": 1})
+            touch = current.get('touch') if current else None
+            values = (await self._aggregate(db, match)).get((grain, scope, bucket))
+            if values is None:
+                if current is None or (await db.analytics_rollups.delete_one(touch_filter(bucket_id, touch))).deleted_count:
+                    return True
+                continue
+            try:
+                result = await db.analytics_rollups.update_one(
+                    touch_filter(bucket_id, touch),
+                    {"$set": {"grain": grain, "scope": scope, "bucket": bucket, "generation": generation, **values}},
+                    upsert=current is None
+                )
+            except DuplicateKeyError:
+                continue
+            if result.matched_count or result.upserted_id is not None:
+                return True
+        return False
+
+    async def backfill(self, db, batch_size: int = 1000, attempts: int = 5) -> int:
+        """Rebuild every bucket from the orders and reservations collections."""
+        # Read before aggregating: a counter that moves after this point may
+        # belong to a booking change the aggregation did not see
+        touched = {
+            row['_id']: row.get('touch')
+            for row in await db.analytics_rollups.find({}, {"_id": 1, "touch": 1}).to_list(None)
+        }
+        buckets = await self._aggregate(db, {})
+
+        # Buckets are overwritten in place and stale ones removed afterwards,
+        # so readers never see an empty collection mid-backfill
+        generation = int(datetime.now(timezone.utc).timestamp() * 1000)
+        written = 0
+        ops = []
+        for (grain, scope, bucket), values in buckets.items():
+            bucket_id = f"{grain}:{scope}:{bucket}"
+            ops.append(UpdateOne(
+                touch_filter(bucket_id, touched.pop(bucket_id, None)),
+                {"$set": {"grain": grain, "scope": scope, "bucket": bucket, "generation": generation, **values}},
+                upsert=True
+            ))
+            if len(ops) >= batch_size:
+                written += await self._write(db, ops)
+                ops = []
+        if ops:
+            written += await self._write(db, ops)
+
+        # Buckets no booking maps to any more; touched ones fall through to the retry below
+        stale = [DeleteOne(touch_filter(bucket_id, touch)) for bucket_id, touch in touched.items()]
+        for i in range(0, len(stale), batch_size):
+            await db.analytics_rollups.bulk_write(stale[i:i + batch_size], ordered=False)
+
+        # Anything without this generation was touched mid-rebuild or created by a live increment
+        conflicts = await db.analytics_rollups.find({"generation": {"$ne": generation}}, {"_id": 1}).to_list(None)
+        unresolved = 0
+        for row in conflicts:
+            if await self._rebuild_bucket(db, row['_id'], generation, attempts):
+                written += 1
+            else:
+                unresolved += 1
+        if unresolved:
+            logger.warning(f"Analytics backfill left {unresolved} busy buckets to the next run")
+        return written
+
+    async def run_backfill(self, db):
+        self.backfill_state.update(running=True, started_at=datetime.now(timezone.utc).isoformat(), finished_at=None, error=None)
+        try:
+            self.backfill_state['buckets_written'] = await self.backfill(db)
+        except Exception as e:
+            logger.error(f"Analytics backfill failed: {str(e)}")
+            self.backfill_state['error'] = str(e)
+        finally:
+            self.backfill_state.update(running=False, finished_at=datetime.now(timezone.utc).isoformat())
@@ -0,0 +1,140 @@
+"""
+Bounded executor for bcrypt password hashing and verification.
+
+bcrypt is deliberately slow, so running it inline in an async handler stalls
+every other request on the worker. All password work is submitted here
+instead: a fixed-size thread or process pool with a bounded number of pending
+jobs. Once the pool and queue are full, new work is refused immediately with
+AuthCryptoSaturated so callers can shed load (the API answers 503).
+"""
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+
+class AuthCryptoSaturated(Exception):
+    pass
+
+
+def _timed_hash(password: bytes, rounds: int):
+    import bcrypt
+    started = time.monotonic()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+    return started, time.monotonic(), hashed
+
+
+def _timed_check(password: bytes, password_hash: bytes):
+    import bcrypt
+    started = time.monotonic()
+    try:
+        matched = bcrypt.checkpw(password, password_hash)
+    except ValueError:
+        matched = False
+    return started, time.monotonic(), matched
+
+
+def hash_cost(password_hash: str) -> Optional[int]:
+    # bcrypt hashes look like $2b$12$<salt+digest>
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class _Timings:
+    """Running totals plus a window of recent samples for percentiles."""
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.recent)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3) if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": pct(50),
+            "p99_ms": pct(99),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class AuthCryptoExecutor:
+    def __init__(self, workers: int = 4, max_queue: int = 64, rounds: int = 12, mode: str = "thread"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.mode = mode
+        self._pool = None
+        self._in_flight = 0
+        self.rejected = 0
+        self.queue_wait = _Timings()
+        self.hash_time = _Timings()
+        self.verify_time = _Timings()
+
+    def _executor(self):
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="auth-crypto")
+        return self._pool
+
+    async def _submit(self, fn, *args):
+        if self._in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise AuthCryptoSaturated()
+        self._in_flight += 1
+        submitted = time.monotonic()
+        try:
+            started, finished, result = await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+        finally:
+            self._in_flight -= 1
+        self.queue_wait.observe(max(started - submitted, 0.0))
+        return finished - started, result
+
+    async def hash_password(self, password: str) -> str:
+        elapsed, hashed = await self._submit(_timed_hash, password.encode('utf-8'), self.rounds)
+        self.hash_time.observe(elapsed)
+        return hashed
+
+    async def verify_password(self, password: str, password_hash: str) -> bool:
+        elapsed, matched = await self._submit(_timed_check, password.encode('utf-8'), password_hash.encode('utf-8'))
+        self.verify_time.observe(elapsed)
+        return matched
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        cost = hash_cost(password_hash)
+        return cost is not None and cost != self.rounds
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "bcrypt_rounds": self.rounds,
+            "in_flight": self._in_flight,
+            "rejected": self.rejected,
+            "queue_wait": self.queue_wait.summary(),
+            "hash_time": self.hash_time.summary(),
+            "verify_time": self.verify_time.summary(),
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,192 @@
+"""
+In-process availability calendar for table reservations.
+
+Each cached restaurant holds a compact days x slots matrix of remaining seats
+backed by a single ``array('i')``. A matrix is built with one aggregation over
+``reservations`` and then kept current by applying seat deltas whenever a
+reservation is created or changes status, so browsing dates does not hit Mongo.
+"""
+import sys
+from array import array
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+# Reservations in these states hold seats (mirrors check_availability)
+ACTIVE_RESERVATION_STATUSES = ["PENDING_PAYMENT", "CONFIRMED", "SEATED"]
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_time_minutes(time_str: str) -> Optional[int]:
+    try:
+        hours, minutes = time_str.split(":")[:2]
+        total = int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        return None
+    if 0 <= total < MINUTES_PER_DAY:
+        return total
+    return None
+
+
+def reservation_seat_delta(old_status: Optional[str], new_status: Optional[str], party_size: int) -> int:
+    was_active = old_status in ACTIVE_RESERVATION_STATUSES
+    is_active = new_status in ACTIVE_RESERVATION_STATUSES
+    if was_active == is_active:
+        return 0
+    return party_size if is_active else -party_size
+
+
+class RestaurantCalendar:
+    """Remaining seats for one restaurant, row-major by day then slot."""
+
+    __slots__ = ("restaurant_id", "start", "days", "slot_length", "slots_per_day", "capacity", "seats")
+
+    def __init__(self, restaurant_id: str, start: date, days: int, slot_length: int, capacity: int):
+        self.restaurant_id = restaurant_id
+        self.start = start
+        self.days = days
+        self.slot_length = slot_length
+        self.slots_per_day = -(-MINUTES_PER_DAY // slot_length)
+        self.capacity = capacity
+        self.seats = array('i', [capacity]) * (days * self.slots_per_day)
+
+    def _index(self, day: str, time_str: str) -> Optional[int]:
+        try:
+            offset = (date.fromisoformat(day) - self.start).days
+        except (TypeError, ValueError):
+            return None
+        minutes = parse_time_minutes(time_str)
+        if minutes is None or not 0 <= offset < self.days:
+            return None
+        return offset * self.slots_per_day + minutes // self.slot_length
+
+    def book(self, day: str, time_str: str, seats: int):
+        index = self._index(day, time_str)
+        if index is not None:
+            self.seats[index] -= seats
+
+    def covers(self, start: date, days: int) -> bool:
+        return self.start <= start and start + timedelta(days=days) <= self.start + timedelta(days=self.days)
+
+    def slot_labels(self) -> List[str]:
+        return [f"{(i * self.slot_length) // 60:02d}:{(i * self.slot_length) % 60:02d}" for i in range(self.slots_per_day)]
+
+    def rows(self, start: date, days: int) -> List[List[int]]:
+        first = (start - self.start).days
+        width = self.slots_per_day
+        return [self.seats[(first + d) * width:(first + d + 1) * width].tolist() for d in range(days)]
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.seats)
+
+
+class AvailabilityCalendarCache:
+    """LRU of RestaurantCalendar entries bounded by entry count and total bytes."""
+
+    def __init__(self, horizon_days: int = 42, max_restaurants: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        self.horizon_days = horizon_days
+        self.max_restaurants = max_restaurants
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, RestaurantCalendar]" = OrderedDict()
+        # Builds in flight per restaurant. Changes are only versioned while a
+        # build is running, so a build that raced with a write is not cached
+        # and neither dict outlives the builds that need it
+        self._loading: Dict[str, int] = {}
+        self._versions: Dict[str, int] = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, restaurant_id: str, start: date, days: int) -> Optional[RestaurantCalendar]:
+        entry = self._entries.get(restaurant_id)
+        if entry is None or not entry.covers(start, days):
+            return None
+        self._entries.move_to_end(restaurant_id)
+        self.hits += 1
+        return entry
+
+    async def load(self, db, restaurant: dict, start: date, days: int) -> RestaurantCalendar:
+        self.misses += 1
+        restaurant_id = restaurant['restaurant_id']
+        self._loading[restaurant_id] = self._loading.get(restaurant_id, 0) + 1
+        try:
+            return await self._build(db, restaurant, start, days)
+        finally:
+            self._loading[restaurant_id] -= 1
+            if not self._loading[restaurant_id]:
+                del self._loading[restaurant_id]
+                self._versions.pop(restaurant_id, None)
+
+    async def _build(self, db, restaurant: dict, start: date, days: int) -> RestaurantCalendar:
+        restaurant_id = restaurant['restaurant_id']
+        version = self._versions.get(restaurant_id, 0)
+        calendar = RestaurantCalendar(
+            restaurant_id,
+            start,
+            max(days, self.horizon_days),
+            max(int(restaurant.get('slot_length_minutes') or 60), 1),
+            int(restaurant.get('seat_capacity', 20)),
+        )
+        end = start + timedelta(days=calendar.days)
+        pipeline = [
+            {"$match": {
+                "restaurant_id": restaurant_id,
+                "date": {"$gte": start.isoformat(), "$lt": end.isoformat()},
+                "status": {"$in": ACTIVE_RESERVATION_STATUSES}
+            }},
+            {"$group": {"_id": {"date": "$date", "time": "$time"}, "seats": {"$sum": "$party_size"}}}
+        ]
+        async for row in db.reservations.aggregate(pipeline):
+            calendar.book(row['_id']['date'], row['_id']['time'], row['seats'])
+
+        if self._versions.get(restaurant_id, 0) == version:
+            self._store(calendar)
+        return calendar
+
+    def _store(self, calendar: RestaurantCalendar):
+        self.invalidate(calendar.restaurant_id)
+        self._entries[calendar.restaurant_id] = calendar
+        self._total_bytes += calendar.nbytes
+        while self._entries and (len(self._entries) > self.max_restaurants or self._total_bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _changed(self, restaurant_id: str):
+        if restaurant_id in self._loading:
+            self._versions[restaurant_id] = self._versions.get(restaurant_id, 0) + 1
+
+    def apply_delta(self, restaurant_id: str, day: str, time_str: str, seats: int):
+        if not seats:
+            return
+        self._changed(restaurant_id)
+        entry = self._entries.get(restaurant_id)
+        if entry is not None:
+            entry.book(day, time_str, seats)
+
+    def invalidate(self, restaurant_id: str):
+        self._changed(restaurant_id)
+        entry = self._entries.pop(restaurant_id, None)
+        if entry is not None:
+            self._total_bytes -= entry.nbytes
+
+    def clear(self):
+        for restaurant_id in list(self._entries):
+            self.invalidate(restaurant_id)
+
+    def memory_report(self) -> dict:
+        return {
+            "restaurants": len(self._entries),
+            "total_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_restaurants": self.max_restaurants,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "per_restaurant": {
+                restaurant_id: {"bytes": entry.nbytes, "from": entry.start.isoformat(), "days": entry.days}
+                for restaurant_id, entry in self._entries.items()
+            }
+        }
@@ -0,0 +1,303 @@
+"""
+In-process benchmark of the API hot paths.
+
+Boots the FastAPI app through httpx.ASGITransport against a throwaway
+database on a local mongod, seeds it at the configured volumes, then drives
+each scenario with a fixed number of requests at a fixed concurrency and
+reports throughput and p50/p95/p99 latency. Results are written as JSON and,
+given a baseline file, compared against it: a scenario regresses when its p95
+grows or its throughput drops by more than the tolerance. The exit status is
+1 when anything regressed, so the run can gate CI.
+
+    python benchmarks/bench_api.py --output bench.json --baseline benchmarks/baseline.json
+    python benchmarks/bench_api.py --save-baseline benchmarks/baseline.json
+
+Volumes and load default from BENCH_* environment variables.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MONGO_URL = os.environ.get('BENCH_MONGO_URL', 'mongodb://localhost:27017')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose p95 or throughput moved past the tolerance in the bad direction."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if previous["throughput_rps"] and current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+    return regressions
+
+
+async def seed(server, volumes: dict) -> dict:
+    rng = random.Random(42)
+    db = server.db
+    now = datetime.now(timezone.utc)
+    password_hash = await server.hash_password("bench-password")
+
+    def user(role, i):
+        return {
+            "user_id": str(uuid.uuid4()), "email": f"{role}{i}@bench.test", "name": f"{role.title()} {i}",
+            "phone": "", "role": role, "status": "active", "password_hash": password_hash,
+            "created_at": (now - timedelta(days=rng.randint(0, 365))).isoformat(),
+        }
+
+    customers = [user("customer", i) for i in range(volumes["users"])]
+    owners = [user("restaurant", i) for i in range(volumes["restaurants"])]
+    admin = user("admin", 0)
+    await db.users.insert_many(customers + owners + [admin])
+
+    restaurants, categories, items = [], [], []
+    for i, owner in enumerate(owners):
+        restaurant_id = str(uuid.uuid4())
+        restaurants.append({
+            "restaurant_id": restaurant_id, "owner_id": owner["user_id"], "name": f"Bench Bistro {i}",
+            "description": "", "cuisine": rng.choice(["Indian", "Italian", "Chinese"]), "address": "", "phone": "",
+            "hours": "9-23", "service_type": "both", "is_veg": True, "is_non_veg": True, "seat_capacity": 40,
+            "slot_length_minutes": 60, "image_url": "", "status": "active", "created_at": now.isoformat(),
+        })
+        restaurant_categories = [
+            {"category_id": str(uuid.uuid4()), "restaurant_id": restaurant_id, "name": f"Category {c}", "display_order": c}
+            for c in range(5)
+        ]
+        categories.extend(restaurant_categories)
+        for n in range(volumes["menu_items"]):
+            items.append({
+                "item_id": str(uuid.uuid4()), "restaurant_id": restaurant_id,
+                "category_id": restaurant_categories[n % 5]["category_id"], "name": f"Item {n}", "description": "",
+                "price": float(rng.randint(100, 900)), "is_veg": n % 2 == 0, "is_available": True,
+            })
+    await db.restaurants.insert_many(restaurants)
+    await db.menu_categories.insert_many(categories)
+    await db.menu_items.insert_many(items)
+
+    menu_by_restaurant = {}
+    for item in items:
+        menu_by_restaurant.setdefault(item["restaurant_id"], []).append(item)
+
+    orders = []
+    for _ in range(volumes["orders"]):
+        restaurant = rng.choice(restaurants)
+        lines = [
+            {"item_id": item["item_id"], "name": item["name"], "price": item["price"], "quantity": rng.randint(1, 3)}
+            for item in rng.sample(menu_by_restaurant[restaurant["restaurant_id"]], 2)
+        ]
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+        orders.append({
+            "order_id": str(uuid.uuid4()), "user_id": rng.choice(customers)["user_id"],
+            "restaurant_id": restaurant["restaurant_id"], "items": lines,
+            "total_amount": sum(line["price"] * line["quantity"] for line in lines),
+            "status": rng.choice(["PLACED", "PREPARING", "DELIVERED", "CANCELLED"]), "payment_method": "COD",
+            "payment_status": "paid", "delivery_address": "", "delivery_phone": "",
+            "created_at": created.isoformat(), "updated_at": created.isoformat(),
+        })
+    if orders:
+        await db.orders.insert_many(orders)
+
+    reservations = []
+    for _ in range(volumes["reservations"]):
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+        reservations.append({
+            "reservation_id": str(uuid.uuid4()), "user_id": rng.choice(customers)["user_id"],
+            "restaurant_id": rng.choice(restaurants)["restaurant_id"],
+            "date": (now + timedelta(days=rng.randint(0, 30))).date().isoformat(),
+            "time": f"{rng.randint(11, 22)}:00", "party_size": rng.randint(1, 6), "amount": 0,
+            "status": rng.choice(["PENDING", "CONFIRMED", "CANCELLED"]), "payment_status": "paid",
+            "created_at": created.isoformat(),
+        })
+    if reservations:
+        await db.reservations.insert_many(reservations)
+
+    await server.ensure_indexes()
+    return {"customers": customers, "restaurants": restaurants, "menu": menu_by_restaurant, "admin": admin}
+
+
+def scenarios(server, data: dict):
+    rng = random.Random(7)
+    restaurants = data["restaurants"]
+    customer_tokens = [
+        server.issue_tokens(c["user_id"], c["email"], c["name"], "customer").token for c in data["customers"][:50]
+    ]
+    admin = data["admin"]
+    admin_headers = {"Authorization": f"Bearer {server.issue_tokens(admin['user_id'], admin['email'], admin['name'], 'admin').token}"}
+
+    def restaurant_id():
+        return rng.choice(restaurants)["restaurant_id"]
+
+    def create_order():
+        restaurant = restaurant_id()
+        item = data["menu"][restaurant][0]
+        return ("POST", "/api/orders", {
+            "json": {
+                "restaurant_id": restaurant,
+                "items": [{"item_id": item["item_id"], "name": item["name"], "price": item["price"], "quantity": 1}],
+                "delivery_address": "1 Bench Street", "delivery_phone": "", "payment_method": "COD",
+            },
+            "headers": {"Authorization": f"Bearer {rng.choice(customer_tokens)}"},
+        })
+
+    return {
+        "restaurants_list": lambda: ("GET", "/api/restaurants", {}),
+        "restaurant_menu": lambda: ("GET", f"/api/restaurants/{restaurant_id()}/menu", {}),
+        "restaurant_reviews": lambda: ("GET", f"/api/restaurants/{restaurant_id()}/reviews", {}),
+        "availability_calendar": lambda: ("GET", f"/api/restaurants/{restaurant_id()}/availability/calendar", {"params": {"days": 14}}),
+        "order_create": create_order,
+        "admin_dashboard": lambda: ("GET", "/api/admin/dashboard/stats", {"headers": admin_headers}),
+        "admin_restaurants": lambda: ("GET", "/api/admin/restaurants", {"headers": admin_headers, "params": {"page_size": 50}}),
+        "admin_orders": lambda: ("GET", "/api/admin/orders", {"headers": admin_headers, "params": {"limit": 50}}),
+        "admin_reservations": lambda: ("GET", "/api/admin/reservations", {"headers": admin_headers, "params": {"limit": 50}}),
+        "admin_users": lambda: ("GET", "/api/admin/users", {"headers": admin_headers, "params": {"limit": 50}}),
+    }
+
+
+async def run_scenario(client, make_request, requests: int, concurrency: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        method, path, kwargs = make_request()
+        await client.request(method, path, **kwargs)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        method, path, kwargs = make_request()
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run(args) -> dict:
+    import httpx
+    import pymongo
+
+    db_name = f"dinedash_bench_{uuid.uuid4().hex[:8]}"
+    os.environ['MONGO_URL'] = args.mongo_url
+    os.environ['DB_NAME'] = db_name
+    os.environ.setdefault('BCRYPT_ROUNDS', '4')
+    import server
+
+    # Hermetic: no calls out to the email provider
+    async def skip_email(recipient_email, subject, html_content):
+        return None
+    server.send_email_notification = skip_email
+
+    volumes = {
+        "users": args.users, "restaurants": args.restaurants, "menu_items": args.menu_items,
+        "orders": args.orders, "reservations": args.reservations,
+    }
+    try:
+        started = time.perf_counter()
+        data = await seed(server, volumes)
+        print(f"Seeded {volumes} in {time.perf_counter() - started:.1f}s")
+
+        selected = scenarios(server, data)
+        if args.only:
+            selected = {name: selected[name] for name in args.only.split(",")}
+        results = {}
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, make_request in selected.items():
+                results[name] = await run_scenario(client, make_request, args.requests, args.concurrency, args.warmup)
+                r = results[name]
+                print(
+                    f"{name:24} {r['throughput_rps']:>8.1f} req/s  p50 {r['p50_ms']:>7.2f}ms  "
+                    f"p95 {r['p95_ms']:>7.2f}ms  p99 {r['p99_ms']:>7.2f}ms  errors {r['errors']}"
+                )
+    finally:
+        pymongo.MongoClient(args.mongo_url).drop_database(db_name)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "volumes": volumes,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the DineDash API in-process")
+    parser.add_argument("--mongo-url", default=MONGO_URL)
+    parser.add_argument("--users", type=int, default=int(os.environ.get('BENCH_USERS', '500')))
+    parser.add_argument("--restaurants", type=int, default=int(os.environ.get('BENCH_RESTAURANTS', '50')))
+    parser.add_argument("--menu-items", type=int, default=int(os.environ.get('BENCH_MENU_ITEMS', '30')))
+    parser.add_argument("--orders", type=int, default=int(os.environ.get('BENCH_ORDERS', '5000')))
+    parser.add_argument("--reservations", type=int, default=int(os.environ.get('BENCH_RESERVATIONS', '2000')))
+    parser.add_argument("--requests", type=int, default=int(os.environ.get('BENCH_REQUESTS', '300')))
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get('BENCH_CONCURRENCY', '20')))
+    parser.add_argument("--warmup", type=int, default=int(os.environ.get('BENCH_WARMUP', '10')))
+    parser.add_argument("--only", help="Comma-separated scenario names")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare against this results JSON")
+    parser.add_argument("--save-baseline", help="Write results JSON here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=float(os.environ.get('BENCH_TOLERANCE', '0.2')))
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(report["results"], baseline.get("results", {}), args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Cold-start benchmark: import time and time to first response.
+
+Each run is a fresh interpreter that imports ``server``, builds an app with
+``create_app()`` and serves one request through httpx.ASGITransport. The
+request is ``GET /metrics``, which touches no database, so no mongod is
+needed unless --lifespan is given. With --lifespan the run also goes through
+the app's startup and shutdown (index creation, background workers) against
+BENCH_MONGO_URL.
+
+Medians over --runs are written as JSON and, given a baseline, compared:
+a phase regresses when its median grows by more than the tolerance.
+
+    python benchmarks/bench_startup.py --runs 10 --output startup.json --baseline benchmarks/startup_baseline.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+MONGO_URL = os.environ.get('BENCH_MONGO_URL', 'mongodb://localhost:27017')
+
+# Runs in the child interpreter; prints one JSON line of phase timings in ms
+CHILD = r"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+app = server.create_app()
+created = time.perf_counter()
+
+async def first_request():
+    import httpx
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        response = await client.get("/metrics")
+        assert response.status_code == 200, response.status_code
+
+async def serve():
+    if "--lifespan" not in sys.argv:
+        ready = time.perf_counter()
+        await first_request()
+        return ready
+    async with server.lifespan(app):
+        ready = time.perf_counter()
+        await first_request()
+    return ready
+
+ready = asyncio.run(serve())
+responded = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "startup_ms": (ready - created) * 1000,
+    "time_to_first_response_ms": (responded - started) * 1000,
+}))
+"""
+
+
+def run_once(lifespan: bool, mongo_url: str) -> dict:
+    db_name = f"dinedash_startup_{uuid.uuid4().hex[:8]}"
+    env = {**os.environ, "MONGO_URL": mongo_url, "DB_NAME": db_name}
+    args = [sys.executable, "-c", CHILD] + (["--lifespan"] if lifespan else [])
+    try:
+        result = subprocess.run(args, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+    finally:
+        if lifespan:
+            import pymongo
+            pymongo.MongoClient(mongo_url).drop_database(db_name)
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize_runs(runs: list) -> dict:
+    return {
+        phase: {
+            "median_ms": round(statistics.median(run[phase] for run in runs), 2),
+            "min_ms": round(min(run[phase] for run in runs), 2),
+            "max_ms": round(max(run[phase] for run in runs), 2),
+        }
+        for phase in runs[0]
+    }
+
+
+def compare_startup(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for phase, current in results.items():
+        previous = baseline.get(phase)
+        # Sub-millisecond phases are noise
+        if previous and previous["median_ms"] >= 1 and current["median_ms"] > previous["median_ms"] * (1 + tolerance):
+            regressions.append(f"{phase}: median {previous['median_ms']}ms -> {current['median_ms']}ms")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure DineDash API cold start")
+    parser.add_argument("--runs", type=int, default=int(os.environ.get('BENCH_STARTUP_RUNS', '5')))
+    parser.add_argument("--lifespan", action="store_true", help="Include startup/shutdown against a local mongod")
+    parser.add_argument("--mongo-url", default=MONGO_URL)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare against this results JSON")
+    parser.add_argument("--save-baseline", help="Write results JSON here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=float(os.environ.get('BENCH_TOLERANCE', '0.2')))
+    args = parser.parse_args(argv)
+
+    runs = [run_once(args.lifespan, args.mongo_url) for _ in range(args.runs)]
+    results = summarize_runs(runs)
+    for phase, values in results.items():
+        print(f"{phase:28} median {values['median_ms']:>8.1f}ms  min {values['min_ms']:>8.1f}ms  max {values['max_ms']:>8.1f}ms")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "lifespan": args.lifespan,
+        },
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare_startup(results, baseline.get("results", {}), args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Background cascade deletion of restaurants and users.
+
+The admin routes only mark the entity as ``deleting`` and enqueue a job in
+``deletion_jobs``. A worker then walks the job's plan: dependent documents
+are deleted, or anonymized where they are financial records that must be
+kept, in bounded batches with a pause between batches so the cascade never
+competes with foreground traffic. The entity document itself goes last.
+
+Every step selects only documents that still need work, so a job that is
+interrupted is simply claimed again after its lease expires and resumes.
+Per-step counts are recorded on the job for the status endpoint.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+DELETED_USER_ID = "deleted-user"
+
+
+class Step:
+    def __init__(self, name: str, collection: str, query: dict, update: Optional[dict] = None):
+        self.name = name
+        self.collection = collection
+        self.query = query
+        # None deletes the matching documents, otherwise they are updated in place
+        self.update = update
+
+
+def restaurant_steps(restaurant_id: str) -> List[Step]:
+    prefix = f"restaurant:{restaurant_id}:"
+    return [
+        Step(prefix + "menu_items", "menu_items", {"restaurant_id": restaurant_id}),
+        Step(prefix + "menu_categories", "menu_categories", {"restaurant_id": restaurant_id}),
+        Step(prefix + "reviews", "reviews", {"restaurant_id": restaurant_id}),
+        Step(prefix + "favorites", "favorites", {"restaurant_id": restaurant_id}),
+        Step(prefix + "reservation_slots", "reservation_slots", {"restaurant_id": restaurant_id}),
+        Step(prefix + "sales_insights", "sales_insights", {"_id": restaurant_id}),
+        # Orders and reservations are kept for accounting, flagged as belonging to a removed restaurant
+        Step(prefix + "orders", "orders", {"restaurant_id": restaurant_id, "restaurant_deleted": {"$ne": True}},
+             {"$set": {"restaurant_deleted": True}}),
+        Step(prefix + "reservations", "reservations", {"restaurant_id": restaurant_id, "restaurant_deleted": {"$ne": True}},
+             {"$set": {"restaurant_deleted": True}}),
+        Step(prefix + "restaurant", "restaurants", {"restaurant_id": restaurant_id}),
+    ]
+
+
+def user_steps(user_id: str) -> List[Step]:
+    prefix = f"user:{user_id}:"
+    return [
+        Step(prefix + "favorites", "favorites", {"user_id": user_id}),
+        # Reviews still count towards ratings; they just stop pointing at the person
+        Step(prefix + "reviews", "reviews", {"user_id": user_id}, {"$set": {"user_id": DELETED_USER_ID}}),
+        Step(prefix + "orders", "orders", {"user_id": user_id},
+             {"$set": {"user_id": DELETED_USER_ID, "delivery_address": "", "delivery_phone": "", "notes": None}}),
+        Step(prefix + "reservations", "reservations", {"user_id": user_id}, {"$set": {"user_id": DELETED_USER_ID}}),
+        Step(prefix + "payment_transactions", "payment_transactions", {"user_id": user_id},
+             {"$set": {"user_id": DELETED_USER_ID, "metadata.user_id": DELETED_USER_ID}}),
+        Step(prefix + "user", "users", {"user_id": user_id}),
+    ]
+
+
+class DeletionJobs:
+    def __init__(
+        self,
+        batch_size: int = 500,
+        pause_seconds: float = 0.05,
+        lease_seconds: float = 300.0,
+        poll_interval: float = 5.0,
+    ):
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_interval = poll_interval
+        self._wake = asyncio.Event()
+
+    async def create(self, db, entity_type: str, entity_id: str) -> dict:
+        existing = await db.deletion_jobs.find_one(
+            {"entity_type": entity_type, "entity_id": entity_id, "status": {"$in": ["pending", "running"]}},
+            {"_id": 0}
+        )
+        if existing:
+            return existing
+        now = datetime.now(timezone.utc).isoformat()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "status": "pending",
+            "current_step": None,
+            "progress": {},
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+        }
+        await db.deletion_jobs.insert_one(dict(job))
+        self._wake.set()
+        return job
+
+    async def plan(self, db, job: dict) -> List[Step]:
+        if job['entity_type'] == "restaurant":
+            return restaurant_steps(job['entity_id'])
+        # A restaurant owner's restaurants go before the owner
+        restaurant_ids = await db.restaurants.distinct("restaurant_id", {"owner_id": job['entity_id']})
+        steps = []
+        for restaurant_id in restaurant_ids:
+            steps.extend(restaurant_steps(restaurant_id))
+        return steps + user_steps(job['entity_id'])
+
+    async def _claim(self, db) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await db.deletion_jobs.find_one_and_update(
+            {
+                "status": {"$in": ["pending", "running"]},
+                "$or": [{"lease_until": {"$lte": now.isoformat()}}, {"lease_until": {"$exists": False}}],
+            },
+            {"$set": {"status": "running", "lease_until": (now + self.lease).isoformat(), "updated_at": now.isoformat()}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run_step(self, db, job_id: str, step: Step) -> int:
+        collection = db[step.collection]
+        processed = 0
+        while True:
+            ids = [doc['_id'] for doc in await collection.find(step.query, {"_id": 1}).limit(self.batch_size).to_list(self.batch_size)]
+            if not ids:
+                return processed
+            if step.update is None:
+                result = await collection.delete_many({"_id": {"$in": ids}})
+                count = result.deleted_count
+            else:
+                result = await collection.update_many({"_id": {"$in": ids}}, step.update)
+                count = result.modified_count
+            processed += count
+            now = datetime.now(timezone.utc)
+            await db.deletion_jobs.update_one(
+                {"job_id": job_id},
+                {
+                    "$inc": {f"progress.{step.collection}": count},
+                    "$set": {"current_step": step.name, "lease_until": (now + self.lease).isoformat(), "updated_at": now.isoformat()}
+                }
+            )
+            if self.pause_seconds:
+                await asyncio.sleep(self.pause_seconds)
+
+    async def run_job(self, db, job: dict):
+        try:
+            for step in await self.plan(db, job):
+                await self._run_step(db, job['job_id'], step)
+        except Exception as e:
+            logger.error(f"Deletion job {job['job_id']} failed: {str(e)}")
+            await db.deletion_jobs.update_one(
+                {"job_id": job['job_id']},
+                {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.now(timezone.utc).isoformat()},
+                 "$unset": {"lease_until": ""}}
+            )
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        await db.deletion_jobs.update_one(
+            {"job_id": job['job_id']},
+            {"$set": {"status": "completed", "current_step": None, "updated_at": now, "finished_at": now},
+             "$unset": {"lease_until": ""}}
+        )
+
+    async def run_forever(self, db):
+        while True:
+            self._wake.clear()
+            try:
+                while True:
+                    job = await self._claim(db)
+                    if job is None:
+                        break
+                    await self.run_job(db, job)
+            except Exception as e:
+                logger.error(f"Deletion worker failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def retry(self, db, job_id: str) -> bool:
+        result = await db.deletion_jobs.update_one(
+            {"job_id": job_id, "status": "failed"},
+            {"$set": {"status": "pending", "error": None, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        )
+        self._wake.set()
+        return result.modified_count == 1
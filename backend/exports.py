@@ -0,0 +1,83 @@
+"""
+Streaming CSV/NDJSON exports of orders, reservations and payment transactions.
+
+Rows are read from a Motor cursor in fixed-size batches and encoded one
+batch at a time, so memory stays flat however many rows match. With gzip on,
+the stream goes through one incremental compressor and the client receives
+a ``.gz`` file.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, List
+
+# Export name -> (collection, id field, CSV columns)
+EXPORTS: Dict[str, tuple] = {
+    "orders": ("orders", "order_id", [
+        "order_id", "created_at", "restaurant_id", "user_id", "status", "payment_method", "payment_status",
+        "total_amount", "items", "delivery_address", "delivery_phone", "notes", "updated_at",
+    ]),
+    "reservations": ("reservations", "reservation_id", [
+        "reservation_id", "created_at", "restaurant_id", "user_id", "date", "time", "party_size",
+        "amount", "status", "payment_status",
+    ]),
+    "transactions": ("payment_transactions", "transaction_id", [
+        "transaction_id", "created_at", "session_id", "restaurant_id", "user_id", "payment_type",
+        "reference_id", "amount", "currency", "payment_status", "updated_at",
+    ]),
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_batch(rows: List[dict], columns: List[str], fmt: str, header: bool = False) -> bytes:
+    if fmt == "ndjson":
+        return "".join(json.dumps(row, default=_json_default) + "\n" for row in rows).encode("utf-8")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(row.get(column)) for column in columns])
+    return buffer.getvalue().encode("utf-8")
+
+
+async def stream_export(cursor, columns: List[str], fmt: str, gzip: bool = False, batch_size: int = 1000) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    batch: List[dict] = []
+    first = True
+
+    def emit(rows, header):
+        data = encode_batch(rows, columns, fmt, header=header)
+        return compressor.compress(data) if compressor else data
+
+    async for row in cursor:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            chunk = emit(batch, first)
+            first = False
+            batch = []
+            if chunk:
+                yield chunk
+    if batch or first:
+        chunk = emit(batch, first)
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
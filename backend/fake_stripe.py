@@ -0,0 +1,150 @@
+"""
+Local stand-in for the parts of the Stripe API the backend uses.
+
+Lets checkout and payment-status flows run (and be load-tested) offline:
+
+    uvicorn fake_stripe:app --port 12111
+    STRIPE_API_BASE=http://localhost:12111 uvicorn server:app --port 8001
+
+Sessions live in memory. Visiting a session's url marks it paid and redirects
+to its success_url; FAKE_STRIPE_AUTO_PAY_SECONDS marks sessions paid on their
+own after a delay, and FAKE_STRIPE_LATENCY_MS adds artificial latency. If
+FAKE_STRIPE_WEBHOOK_URL is set, a checkout.session.completed event signed with
+FAKE_STRIPE_WEBHOOK_SECRET is posted there on payment; the backend rejects
+webhooks unless STRIPE_WEBHOOK_SECRET is set to the same value.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import re
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import RedirectResponse
+
+LATENCY_MS = float(os.environ.get('FAKE_STRIPE_LATENCY_MS', '0'))
+AUTO_PAY_SECONDS = float(os.environ.get('FAKE_STRIPE_AUTO_PAY_SECONDS', '-1'))
+WEBHOOK_URL = os.environ.get('FAKE_STRIPE_WEBHOOK_URL')
+WEBHOOK_SECRET = os.environ.get('FAKE_STRIPE_WEBHOOK_SECRET')
+
+app = FastAPI(title="Fake Stripe")
+sessions = {}
+
+_BRACKET_KEY = re.compile(r"[^\[\]]+")
+
+
+def parse_stripe_form(items) -> dict:
+    # Turns line_items[0][price_data][currency]=inr back into nested dicts
+    root = {}
+    for key, value in items:
+        parts = _BRACKET_KEY.findall(key)
+        node = root
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return root
+
+
+def session_view(session: dict) -> dict:
+    if session['payment_status'] == "unpaid" and 0 <= AUTO_PAY_SECONDS <= time.time() - session['created']:
+        mark_paid(session)
+    return {key: value for key, value in session.items() if not key.startswith('_')}
+
+
+def mark_paid(session: dict):
+    if session['payment_status'] == "paid":
+        return
+    session['status'] = "complete"
+    session['payment_status'] = "paid"
+    if WEBHOOK_URL:
+        asyncio.get_running_loop().create_task(send_webhook(session))
+
+
+async def send_webhook(session: dict):
+    event = {
+        "id": f"evt_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "created": int(time.time()),
+        "data": {"object": {key: value for key, value in session.items() if not key.startswith('_')}},
+    }
+    payload = json.dumps(event).encode('utf-8')
+    headers = {"Content-Type": "application/json"}
+    if WEBHOOK_SECRET:
+        timestamp = str(int(time.time()))
+        signature = hmac.new(WEBHOOK_SECRET.encode('utf-8'), f"{timestamp}.".encode('utf-8') + payload, hashlib.sha256).hexdigest()
+        headers["Stripe-Signature"] = f"t={timestamp},v1={signature}"
+    async with httpx.AsyncClient() as client:
+        await client.post(WEBHOOK_URL, content=payload, headers=headers)
+
+
+async def simulated_latency():
+    if LATENCY_MS > 0:
+        await asyncio.sleep(LATENCY_MS / 1000)
+
+
+@app.post("/v1/checkout/sessions")
+async def create_session(request: Request):
+    await simulated_latency()
+    form = parse_stripe_form((await request.form()).multi_items())
+    line_items = form.get('line_items', {})
+    amount_total = 0
+    currency = "usd"
+    for item in line_items.values():
+        price = item.get('price_data', {})
+        amount_total += int(price.get('unit_amount', 0)) * int(item.get('quantity', 1))
+        currency = price.get('currency', currency)
+
+    session_id = f"cs_test_{uuid.uuid4().hex}"
+    session = {
+        "id": session_id,
+        "object": "checkout.session",
+        "url": f"{str(request.base_url).rstrip('/')}/pay/{session_id}",
+        "mode": form.get('mode', "payment"),
+        "status": "open",
+        "payment_status": "unpaid",
+        "amount_total": amount_total,
+        "currency": currency,
+        "metadata": form.get('metadata', {}),
+        "success_url": form.get('success_url'),
+        "cancel_url": form.get('cancel_url'),
+        "created": int(time.time()),
+    }
+    sessions[session_id] = session
+    return session_view(session)
+
+
+@app.get("/v1/checkout/sessions/{session_id}")
+async def retrieve_session(session_id: str):
+    await simulated_latency()
+    session = sessions.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail={"error": {"message": f"No such checkout.session: {session_id}"}})
+    return session_view(session)
+
+
+@app.get("/pay/{session_id}")
+async def pay(session_id: str):
+    session = sessions.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Unknown session")
+    mark_paid(session)
+    return RedirectResponse((session['success_url'] or "/").replace("{CHECKOUT_SESSION_ID}", session_id))
+
+
+@app.post("/v1/test/sessions/{session_id}/pay")
+async def pay_for_test(session_id: str):
+    session = sessions.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Unknown session")
+    mark_paid(session)
+    return session_view(session)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get('FAKE_STRIPE_PORT', '12111')))
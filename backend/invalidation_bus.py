@@ -0,0 +1,203 @@
+"""
+Cross-worker cache invalidation over a MongoDB capped collection.
+
+Every worker keeps its own in-process caches (availability calendars, the
+revocation list). A worker that changes an entity updates its own caches in
+place and publishes an ``(entity, entity_id, version)`` event to a capped
+collection. Every worker tails that collection with a tailable cursor and runs
+the handlers subscribed to the entity, which evict or refresh their copy.
+Events a worker published itself are skipped. ``version`` is the publishing
+worker's sequence number, so an operator can see how far each worker got.
+
+Staleness is bounded, not best effort:
+
+* ``caught_up_at`` is the wall-clock time up to which every published event
+  has been applied. An empty await on the cursor moves it to the time that
+  getMore was sent. An applied event moves it to the event's publish time.
+  ``lag()`` is the time since ``caught_up_at``.
+* While ``lag()`` exceeds ``max_staleness``, ``is_fresh()`` is false and
+  callers read through to the database instead of their cache.
+* When the cursor dies, the worker cannot tell what it missed. The capped
+  collection may have wrapped past it, or the connection may have dropped. It
+  runs the reset handlers, which drop whole caches, then resumes from
+  ``replay_seconds`` before the reset. Replaying a few events twice is
+  harmless; the replay window covers clock skew between workers.
+
+Nothing is published until ``ensure_collection`` has found or created the
+capped collection, so a disabled bus writes nothing. A process that never
+starts the subscriber (a test, a benchmark, a single worker with the bus
+disabled) is always fresh, because no other writer can make its caches stale
+without it knowing.
+"""
+import asyncio
+import inspect
+import itertools
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationBus:
+    def __init__(
+        self,
+        collection_name: str = "cache_invalidations",
+        size_bytes: int = 16 * 1024 * 1024,
+        max_staleness: float = 5.0,
+        replay_seconds: float = 5.0,
+        await_seconds: float = 1.0,
+        retry_interval: float = 1.0,
+    ):
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self.max_staleness = max_staleness
+        self.replay_seconds = replay_seconds
+        self.await_seconds = await_seconds
+        self.retry_interval = retry_interval
+        self.worker_id = uuid.uuid4().hex[:12]
+        self._sequence = itertools.count(1)
+        self._handlers: Dict[str, List[Callable]] = {}
+        self._reset_handlers: List[Callable] = []
+        self.started = False
+        # Set by ensure_collection; until then publish is a no-op so that a
+        # disabled bus never creates an ordinary, unbounded collection
+        self.ready = False
+        self.caught_up_at: Optional[float] = None
+        self.published = 0
+        self.publish_failures = 0
+        self.applied = 0
+        self.handler_failures = 0
+        self.resets = 0
+        self.tail_failures = 0
+        self.last_delivery_seconds: Optional[float] = None
+
+    def subscribe(self, entity: str, handler: Callable):
+        """Run ``handler(entity_id)`` for each event about ``entity`` from another worker; may be async."""
+        self._handlers.setdefault(entity, []).append(handler)
+
+    def on_reset(self, handler: Callable):
+        """Run ``handler()`` when events may have been missed; it should drop the whole cache."""
+        self._reset_handlers.append(handler)
+
+    async def ensure_collection(self, db):
+        try:
+            await db.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass
+        collection = db[self.collection_name]
+        options = await collection.options()
+        if not options.get("capped"):
+            raise RuntimeError(
+                f"{self.collection_name} exists but is not capped; drop it so the invalidation bus can create it")
+        # A tailable cursor on an empty capped collection is closed immediately
+        if await collection.find_one({}, {"_id": 1}) is None:
+            await collection.insert_one(self._event("bus", "created"))
+        self.ready = True
+
+    def _event(self, entity: str, entity_id: str) -> dict:
+        return {
+            "entity": entity,
+            "entity_id": entity_id,
+            "version": next(self._sequence),
+            "origin": self.worker_id,
+            "published_at": datetime.now(timezone.utc),
+        }
+
+    async def publish(self, db, entity: str, entity_id: str):
+        if not self.ready:
+            return
+        # The write being announced has already succeeded; a lost event is
+        # covered by the periodic resyncs and by other workers' staleness bound
+        try:
+            await db[self.collection_name].insert_one(self._event(entity, entity_id))
+            self.published += 1
+        except Exception as e:
+            self.publish_failures += 1
+            logger.error(f"Invalidation publish failed for {entity} {entity_id}: {str(e)}")
+
+    async def _call(self, handler, *args):
+        try:
+            result = handler(*args)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            self.handler_failures += 1
+            logger.error(f"Invalidation handler failed: {str(e)}")
+
+    async def apply(self, event: dict):
+        published_at = event["published_at"]
+        if published_at.tzinfo is None:
+            published_at = published_at.replace(tzinfo=timezone.utc)
+        published_ts = published_at.timestamp()
+        if event.get("origin") != self.worker_id:
+            for handler in self._handlers.get(event.get("entity"), ()):
+                await self._call(handler, event["entity_id"])
+            self.applied += 1
+        self.last_delivery_seconds = max(time.time() - published_ts, 0.0)
+        self.caught_up_at = max(self.caught_up_at or published_ts, published_ts)
+
+    async def reset(self) -> float:
+        """Drop every subscribed cache; returns the time events must be replayed from."""
+        self.resets += 1
+        reset_at = time.time()
+        for handler in self._reset_handlers:
+            await self._call(handler)
+        self.caught_up_at = max(self.caught_up_at or reset_at, reset_at)
+        return reset_at - self.replay_seconds
+
+    def lag(self) -> float:
+        if self.caught_up_at is None:
+            return 0.0 if not self.started else float("inf")
+        return max(time.time() - self.caught_up_at, 0.0)
+
+    def is_fresh(self) -> bool:
+        return not self.started or self.lag() <= self.max_staleness
+
+    async def tail(self, db, since: float):
+        cursor = db[self.collection_name].find(
+            {"published_at": {"$gte": datetime.fromtimestamp(since, timezone.utc)}},
+            cursor_type=CursorType.TAILABLE_AWAIT,
+        ).max_await_time_ms(int(self.await_seconds * 1000))
+        while cursor.alive:
+            polled_at = time.time()
+            try:
+                event = await cursor.next()
+            except StopAsyncIteration:
+                # Nothing published before this getMore was sent is still unseen
+                self.caught_up_at = max(self.caught_up_at or polled_at, polled_at)
+                continue
+            await self.apply(event)
+
+    async def run_forever(self, db):
+        self.started = True
+        since = time.time()
+        self.caught_up_at = since
+        while True:
+            try:
+                await self.tail(db, since)
+            except Exception as e:
+                self.tail_failures += 1
+                logger.error(f"Invalidation bus tail failed: {str(e)}")
+            await asyncio.sleep(self.retry_interval)
+            since = await self.reset()
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "fresh": self.is_fresh(),
+            "lag_seconds": round(self.lag(), 3),
+            "max_staleness_seconds": self.max_staleness,
+            "last_delivery_seconds": self.last_delivery_seconds,
+            "published": self.published,
+            "publish_failures": self.publish_failures,
+            "applied": self.applied,
+            "handler_failures": self.handler_failures,
+            "resets": self.resets,
+            "tail_failures": self.tail_failures,
+        }
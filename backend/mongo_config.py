@@ -0,0 +1,82 @@
+"""
+Per-workload MongoDB settings.
+
+The API issues three kinds of database work with different needs:
+
+* catalog reads (restaurants, menus, reviews) tolerate slightly stale data
+  and can be served by secondaries, optionally bounded by ``maxStalenessSeconds``;
+* admin analytics and listings are heavy, so they get their own connection
+  pool (they cannot starve the request path) and an operation timeout that
+  PyMongo sends to the server as ``maxTimeMS``;
+* order and payment writes must survive a primary failover, so they are
+  acknowledged with majority write concern.
+
+These helpers turn the environment strings into driver options; server.py
+builds one client per pool and one database handle per workload from them.
+"""
+from typing import Optional
+
+from pymongo import WriteConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+# The server rejects smaller maxStalenessSeconds values
+MIN_MAX_STALENESS_SECONDS = 90
+
+
+def read_preference(mode: str, max_staleness_seconds: int = -1):
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference {mode!r}; expected one of {', '.join(READ_PREFERENCES)}")
+    if mode == "primary":
+        return Primary()
+    if max_staleness_seconds != -1 and max_staleness_seconds < MIN_MAX_STALENESS_SECONDS:
+        raise ValueError(f"max staleness must be -1 (unbounded) or at least {MIN_MAX_STALENESS_SECONDS} seconds")
+    return READ_PREFERENCES[mode](max_staleness=max_staleness_seconds)
+
+
+def write_concern(w: str, wtimeout_ms: int = 0, journal: Optional[bool] = None) -> WriteConcern:
+    return WriteConcern(
+        w=int(w) if w.isdigit() else w,
+        wtimeout=wtimeout_ms or None,
+        j=journal,
+    )
+
+
+def client_options(
+    max_pool_size: int,
+    min_pool_size: int = 0,
+    max_idle_time_ms: int = 0,
+    wait_queue_timeout_ms: int = 0,
+    timeout_ms: int = 0,
+    appname: Optional[str] = None,
+) -> dict:
+    """Keyword arguments for AsyncIOMotorClient; zero leaves an option at the driver default."""
+    options = {"maxPoolSize": max_pool_size, "minPoolSize": min_pool_size}
+    if max_idle_time_ms:
+        options["maxIdleTimeMS"] = max_idle_time_ms
+    if wait_queue_timeout_ms:
+        options["waitQueueTimeoutMS"] = wait_queue_timeout_ms
+    if timeout_ms:
+        options["timeoutMS"] = timeout_ms
+    if appname:
+        options["appname"] = appname
+    return options
+
+
+def describe_workload(pool: str, preference=None, concern: Optional[WriteConcern] = None, timeout_ms: int = 0) -> dict:
+    preference = preference or Primary()
+    concern = concern.document if concern else {}
+    return {
+        "pool": pool,
+        "read_preference": preference.mongos_mode,
+        "max_staleness_seconds": getattr(preference, "max_staleness", -1),
+        "write_concern": str(concern.get("w", "default")),
+        "wtimeout_ms": concern.get("wtimeout", 0),
+        "timeout_ms": timeout_ms,
+    }
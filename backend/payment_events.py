@@ -0,0 +1,146 @@
+"""
+Journal of verified Stripe webhook events.
+
+The webhook route only verifies the signature and inserts the raw event into
+``payment_events``, keyed by Stripe's event id, before answering 200. Stripe's
+retries of an event that is already journaled hit the unique index and are
+acknowledged without doing any work. A consumer task then applies journaled
+events oldest first, through a handler that must be idempotent.
+
+Event fields are never rewritten; the consumer only records its own progress
+(``applied_at``, ``attempts``, ``last_error``) next to them. Clearing
+``applied_at`` puts events back in the queue, which is how the journal is
+replayed for recovery.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from payment_gateway import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentEventJournal:
+    def __init__(
+        self,
+        apply_event: Callable[[dict], Awaitable[None]],
+        lease_seconds: float = 60.0,
+        max_attempts: int = 10,
+        idle_interval: float = 5.0,
+    ):
+        self.apply_event = apply_event
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.idle_interval = idle_interval
+        self._wake = asyncio.Event()
+        self.recorded = 0
+        self.duplicates = 0
+        self.applied = 0
+        self.failures = 0
+        self.replayed = 0
+        self.last_applied_at: Optional[datetime] = None
+
+    async def record(self, db, event: WebhookEvent) -> bool:
+        """Journal a verified event; returns False if it was already journaled."""
+        doc = {
+            "event_id": event.event_id,
+            "event_type": event.event_type,
+            "session_id": event.session_id,
+            "payment_status": event.payment_status,
+            "payload": json.dumps(event.payload),
+            "received_at": datetime.now(timezone.utc).isoformat(),
+            "applied_at": None,
+            "attempts": 0,
+        }
+        try:
+            await db.payment_events.insert_one(doc)
+        except DuplicateKeyError:
+            self.duplicates += 1
+            return False
+        self.recorded += 1
+        self._wake.set()
+        return True
+
+    async def _claim(self, db) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await db.payment_events.find_one_and_update(
+            {
+                "applied_at": None,
+                "attempts": {"$lt": self.max_attempts},
+                "$or": [{"lease_until": {"$lte": now.isoformat()}}, {"lease_until": {"$exists": False}}],
+            },
+            {"$set": {"lease_until": (now + self.lease).isoformat()}, "$inc": {"attempts": 1}},
+            sort=[("received_at", 1), ("_id", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def drain(self, db) -> int:
+        applied = 0
+        while True:
+            event = await self._claim(db)
+            if event is None:
+                return applied
+            try:
+                await self.apply_event(event)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Applying payment event {event['event_id']} failed: {str(e)}")
+                await db.payment_events.update_one({"_id": event["_id"]}, {"$set": {"last_error": str(e)}})
+                # Later events for other sessions should not wait behind a broken one
+                continue
+            now = datetime.now(timezone.utc)
+            await db.payment_events.update_one(
+                {"_id": event["_id"]},
+                {"$set": {"applied_at": now.isoformat(), "last_error": None}, "$unset": {"lease_until": ""}}
+            )
+            self.applied += 1
+            self.last_applied_at = now
+            applied += 1
+
+    async def run_forever(self, db):
+        while True:
+            self._wake.clear()
+            try:
+                await self.drain(db)
+            except Exception as e:
+                logger.error(f"Payment event consumer failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.idle_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def replay(self, db, since: Optional[str] = None, session_id: Optional[str] = None) -> int:
+        query = {}
+        if since:
+            query["received_at"] = {"$gte": since}
+        if session_id:
+            query["session_id"] = session_id
+        result = await db.payment_events.update_many(
+            query,
+            {"$set": {"applied_at": None, "attempts": 0}, "$unset": {"lease_until": "", "last_error": ""}}
+        )
+        self.replayed += result.modified_count
+        self._wake.set()
+        return result.modified_count
+
+    async def backlog(self, db) -> dict:
+        pending = await db.payment_events.count_documents({"applied_at": None, "attempts": {"$lt": self.max_attempts}})
+        dead = await db.payment_events.count_documents({"applied_at": None, "attempts": {"$gte": self.max_attempts}})
+        return {"pending": pending, "dead_lettered": dead}
+
+    def stats(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "duplicates": self.duplicates,
+            "applied": self.applied,
+            "failures": self.failures,
+            "replayed": self.replayed,
+            "max_attempts": self.max_attempts,
+            "last_applied_at": self.last_applied_at.isoformat() if self.last_applied_at else None,
+        }
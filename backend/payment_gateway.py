@@ -0,0 +1,274 @@
+"""
+Stripe Checkout gateway with one pooled HTTP client for the app's lifetime.
+
+All payment calls go through a single keep-alive httpx.AsyncClient, so TLS
+setup is paid once per connection rather than once per request. Each call has
+its own timeout, and a circuit breaker stops hammering Stripe while it is
+failing. STRIPE_API_BASE can point at fake_stripe.py for offline load tests.
+"""
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+import httpx
+
+
+class PaymentGatewayError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class PaymentGatewayUnavailable(PaymentGatewayError):
+    pass
+
+
+@dataclass
+class CheckoutSession:
+    session_id: str
+    url: str
+
+
+@dataclass
+class CheckoutStatus:
+    status: str
+    payment_status: str
+    amount_total: int
+    currency: str
+    metadata: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class WebhookEvent:
+    event_id: str
+    event_type: str
+    session_id: Optional[str]
+    payment_status: Optional[str]
+    metadata: Dict[str, str] = field(default_factory=dict)
+    payload: dict = field(default_factory=dict)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial call through after reset_timeout."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_in_flight):
+            raise PaymentGatewayUnavailable("Payment provider circuit is open")
+        if state == "half_open":
+            self.trial_in_flight = True
+
+    def release_trial(self):
+        # The trial call ended without an answer (cancelled, or a bug); let the next call retry
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+
+
+def _form_encode(prefix: str, value, out: list):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _form_encode(f"{prefix}[{key}]" if prefix else key, item, out)
+    elif isinstance(value, (list, tuple)):
+        for index, item in enumerate(value):
+            _form_encode(f"{prefix}[{index}]", item, out)
+    elif value is not None:
+        out.append((prefix, str(value)))
+
+
+class PaymentGateway:
+    def __init__(
+        self,
+        api_key: Optional[str],
+        api_base: str = "https://api.stripe.com",
+        webhook_secret: Optional[str] = None,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip('/')
+        self.webhook_secret = webhook_secret
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.calls = 0
+        self.errors = 0
+        self.total_latency = 0.0
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_base,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, path: str, timeout: Optional[float] = None, **kwargs) -> dict:
+        self.breaker.before_call()
+        self.calls += 1
+        started = time.monotonic()
+        try:
+            response = await self._http().request(method, path, timeout=timeout or self.timeout, **kwargs)
+        except httpx.HTTPError as e:
+            self.errors += 1
+            self.breaker.record_failure()
+            raise PaymentGatewayUnavailable(f"Payment provider request failed: {e.__class__.__name__}")
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+        finally:
+            self.total_latency += time.monotonic() - started
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self.errors += 1
+            self.breaker.record_failure()
+            raise PaymentGatewayUnavailable(f"Payment provider returned {response.status_code}", response.status_code)
+        # A 4xx is our request's fault, not a sign the provider is down
+        self.breaker.record_success()
+        if response.status_code >= 400:
+            self.errors += 1
+            try:
+                message = response.json().get('error', {}).get('message', response.text)
+            except ValueError:
+                message = response.text
+            raise PaymentGatewayError(message, response.status_code)
+        return response.json()
+
+    async def create_checkout_session(
+        self,
+        amount: float,
+        currency: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: Optional[Dict[str, str]] = None,
+        product_name: str = "DineDash Reserve",
+        timeout: Optional[float] = None,
+    ) -> CheckoutSession:
+        form = []
+        _form_encode("", {
+            "mode": "payment",
+            "success_url": success_url,
+            "cancel_url": cancel_url,
+            "line_items": [{
+                "price_data": {
+                    "currency": currency,
+                    "product_data": {"name": product_name},
+                    "unit_amount": int(round(amount * 100)),
+                },
+                "quantity": 1,
+            }],
+            "metadata": metadata or {},
+        }, form)
+        data = await self._request(
+            "POST",
+            "/v1/checkout/sessions",
+            timeout=timeout,
+            content=urlencode(form),
+            headers={"Content-Type": "application/x-www-form-urlencoded", "Idempotency-Key": str(uuid.uuid4())},
+        )
+        return CheckoutSession(session_id=data['id'], url=data['url'])
+
+    async def get_checkout_status(self, session_id: str, timeout: Optional[float] = None) -> CheckoutStatus:
+        data = await self._request("GET", f"/v1/checkout/sessions/{session_id}", timeout=timeout)
+        return CheckoutStatus(
+            status=data.get('status') or "",
+            payment_status=data.get('payment_status') or "",
+            amount_total=data.get('amount_total') or 0,
+            currency=data.get('currency') or "",
+            metadata=data.get('metadata') or {},
+        )
+
+    def verify_signature(self, payload: bytes, signature: Optional[str], tolerance: int = 300):
+        # Without a secret anyone could post a "paid" event, so webhooks are refused
+        if not self.webhook_secret:
+            raise PaymentGatewayError("Webhook signing secret is not configured", 503)
+        if not signature:
+            raise PaymentGatewayError("Missing Stripe-Signature header", 400)
+        parts = {}
+        for item in signature.split(','):
+            key, _, value = item.partition('=')
+            parts.setdefault(key.strip(), []).append(value.strip())
+        timestamp = (parts.get('t') or [""])[0]
+        expected = hmac.new(
+            self.webhook_secret.encode('utf-8'),
+            f"{timestamp}.".encode('utf-8') + payload,
+            hashlib.sha256
+        ).hexdigest()
+        if not any(hmac.compare_digest(expected, candidate) for candidate in parts.get('v1', [])):
+            raise PaymentGatewayError("Invalid webhook signature", 400)
+        if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > tolerance:
+            raise PaymentGatewayError("Webhook timestamp outside tolerance", 400)
+
+    def handle_webhook(self, payload: bytes, signature: Optional[str]) -> WebhookEvent:
+        self.verify_signature(payload, signature)
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            raise PaymentGatewayError("Invalid webhook payload", 400)
+        obj = (event.get('data') or {}).get('object') or {}
+        return WebhookEvent(
+            event_id=event.get('id') or "",
+            event_type=event.get('type') or "",
+            session_id=obj.get('id'),
+            payment_status=obj.get('payment_status'),
+            metadata=obj.get('metadata') or {},
+            payload=event,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "api_base": self.api_base,
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+            "consecutive_failures": self.breaker.failures,
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.total_latency / self.calls * 1000, 3) if self.calls else 0.0,
+            "pool_open": self._client is not None and not self._client.is_closed,
+        }
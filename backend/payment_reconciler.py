@@ -0,0 +1,180 @@
+"""
+Background reconciliation of pending Stripe checkout sessions.
+
+Instead of calling Stripe from every payment-status page load, a single worker
+scans ``payment_transactions`` that are still pending, checks them against the
+gateway at a controlled rate and hands paid sessions to a confirmation
+callback that applies the order/reservation updates exactly once.
+
+Transactions are claimed with a short lease on ``next_check_at`` so several
+workers can run reconcilers without checking the same session twice, and
+unpaid sessions are re-checked with exponential backoff. The status endpoint
+can nudge a session to the front of the queue and long-poll on StatusWaiters.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from payment_gateway import PaymentGatewayError, PaymentGatewayUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+class StatusWaiters:
+    """In-process wake-ups for long-polling status requests."""
+
+    def __init__(self):
+        self._events: Dict[str, asyncio.Event] = {}
+
+    def notify(self, session_id: str):
+        event = self._events.pop(session_id, None)
+        if event is not None:
+            event.set()
+
+    async def wait(self, session_id: str, timeout: float) -> bool:
+        event = self._events.setdefault(session_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if not event.is_set() and self._events.get(session_id) is event:
+                self._events.pop(session_id, None)
+
+
+class PaymentReconciler:
+    def __init__(
+        self,
+        gateway,
+        on_paid: Callable[[str], Awaitable[Optional[dict]]],
+        batch_size: int = 50,
+        checks_per_second: float = 5.0,
+        interval: float = 10.0,
+        max_age_hours: float = 48.0,
+        lease_seconds: float = 60.0,
+        max_backoff_seconds: float = 900.0,
+    ):
+        self.gateway = gateway
+        self.on_paid = on_paid
+        self.batch_size = batch_size
+        self.checks_per_second = checks_per_second
+        self.interval = interval
+        self.max_age = timedelta(hours=max_age_hours)
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_backoff = max_backoff_seconds
+        self._nudged: "asyncio.Queue[str]" = asyncio.Queue()
+        self._nudged_ids = set()
+        self._wake = asyncio.Event()
+        self.checked = 0
+        self.confirmed = 0
+        self.expired = 0
+        self.errors = 0
+        self.last_run_at: Optional[datetime] = None
+
+    def nudge(self, session_id: str):
+        if session_id not in self._nudged_ids:
+            self._nudged_ids.add(session_id)
+            self._nudged.put_nowait(session_id)
+            self._wake.set()
+
+    async def run_forever(self, db):
+        while True:
+            try:
+                await self.reconcile_once(db)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Payment reconciliation failed: {str(e)}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, db, session_id: Optional[str] = None) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        query = {"payment_status": "pending", "created_at": {"$gte": (now - self.max_age).isoformat()}}
+        if session_id:
+            # A nudged session is checked now, regardless of its backoff
+            query["session_id"] = session_id
+        else:
+            query["$or"] = [{"next_check_at": {"$lte": now.isoformat()}}, {"next_check_at": {"$exists": False}}]
+        return await db.payment_transactions.find_one_and_update(
+            query,
+            {"$set": {"next_check_at": (now + self.lease).isoformat()}},
+            projection={"_id": 0, "session_id": 1, "check_count": 1},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def reconcile_once(self, db) -> int:
+        self.last_run_at = datetime.now(timezone.utc)
+        checked = 0
+        pacing = 1.0 / self.checks_per_second if self.checks_per_second > 0 else 0.0
+
+        while checked < self.batch_size:
+            if not self._nudged.empty():
+                session_id = self._nudged.get_nowait()
+                self._nudged_ids.discard(session_id)
+                transaction = await self._claim(db, session_id)
+                if transaction is None:
+                    continue
+            else:
+                transaction = await self._claim(db)
+                if transaction is None:
+                    break
+
+            try:
+                await self._check(db, transaction)
+            except PaymentGatewayUnavailable as e:
+                # Leave the lease in place; the breaker decides when to try again
+                logger.warning(f"Payment reconciliation paused: {str(e)}")
+                break
+            except PaymentGatewayError as e:
+                # e.g. an unknown session; the lease defers the next attempt
+                self.errors += 1
+                logger.error(f"Payment reconciliation check failed for {transaction['session_id']}: {str(e)}")
+            checked += 1
+            if pacing:
+                await asyncio.sleep(pacing)
+        return checked
+
+    async def _check(self, db, transaction: dict):
+        session_id = transaction['session_id']
+        status = await self.gateway.get_checkout_status(session_id)
+        self.checked += 1
+        now = datetime.now(timezone.utc)
+
+        if status.payment_status == "paid":
+            if await self.on_paid(session_id):
+                self.confirmed += 1
+            return
+
+        if status.status == "expired":
+            await db.payment_transactions.update_one(
+                {"session_id": session_id, "payment_status": "pending"},
+                {"$set": {"payment_status": "expired", "updated_at": now.isoformat()}}
+            )
+            self.expired += 1
+            return
+
+        check_count = transaction.get('check_count', 0) + 1
+        backoff = min(self.max_backoff, 5 * 2 ** min(check_count, 20))
+        await db.payment_transactions.update_one(
+            {"session_id": session_id},
+            {"$set": {"next_check_at": (now + timedelta(seconds=backoff)).isoformat(), "check_count": check_count}}
+        )
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "confirmed": self.confirmed,
+            "expired": self.expired,
+            "errors": self.errors,
+            "nudged_pending": self._nudged.qsize(),
+            "checks_per_second": self.checks_per_second,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+        }
@@ -0,0 +1,176 @@
+"""
+Materialized platform totals for the admin dashboard.
+
+A single ``platform_stats`` document holds the dashboard counters. Routes
+report domain events (order placed, status changed, payment confirmed, ...)
+and each becomes one ``$inc`` on that document, so reading the dashboard is a
+single primary-key lookup. The 7-day activity figures come from per-day
+buckets, which are summed on read.
+
+``rebuild`` recomputes everything from the source collections with one
+``$facet`` aggregation per collection. It runs when the document is missing
+and periodically afterwards, which also repairs any drift from increments
+that raced a rebuild or from writes made outside the API.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING_ORDER_STATUSES = ("PLACED", "ACCEPTED", "PREPARING")
+PENDING_RESERVATION_STATUSES = ("PENDING_PAYMENT",)
+RECENT_DAYS = 7
+
+
+def day_key(created_at) -> str:
+    if isinstance(created_at, datetime):
+        return created_at.date().isoformat()
+    return str(created_at)[:10]
+
+
+def status_count_delta(old_status: Optional[str], new_status: Optional[str], pending_statuses) -> int:
+    return int(new_status in pending_statuses) - int(old_status in pending_statuses)
+
+
+class PlatformStats:
+    def __init__(self, rebuild_interval: float = 3600.0, doc_id: str = "platform"):
+        self.rebuild_interval = rebuild_interval
+        self.doc_id = doc_id
+        self.rebuilds = 0
+        self.last_rebuilt_at: Optional[datetime] = None
+
+    async def _totals(self, collection, amount_field: str, pending_statuses, since: str) -> dict:
+        pipeline = [{"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "pending": {"$sum": {"$cond": [{"$in": ["$status", list(pending_statuses)]}, 1, 0]}},
+                "revenue": {"$sum": {"$cond": [{"$eq": ["$payment_status", "paid"]}, f"${amount_field}", 0]}},
+            }}],
+            "by_day": [
+                {"$match": {"created_at": {"$gte": since}}},
+                {"$group": {"_id": {"$substr": ["$created_at", 0, 10]}, "count": {"$sum": 1}}},
+            ],
+        }}]
+        result = (await collection.aggregate(pipeline).to_list(1))[0]
+        totals = result["totals"][0] if result["totals"] else {"count": 0, "pending": 0, "revenue": 0}
+        return {
+            "count": totals["count"],
+            "pending": totals["pending"],
+            "revenue": totals["revenue"] or 0,
+            "by_day": {row["_id"]: row["count"] for row in result["by_day"]},
+        }
+
+    async def rebuild(self, db) -> dict:
+        since = (datetime.now(timezone.utc) - timedelta(days=RECENT_DAYS)).date().isoformat()
+        orders, reservations, total_users, total_restaurants = await asyncio.gather(
+            self._totals(db.orders, "total_amount", PENDING_ORDER_STATUSES, since),
+            self._totals(db.reservations, "amount", PENDING_RESERVATION_STATUSES, since),
+            # mark_*_deleting already took these out of the live counters
+            db.users.count_documents({"role": "customer", "status": {"$ne": "deleting"}}),
+            db.restaurants.count_documents({"status": {"$ne": "deleting"}}),
+        )
+        doc = {
+            "total_users": total_users,
+            "total_restaurants": total_restaurants,
+            "total_orders": orders["count"],
+            "total_reservations": reservations["count"],
+            "pending_orders": orders["pending"],
+            "pending_reservations": reservations["pending"],
+            "order_revenue": orders["revenue"],
+            "reservation_revenue": reservations["revenue"],
+            "orders_by_day": orders["by_day"],
+            "reservations_by_day": reservations["by_day"],
+            "rebuilt_at": datetime.now(timezone.utc).isoformat(),
+        }
+        await db.platform_stats.replace_one({"_id": self.doc_id}, doc, upsert=True)
+        self.rebuilds += 1
+        self.last_rebuilt_at = datetime.now(timezone.utc)
+        return doc
+
+    async def read(self, db) -> dict:
+        doc = await db.platform_stats.find_one({"_id": self.doc_id})
+        if doc is None:
+            doc = await self.rebuild(db)
+        since = (datetime.now(timezone.utc) - timedelta(days=RECENT_DAYS)).date().isoformat()
+        return {
+            "total_users": doc.get("total_users", 0),
+            "total_restaurants": doc.get("total_restaurants", 0),
+            "total_orders": doc.get("total_orders", 0),
+            "total_reservations": doc.get("total_reservations", 0),
+            "pending_orders": doc.get("pending_orders", 0),
+            "pending_reservations": doc.get("pending_reservations", 0),
+            "total_revenue": doc.get("order_revenue", 0) + doc.get("reservation_revenue", 0),
+            "order_revenue": doc.get("order_revenue", 0),
+            "reservation_revenue": doc.get("reservation_revenue", 0),
+            "recent_orders": sum(n for day, n in doc.get("orders_by_day", {}).items() if day >= since),
+            "recent_reservations": sum(n for day, n in doc.get("reservations_by_day", {}).items() if day >= since),
+        }
+
+    async def run_forever(self, db):
+        while True:
+            await asyncio.sleep(self.rebuild_interval)
+            try:
+                await self.rebuild(db)
+            except Exception as e:
+                logger.error(f"Platform stats rebuild failed: {str(e)}")
+
+    async def _inc(self, db, inc: dict):
+        inc = {field: value for field, value in inc.items() if value}
+        if not inc:
+            return
+        try:
+            # No upsert: a missing document is rebuilt from scratch on the next read
+            await db.platform_stats.update_one({"_id": self.doc_id}, {"$inc": inc})
+        except Exception as e:
+            logger.error(f"Platform stats update failed: {str(e)}")
+
+    # Domain event hooks, called by the routes after their write succeeds
+
+    async def user_created(self, db, role: str):
+        await self._inc(db, {"total_users": int(role == "customer")})
+
+    async def user_deleted(self, db, role: str):
+        await self._inc(db, {"total_users": -int(role == "customer")})
+
+    async def restaurant_created(self, db):
+        await self._inc(db, {"total_restaurants": 1})
+
+    async def restaurant_deleted(self, db):
+        await self._inc(db, {"total_restaurants": -1})
+
+    async def order_created(self, db, order: dict):
+        await self._inc(db, {
+            "total_orders": 1,
+            "pending_orders": int(order.get("status") in PENDING_ORDER_STATUSES),
+            "order_revenue": order.get("total_amount", 0) if order.get("payment_status") == "paid" else 0,
+            f"orders_by_day.{day_key(order['created_at'])}": 1,
+        })
+
+    async def order_status_changed(self, db, old_status: Optional[str], new_status: str):
+        await self._inc(db, {"pending_orders": status_count_delta(old_status, new_status, PENDING_ORDER_STATUSES)})
+
+    async def reservation_created(self, db, reservation: dict):
+        await self._inc(db, {
+            "total_reservations": 1,
+            "pending_reservations": int(reservation.get("status") in PENDING_RESERVATION_STATUSES),
+            f"reservations_by_day.{day_key(reservation['created_at'])}": 1,
+        })
+
+    async def reservation_status_changed(self, db, old_status: Optional[str], new_status: str):
+        await self._inc(db, {
+            "pending_reservations": status_count_delta(old_status, new_status, PENDING_RESERVATION_STATUSES)
+        })
+
+    async def payment_confirmed(self, db, payment_type: str, amount: float):
+        field = "order_revenue" if payment_type == "order" else "reservation_revenue"
+        await self._inc(db, {field: amount})
+
+    def stats(self) -> dict:
+        return {
+            "rebuilds": self.rebuilds,
+            "last_rebuilt_at": self.last_rebuilt_at.isoformat() if self.last_rebuilt_at else None,
+            "rebuild_interval_seconds": self.rebuild_interval,
+        }
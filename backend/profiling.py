@@ -0,0 +1,234 @@
+"""
+On-demand CPU sampling and memory snapshots for a running worker.
+
+``SamplingProfiler`` runs a background thread only while something is being
+profiled. Every ``interval`` seconds it reads the event loop thread's current
+stack through ``sys._current_frames`` and counts it in each active profile,
+so the profiled code is never instrumented. Profiles are kept as collapsed
+stacks (``outer;inner;leaf count``), the input format of flamegraph.pl and
+speedscope.
+
+A request is profiled when an admin sends ``X-Profile: 1``, or at random
+with ``sample_rate``. All requests share one event loop thread, so a request
+profile also contains samples from whatever else the loop ran while it was
+in flight. Profile a quiet worker, or use the whole-worker window, when that
+matters.
+
+``MemoryProfiler`` wraps tracemalloc: start tracing, then take snapshots
+ranked by allocation site, optionally diffed against the previous snapshot.
+"""
+import linecache
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Profile:
+    def __init__(self, label: str):
+        self.profile_id = str(uuid.uuid4())
+        self.label = label
+        self.started_at = datetime.now(timezone.utc)
+        self.duration = 0.0
+        self.samples: Counter = Counter()
+        self._started = time.perf_counter()
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "profile_id": self.profile_id,
+            "label": self.label,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 2),
+            "samples": sum(self.samples.values()),
+        }
+
+    def top_functions(self, limit: int = 20) -> List[dict]:
+        # Self time: samples where the function is the leaf of the stack
+        leaves: Counter = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [
+            {"function": name, "samples": count, "share": round(count / total, 4)}
+            for name, count in leaves.most_common(limit)
+        ]
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, keep: int = 50):
+        self.interval = interval
+        self._active: List[Profile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._target_thread_id: Optional[int] = None
+        self.profiles: "deque[Profile]" = deque(maxlen=keep)
+
+    def start(self, label: str) -> Profile:
+        """Begin a profile of the calling thread (the event loop)."""
+        profile = Profile(label)
+        with self._lock:
+            self._target_thread_id = threading.get_ident()
+            self._active.append(profile)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def stop(self, profile: Profile) -> Profile:
+        with self._lock:
+            if profile in self._active:
+                self._active.remove(profile)
+        profile.finish()
+        self.profiles.append(profile)
+        return profile
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                frame = sys._current_frames().get(self._target_thread_id)
+                if frame is not None:
+                    stack = collapse_stack(frame)
+                    for profile in self._active:
+                        profile.samples[stack] += 1
+            del frame
+            time.sleep(self.interval)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        for profile in self.profiles:
+            if profile.profile_id == profile_id:
+                return profile
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "active": len(self._active),
+            "stored": len(self.profiles),
+            "profiles": [profile.summary() for profile in reversed(self.profiles)],
+        }
+
+
+class ProfilingMiddleware:
+    """Profiles a request on an admin's ``X-Profile`` header or at ``sample_rate``."""
+
+    def __init__(self, app, profiler: SamplingProfiler, is_admin: Callable[[dict], bool], sample_rate: float = 0.0):
+        self.app = app
+        self.profiler = profiler
+        self.is_admin = is_admin
+        self.sample_rate = sample_rate
+
+    def _requested(self, scope) -> bool:
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                return value not in (b"", b"0") and self.is_admin(scope)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (
+            self._requested(scope) or (self.sample_rate and random.random() < self.sample_rate)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.profiler.start(f"{scope['method']} {scope['path']}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.stop(profile)
+
+
+class MemoryProfiler:
+    def __init__(self):
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    def start(self, frames: int = 25) -> dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._previous = None
+        return self.status()
+
+    def stop(self) -> dict:
+        tracemalloc.stop()
+        self._previous = None
+        return self.status()
+
+    def status(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+        }
+
+    def snapshot(self, top: int = 25, group_by: str = "lineno", compare: bool = False) -> dict:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        if compare and self._previous is not None:
+            stats = snapshot.compare_to(self._previous, group_by)
+            sites = [
+                {
+                    "site": self._site(stat.traceback, group_by),
+                    "size_bytes": stat.size,
+                    "size_diff_bytes": stat.size_diff,
+                    "count": stat.count,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:top]
+            ]
+        else:
+            sites = [
+                {"site": self._site(stat.traceback, group_by), "size_bytes": stat.size, "count": stat.count}
+                for stat in snapshot.statistics(group_by)[:top]
+            ]
+        self._previous = snapshot
+        return {**self.status(), "group_by": group_by, "compared": compare, "top": sites}
+
+    @staticmethod
+    def _site(traceback, group_by: str):
+        if group_by == "traceback":
+            return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+        frame = traceback[0]
+        return f"{frame.filename}:{frame.lineno}"
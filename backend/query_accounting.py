@@ -0,0 +1,187 @@
+"""
+Per-request database query accounting.
+
+``QueryMonitor`` is a PyMongo command listener. Motor runs each command on
+its executor inside a copy of the caller's context, so the listener can find
+the ``RequestQueries`` of the request that issued the command through a
+context variable and add to it. Each request gets a count of commands,
+documents returned and time spent in the database, and a count per query
+*shape*: the command, the collection and the filter with its values blanked
+out. One shape repeated many times within a request is the signature of a
+query issued in a loop (N+1).
+
+``QueryAccountingMiddleware`` opens a ``RequestQueries`` per request, reports
+it in a ``Server-Timing`` header and the log, and in strict mode raises
+``QueryBudgetExceeded`` so a test fails when an endpoint goes over budget.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Connection handshakes and cursor housekeeping are not application queries
+IGNORED_COMMANDS = frozenset({
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "saslStart", "saslContinue",
+    "endSessions", "killCursors", "abortTransaction", "commitTransaction",
+})
+
+current_queries: ContextVar[Optional["RequestQueries"]] = ContextVar("current_queries", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _blank(value):
+    if isinstance(value, dict):
+        return {key: _blank(item) for key, item in sorted(value.items())}
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return [_blank(item) for item in value]
+    return "?"
+
+
+def query_shape(command_name: str, command: dict) -> str:
+    collection = command.get(command_name)
+    if command_name in ("find", "count", "distinct"):
+        query = command.get("filter", command.get("query", {}))
+    elif command_name == "aggregate":
+        pipeline = command.get("pipeline") or [{}]
+        query = pipeline[0]
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or [{}]
+        query = statements[0].get("q", {})
+    elif command_name == "findAndModify":
+        query = command.get("query", {})
+    else:
+        query = {}
+    return f"{command_name} {collection} {_blank(query)}"
+
+
+def _documents_returned(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if "value" in reply:
+        return 1 if reply["value"] else 0
+    return 0
+
+
+class RequestQueries:
+    def __init__(self):
+        # Commands of one request may complete on several executor threads at once
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.documents = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, shape: Optional[str]):
+        with self._lock:
+            self.queries += 1
+            if shape is not None:
+                self.shapes[shape] += 1
+
+    def complete(self, seconds: float, documents: int):
+        with self._lock:
+            self.duration += seconds
+            self.documents += documents
+
+    def repeated(self, threshold: int) -> dict:
+        return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+    def violations(self, max_queries: int, max_repeats: int) -> list:
+        problems = []
+        if max_queries and self.queries > max_queries:
+            problems.append(f"{self.queries} queries (budget {max_queries})")
+        if max_repeats:
+            for shape, count in self.repeated(max_repeats + 1).items():
+                problems.append(f"{count}x {shape}")
+        return problems
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.queries} queries, {self.documents} docs"'
+
+
+class QueryMonitor(monitoring.CommandListener):
+    """Attributes each command to the request in ``current_queries``; pass as an ``event_listeners`` entry."""
+
+    def started(self, event):
+        queries = current_queries.get()
+        if queries is None or event.command_name in IGNORED_COMMANDS:
+            return
+        # A getMore continues a cursor; it is a round trip but not a new query shape
+        shape = None if event.command_name == "getMore" else query_shape(event.command_name, event.command)
+        queries.record(shape)
+
+    def succeeded(self, event):
+        queries = current_queries.get()
+        if queries is None or event.command_name in IGNORED_COMMANDS:
+            return
+        queries.complete(event.duration_micros / 1_000_000, _documents_returned(event.reply))
+
+    def failed(self, event):
+        queries = current_queries.get()
+        if queries is None or event.command_name in IGNORED_COMMANDS:
+            return
+        queries.complete(event.duration_micros / 1_000_000, 0)
+
+
+@contextmanager
+def track_queries():
+    """Account the queries issued inside the block, e.g. around a call in a test."""
+    queries = RequestQueries()
+    token = current_queries.set(queries)
+    try:
+        yield queries
+    finally:
+        current_queries.reset(token)
+
+
+class QueryAccountingMiddleware:
+    def __init__(self, app, max_queries: int = 0, max_repeats: int = 0, strict: bool = False, slow_log_seconds: float = 0.5):
+        self.app = app
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.strict = strict
+        self.slow_log_seconds = slow_log_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", queries.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_queries.reset(token)
+        elapsed = time.perf_counter() - start
+
+        route = getattr(scope.get("route"), "path", scope["path"])
+        problems = queries.violations(self.max_queries, self.max_repeats)
+        summary = f"{scope['method']} {route}: {queries.queries} queries, {queries.documents} docs, {queries.duration * 1000:.1f}ms db"
+        if problems:
+            logger.warning(f"Query budget exceeded by {summary}: {'; '.join(problems)}")
+            if self.strict:
+                raise QueryBudgetExceeded(f"{summary}: {'; '.join(problems)}")
+        elif elapsed >= self.slow_log_seconds:
+            logger.info(f"Slow request {summary}, {elapsed * 1000:.1f}ms total")
+        else:
+            logger.debug(summary)
@@ -0,0 +1,147 @@
+"""
+Rate limiting for the authentication endpoints.
+
+Every login or signup that gets through costs a bcrypt run, so credential
+stuffing has to be turned away before any password work happens. Limits are
+token buckets kept in process memory, or fixed windows in a Mongo collection
+when several workers must share counters. Rejection is cheap in both modes:
+the 429 is sent straight from the ASGI middleware, and in Mongo mode a key
+that is already blocked is remembered locally until its window ends.
+"""
+import json
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+AUTH_PATH_PATTERN = re.compile(r"^/api/auth/(customer|restaurant|admin)/(login|signup)$")
+
+
+class RateLimiter:
+    def __init__(self, name: str, limit: int, period_seconds: float = 60.0, collection=None, max_keys: int = 100_000):
+        self.name = name
+        self.limit = limit
+        self.period = period_seconds
+        self.collection = collection
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at) in memory mode, key -> blocked_until in mongo mode
+        self._state: "OrderedDict[str, tuple]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    @property
+    def mode(self) -> str:
+        return "mongo" if self.collection is not None else "memory"
+
+    async def hit(self, key: str) -> float:
+        """Record one attempt for key; returns 0 if allowed, else seconds to wait."""
+        now = time.monotonic()
+        if self.collection is not None:
+            retry_after = await self._hit_mongo(key, now)
+        else:
+            retry_after = self._hit_memory(key, now)
+        if retry_after:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def _remember(self, key: str, value: tuple):
+        self._state[key] = value
+        self._state.move_to_end(key)
+        while len(self._state) > self.max_keys:
+            self._state.popitem(last=False)
+
+    def _hit_memory(self, key: str, now: float) -> float:
+        refill_rate = self.limit / self.period
+        tokens, updated_at = self._state.get(key, (float(self.limit), now))
+        tokens = min(float(self.limit), tokens + (now - updated_at) * refill_rate)
+        if tokens < 1:
+            self._remember(key, (tokens, now))
+            return (1 - tokens) / refill_rate
+        self._remember(key, (tokens - 1, now))
+        return 0.0
+
+    async def _hit_mongo(self, key: str, now: float) -> float:
+        blocked = self._state.get(key)
+        if blocked and blocked[0] > now:
+            return blocked[0] - now
+
+        wall = time.time()
+        window = int(wall // self.period)
+        window_end = (window + 1) * self.period
+        doc = await self.collection.find_one_and_update(
+            {"_id": f"{self.name}:{key}:{window}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {"expires_at": datetime.fromtimestamp(window_end, timezone.utc) + timedelta(seconds=self.period)}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc['count'] > self.limit:
+            retry_after = window_end - wall
+            self._remember(key, (now + retry_after,))
+            return retry_after
+        return 0.0
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "limit": self.limit,
+            "period_seconds": self.period,
+            "tracked_keys": len(self._state),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+def client_ip(scope, proxy_hops: int = 0) -> str:
+    # With proxy_hops=N, trust the N-th address from the right of X-Forwarded-For
+    if proxy_hops > 0:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                hops = [part.strip() for part in value.decode("latin-1").split(",") if part.strip()]
+                if hops:
+                    return hops[max(len(hops) - proxy_hops, 0)]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def too_many_requests_body(retry_after: float) -> bytes:
+    return json.dumps({"detail": f"Too many attempts, retry in {int(retry_after) + 1} seconds"}).encode()
+
+
+class AuthRateLimitMiddleware:
+    """Per-IP limit on auth endpoints, rejected before the request body is read."""
+
+    def __init__(self, app, limiter: RateLimiter, proxy_hops: int = 0, path_pattern: Optional[re.Pattern] = None):
+        self.app = app
+        self.limiter = limiter
+        self.proxy_hops = proxy_hops
+        self.path_pattern = path_pattern or AUTH_PATH_PATTERN
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not self.path_pattern.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = await self.limiter.hit(client_ip(scope, self.proxy_hops))
+        if not retry_after:
+            await self.app(scope, receive, send)
+            return
+
+        body = too_many_requests_body(retry_after)
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(int(retry_after) + 1).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,80 @@
+"""
+In-memory revocation list for suspended users and restaurants.
+
+Access tokens are verified statelessly, so suspension has to be checked
+without a database round trip. The list holds the ids of suspended users and
+the owners of suspended restaurants. It is loaded at startup, updated in place
+by the admin status routes, refreshed when another worker announces a change
+on the invalidation bus, and periodically reloaded as a backstop so changes
+are picked up within the sync interval even if an announcement is lost.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    def __init__(self, sync_interval: float = 5.0):
+        self.sync_interval = sync_interval
+        self.suspended_users = set()
+        self.suspended_restaurant_owners = set()
+        self.last_synced_at: Optional[datetime] = None
+        self.sync_failures = 0
+
+    async def load(self, db):
+        users = await db.users.distinct("user_id", {"status": {"$in": ["suspended", "deleting"]}})
+        owners = await db.restaurants.distinct("owner_id", {"status": "suspended"})
+        # Swap whole sets so readers never see a half-built list
+        self.suspended_users = set(users)
+        self.suspended_restaurant_owners = set(owners)
+        self.last_synced_at = datetime.now(timezone.utc)
+
+    async def sync_forever(self, db):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.load(db)
+            except Exception as e:
+                self.sync_failures += 1
+                logger.error(f"Revocation list sync failed: {str(e)}")
+
+    async def refresh_user(self, db, user_id: str):
+        user = await db.users.find_one({"user_id": user_id}, {"_id": 0, "status": 1})
+        self.set_user_suspended(user_id, bool(user) and user.get("status") in ("suspended", "deleting"))
+
+    async def refresh_restaurant(self, db, restaurant_id: str):
+        restaurant = await db.restaurants.find_one({"restaurant_id": restaurant_id}, {"_id": 0, "owner_id": 1, "status": 1})
+        if restaurant:
+            self.set_restaurant_owner_suspended(restaurant["owner_id"], restaurant.get("status") == "suspended")
+
+    def set_user_suspended(self, user_id: str, suspended: bool):
+        if suspended:
+            self.suspended_users.add(user_id)
+        else:
+            self.suspended_users.discard(user_id)
+
+    def set_restaurant_owner_suspended(self, owner_id: str, suspended: bool):
+        if suspended:
+            self.suspended_restaurant_owners.add(owner_id)
+        else:
+            self.suspended_restaurant_owners.discard(owner_id)
+
+    def revocation_reason(self, payload: dict) -> Optional[str]:
+        user_id = payload.get("user_id")
+        if user_id in self.suspended_users:
+            return "Your account has been suspended. Please contact support."
+        if payload.get("role") == "restaurant" and user_id in self.suspended_restaurant_owners:
+            return "Your restaurant has been suspended. Please contact support."
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "suspended_users": len(self.suspended_users),
+            "suspended_restaurant_owners": len(self.suspended_restaurant_owners),
+            "last_synced_at": self.last_synced_at.isoformat() if self.last_synced_at else None,
+            "sync_interval_seconds": self.sync_interval,
+            "sync_failures": self.sync_failures,
+        }
@@ -0,0 +1,177 @@
+"""
+Item-level sales counters for restaurant owners.
+
+Each restaurant has one ``sales_insights`` document. Placing an order
+increments, in a single update, the quantity, revenue and order count of
+every item on it, plus the order's hour-of-day and weekday/hour demand
+cells. Cancelling an order reverses those increments. Reading the insights
+is therefore one document lookup, plus one query for the menu to group items
+by category, however many orders the restaurant has taken.
+
+Hours are local to INSIGHTS_UTC_OFFSET_MINUTES (UTC by default). ``rebuild``
+recomputes a restaurant's document from its orders.
+
+Order line items come from the client, so only items on the restaurant's
+menu get a counter; anything else would let one order grow the document
+without bound. A cancellation only reverses counters its order created.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Set
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+COUNTED_EXCLUDED_STATUSES = ("CANCELLED",)
+
+
+def field_key(value: str) -> str:
+    # Item ids become field names; escape path operators reversibly so two ids never share a key
+    return str(value).replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def item_ids(order: dict) -> Set[str]:
+    return {str(item['item_id']) for item in order.get('items', []) if item.get('item_id')}
+
+
+class SalesInsights:
+    def __init__(self, utc_offset_minutes: int = 0):
+        self.offset = timedelta(minutes=utc_offset_minutes)
+
+    def _local_time(self, created_at) -> datetime:
+        if not isinstance(created_at, datetime):
+            created_at = datetime.fromisoformat(created_at)
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return created_at.astimezone(timezone.utc) + self.offset
+
+    def _increments(self, order: dict, sign: int, known: Iterable[str] = ()) -> dict:
+        local = self._local_time(order['created_at'])
+        inc = {
+            "orders": sign,
+            "revenue": sign * order.get('total_amount', 0),
+            f"hours.{local.hour}": sign,
+            f"weekday_hours.{local.weekday()}.{local.hour}": sign,
+        }
+        for item in order.get('items', []):
+            if not item.get('item_id') or str(item['item_id']) not in known:
+                continue
+            key = f"items.{field_key(item['item_id'])}"
+            inc[f"{key}.quantity"] = inc.get(f"{key}.quantity", 0) + sign * item.get('quantity', 0)
+            inc[f"{key}.revenue"] = inc.get(f"{key}.revenue", 0) + sign * item.get('price', 0) * item.get('quantity', 0)
+            inc[f"{key}.orders"] = sign
+        return inc
+
+    async def _known_items(self, db, order: dict, sign: int) -> Set[str]:
+        ids = item_ids(order)
+        if not ids:
+            return set()
+        if sign > 0:
+            menu = await db.menu_items.find(
+                {"restaurant_id": order['restaurant_id'], "item_id": {"$in": list(ids)}}, {"_id": 0, "item_id": 1}
+            ).to_list(None)
+            return {row['item_id'] for row in menu}
+        doc = await db.sales_insights.find_one(
+            {"_id": order['restaurant_id']}, {f"items.{field_key(item_id)}.orders": 1 for item_id in ids}
+        ) or {}
+        counted = doc.get("items", {})
+        return {item_id for item_id in ids if field_key(item_id) in counted}
+
+    async def _apply(self, db, order: dict, sign: int):
+        try:
+            known = await self._known_items(db, order, sign)
+            update = {"$inc": self._increments(order, sign, known)}
+            names = {
+                f"items.{field_key(item['item_id'])}.name": item.get('name')
+                for item in order.get('items', []) if item.get('item_id') and str(item['item_id']) in known
+            }
+            if sign > 0 and names:
+                update["$set"] = names
+            await db.sales_insights.update_one({"_id": order['restaurant_id']}, update, upsert=True)
+        except Exception as e:
+            # Insights are derived data; rebuild repairs a missed update
+            logger.error(f"Sales insights update failed: {str(e)}")
+
+    async def order_created(self, db, order: dict):
+        if order.get('status') not in COUNTED_EXCLUDED_STATUSES:
+            await self._apply(db, order, 1)
+
+    async def order_status_changed(self, db, order: dict, old_status: Optional[str], new_status: str):
+        was_counted = old_status not in COUNTED_EXCLUDED_STATUSES
+        is_counted = new_status not in COUNTED_EXCLUDED_STATUSES
+        if was_counted != is_counted:
+            await self._apply(db, order, 1 if is_counted else -1)
+
+    async def rebuild(self, db, restaurant_id: str) -> int:
+        doc: Dict = {"orders": 0, "revenue": 0, "hours": {}, "weekday_hours": {}, "items": {}}
+        count = 0
+        menu = await db.menu_items.find({"restaurant_id": restaurant_id}, {"_id": 0, "item_id": 1}).to_list(None)
+        known = {row['item_id'] for row in menu}
+        cursor = db.orders.find(
+            {"restaurant_id": restaurant_id, "status": {"$nin": list(COUNTED_EXCLUDED_STATUSES)}},
+            {"_id": 0, "created_at": 1, "total_amount": 1, "items": 1}
+        ).batch_size(1000)
+        async for order in cursor:
+            count += 1
+            for path, value in self._increments(order, 1, known).items():
+                node = doc
+                *parents, leaf = path.split(".")
+                for part in parents:
+                    node = node.setdefault(part, {})
+                node[leaf] = node.get(leaf, 0) + value
+            for item in order.get('items', []):
+                if item.get('item_id') and str(item['item_id']) in known:
+                    doc["items"][field_key(item['item_id'])]["name"] = item.get('name')
+        await db.sales_insights.replace_one({"_id": restaurant_id}, doc, upsert=True)
+        return count
+
+    async def read(self, db, restaurant_id: str, top: int = 10) -> dict:
+        doc = await db.sales_insights.find_one({"_id": restaurant_id}) or {}
+        items = [
+            {"item_id": unquote(key), "name": values.get("name"), "quantity": values.get("quantity", 0),
+             "revenue": round(values.get("revenue", 0), 2), "orders": values.get("orders", 0)}
+            for key, values in doc.get("items", {}).items()
+            if values.get("orders", 0) > 0
+        ]
+
+        menu = await db.menu_items.find(
+            {"restaurant_id": restaurant_id}, {"_id": 0, "item_id": 1, "category_id": 1}
+        ).to_list(None)
+        categories = await db.menu_categories.find(
+            {"restaurant_id": restaurant_id}, {"_id": 0, "category_id": 1, "name": 1}
+        ).to_list(None)
+        item_category = {row['item_id']: row['category_id'] for row in menu}
+        category_names = {row['category_id']: row['name'] for row in categories}
+
+        mix: Dict[str, Dict] = {}
+        total_revenue = sum(item["revenue"] for item in items) or 0
+        for item in items:
+            category_id = item_category.get(item["item_id"])
+            entry = mix.setdefault(category_id, {
+                "category_id": category_id,
+                "name": category_names.get(category_id, "Uncategorized"),
+                "quantity": 0,
+                "revenue": 0,
+            })
+            entry["quantity"] += item["quantity"]
+            entry["revenue"] += item["revenue"]
+        for entry in mix.values():
+            entry["revenue"] = round(entry["revenue"], 2)
+            entry["revenue_share"] = round(entry["revenue"] / total_revenue, 4) if total_revenue else 0
+
+        hours = doc.get("hours", {})
+        weekday_hours = doc.get("weekday_hours", {})
+        return {
+            "restaurant_id": restaurant_id,
+            "orders": doc.get("orders", 0),
+            "revenue": round(doc.get("revenue", 0), 2),
+            "top_items": sorted(items, key=lambda item: (-item["quantity"], -item["revenue"]))[:top],
+            "revenue_by_item": sorted(items, key=lambda item: -item["revenue"]),
+            "category_mix": sorted(mix.values(), key=lambda entry: -entry["revenue"]),
+            "hourly_demand": [hours.get(str(hour), 0) for hour in range(24)],
+            "weekday_hourly_demand": [
+                [weekday_hours.get(str(day), {}).get(str(hour), 0) for hour in range(24)]
+                for day in range(7)
+            ],
+            "utc_offset_minutes": int(self.offset.total_seconds() // 60),
+        }
@@ -1,7 +1,13 @@
+import argparse
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 import os
+import random
+import time
+from bisect import bisect
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
 from pathlib import Path
 import bcrypt
 import uuid
@@ -25,7 +31,12 @@ async def seed_database():
     await db.menu_items.delete_many({})
     await db.orders.delete_many({})
     await db.reservations.delete_many({})
+    await db.reservation_slots.delete_many({})
     await db.payment_transactions.delete_many({})
+    # Derived from the collections above; rebuilt from scratch on next use
+    await db.platform_stats.delete_many({})
+    await db.analytics_rollups.delete_many({})
+    await db.sales_insights.delete_many({})
     
     print("Cleared existing data...")
     
@@ -253,5 +264,318 @@ async def seed_database():
     print("Customer Login - Email: customer@demo.com, Password: password123")
     print("Restaurant Logins - Email: restaurant1@demo.com to restaurant8@demo.com, Password: password123")
 
+# ============= SYNTHETIC DATA GENERATOR =============
+
+GENERATED_CUISINES = ["Indian", "Italian", "Chinese", "Japanese", "American", "Mexican", "Thai", "Vegan", "Dessert", "Pizza"]
+GENERATED_CATEGORIES = ["Starters", "Main Course", "Sides", "Desserts", "Beverages"]
+# Lunch and dinner peaks; index is the hour of day
+ORDER_HOUR_WEIGHTS = [1, 1, 0, 0, 0, 0, 1, 2, 4, 5, 5, 8, 14, 15, 10, 6, 5, 7, 12, 16, 17, 13, 8, 3]
+RESERVATION_TIMES = ["12:00", "13:00", "14:00", "18:00", "19:00", "20:00", "21:00"]
+RESERVATION_TIME_WEIGHTS = [6, 8, 4, 5, 12, 14, 7]
+# Mon..Sun
+WEEKDAY_WEIGHTS = [0.8, 0.8, 0.9, 1.0, 1.3, 1.5, 1.3]
+RATING_WEIGHTS = [0.05, 0.07, 0.13, 0.35, 0.40]
+PARTY_SIZE_WEIGHTS = [0.05, 0.40, 0.12, 0.25, 0.06, 0.08, 0.02, 0.02]
+
+
+def count_arg(value: str) -> int:
+    # Accept 1e6 as well as 1000000
+    return int(float(value))
+
+
+class WeightedPicker:
+    """O(log n) weighted choice over a fixed population, e.g. Zipf-skewed popularity."""
+
+    def __init__(self, weights, rng: random.Random):
+        self.cumulative = list(accumulate(weights))
+        self.total = self.cumulative[-1]
+        self.rng = rng
+
+    def pick(self) -> int:
+        return bisect(self.cumulative, self.rng.random() * self.total)
+
+
+def zipf_weights(n: int, exponent: float):
+    return [1.0 / (rank ** exponent) for rank in range(1, n + 1)]
+
+
+def generated_id(base: int, index: int) -> str:
+    # Derived from the index so a million users need not be held in memory
+    return str(uuid.UUID(int=(base + index) % (1 << 128)))
+
+
+async def write_batches(collection, batches, concurrency: int) -> int:
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    written = 0
+    errors = []
+
+    async def writer():
+        nonlocal written
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            if errors:
+                # Keep draining so the producer never blocks on a full queue
+                continue
+            try:
+                result = await collection.insert_many(batch, ordered=False)
+                written += len(result.inserted_ids)
+            except Exception as e:
+                errors.append(e)
+
+    writers = [asyncio.create_task(writer()) for _ in range(concurrency)]
+    for batch in batches:
+        if errors:
+            break
+        await queue.put(batch)
+    for _ in writers:
+        await queue.put(None)
+    await asyncio.gather(*writers)
+    if errors:
+        raise errors[0]
+    return written
+
+
+def batched(documents, batch_size: int):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def generate_collection(name: str, documents, batch_size: int, concurrency: int) -> int:
+    started = time.perf_counter()
+    written = await write_batches(db[name], batched(documents, batch_size), concurrency)
+    elapsed = time.perf_counter() - started
+    rate = written / elapsed if elapsed else 0
+    print(f"{name:20} {written:>12,} docs in {elapsed:8.1f}s  ({rate:,.0f} docs/s)")
+    return written
+
+
+async def generate_database(args):
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    user_base = rng.getrandbits(128)
+    owner_base = rng.getrandbits(128)
+    password_hash = hash_password("password123")
+
+    if args.drop:
+        for name in ("users", "restaurants", "menu_categories", "menu_items", "orders", "reservations",
+                     "reservation_slots", "reviews"):
+            await db[name].delete_many({"generated": True})
+        print("Cleared previously generated data...")
+
+    # Restaurant popularity and customer activity are both long-tailed
+    restaurant_picker = WeightedPicker(zipf_weights(args.restaurants, 1.1), rng)
+    user_picker = WeightedPicker(zipf_weights(args.users, 0.8), rng)
+    hour_picker = WeightedPicker(ORDER_HOUR_WEIGHTS, rng)
+    day_picker = WeightedPicker([WEEKDAY_WEIGHTS[(now - timedelta(days=d)).weekday()] for d in range(max(args.days, 1))], rng)
+
+    def timestamp() -> datetime:
+        moment = (now - timedelta(days=day_picker.pick())).replace(hour=hour_picker.pick())
+        # Today's picks can land on an hour that has not happened yet
+        return min(moment + timedelta(minutes=rng.randint(0, 59)), now)
+
+    def users():
+        for i in range(args.users):
+            yield {
+                "user_id": generated_id(user_base, i),
+                "email": f"user{i}@generated.dinedash.test",
+                "password_hash": password_hash,
+                "phone": f"+91{9000000000 + i % 1000000000}",
+                "name": f"Generated User {i}",
+                "role": "customer",
+                "status": "active",
+                "created_at": (now - timedelta(days=rng.randint(args.days, args.days + 365))).isoformat(),
+                "generated": True,
+            }
+        for i in range(args.restaurants):
+            yield {
+                "user_id": generated_id(owner_base, i),
+                "email": f"owner{i}@generated.dinedash.test",
+                "password_hash": password_hash,
+                "phone": "",
+                "name": f"Generated Owner {i}",
+                "role": "restaurant",
+                "status": "active",
+                "created_at": (now - timedelta(days=args.days + 365)).isoformat(),
+                "generated": True,
+            }
+
+    # Menus are kept in memory (a dozen items per restaurant) for order line items
+    restaurants, categories, items, menus, quality = [], [], [], [], []
+    for i in range(args.restaurants):
+        restaurant_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        cuisine = rng.choice(GENERATED_CUISINES)
+        veg_only = cuisine in ("Vegan", "Dessert")
+        restaurants.append({
+            "restaurant_id": restaurant_id,
+            "owner_id": generated_id(owner_base, i),
+            "name": f"{cuisine} Kitchen {i}",
+            "description": f"Generated {cuisine.lower()} restaurant",
+            "cuisine": cuisine,
+            "address": f"{rng.randint(1, 999)} Generated Street",
+            "phone": "",
+            "hours": "11:00 AM - 11:00 PM",
+            "service_type": rng.choice(["delivery", "reservations", "both", "both"]),
+            "is_veg": True,
+            "is_non_veg": not veg_only,
+            "seat_capacity": rng.choice([20, 30, 40, 60]),
+            "slot_length_minutes": 60,
+            "image_url": "",
+            "status": "active",
+            "created_at": (now - timedelta(days=args.days + 30)).isoformat(),
+            "generated": True,
+        })
+        quality.append(rng.gauss(0, 0.6))
+        menu = []
+        for order, category_name in enumerate(GENERATED_CATEGORIES[:rng.randint(3, 5)], start=1):
+            category_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            categories.append({
+                "category_id": category_id, "restaurant_id": restaurant_id, "name": category_name,
+                "display_order": order, "generated": True,
+            })
+            for n in range(rng.randint(2, 5)):
+                item = {
+                    "item_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "restaurant_id": restaurant_id,
+                    "category_id": category_id,
+                    "name": f"{category_name} {n + 1}",
+                    "description": "",
+                    "price": float(rng.choice(range(49, 999, 10))),
+                    "image_url": "",
+                    "is_veg": veg_only or rng.random() < 0.6,
+                    "is_available": True,
+                    "generated": True,
+                }
+                items.append(item)
+                menu.append((item['item_id'], item['name'], item['price']))
+        menus.append((menu, WeightedPicker(zipf_weights(len(menu), 1.0), rng)))
+
+    def orders():
+        for _ in range(args.orders):
+            r = restaurant_picker.pick()
+            menu, item_picker = menus[r]
+            lines = {}
+            for _ in range(rng.choice([1, 1, 2, 2, 2, 3, 4])):
+                item_id, name, price = menu[item_picker.pick()]
+                line = lines.setdefault(item_id, {"item_id": item_id, "name": name, "price": price, "quantity": 0})
+                line['quantity'] += rng.choice([1, 1, 1, 2, 3])
+            created = timestamp()
+            age = now - created
+            if rng.random() < 0.05:
+                status = "CANCELLED"
+            elif age > timedelta(hours=3):
+                status = "DELIVERED"
+            else:
+                status = rng.choice(["PLACED", "ACCEPTED", "PREPARING", "OUT_FOR_DELIVERY"])
+            payment_method = "COD" if rng.random() < 0.35 else "ONLINE"
+            yield {
+                "order_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "user_id": generated_id(user_base, user_picker.pick()),
+                "restaurant_id": restaurants[r]['restaurant_id'],
+                "items": list(lines.values()),
+                "total_amount": round(sum(l['price'] * l['quantity'] for l in lines.values()), 2),
+                "status": status,
+                "payment_method": payment_method,
+                "payment_status": "paid" if status != "CANCELLED" or payment_method == "COD" else "pending",
+                "delivery_address": f"{rng.randint(1, 999)} Customer Road",
+                "delivery_phone": "",
+                "notes": None,
+                "preparation_time_minutes": 30,
+                "status_timestamps": {"PLACED": created.isoformat()},
+                "created_at": created.isoformat(),
+                "updated_at": created.isoformat(),
+                "generated": True,
+            }
+
+    reservation_time_picker = WeightedPicker(RESERVATION_TIME_WEIGHTS, rng)
+    party_picker = WeightedPicker(PARTY_SIZE_WEIGHTS, rng)
+    # Seats held by upcoming reservations, keyed like reservation_slots
+    slot_bookings = {}
+
+    def reservations():
+        for _ in range(args.reservations):
+            r = restaurant_picker.pick()
+            created = timestamp()
+            day = (created + timedelta(days=rng.choice([0, 1, 1, 2, 3, 7]))).date()
+            status = "CANCELLED" if rng.random() < 0.08 else ("COMPLETED" if day < now.date() else "CONFIRMED")
+            slot = (restaurants[r]['restaurant_id'], day.isoformat(), RESERVATION_TIMES[reservation_time_picker.pick()])
+            party_size = party_picker.pick() + 1
+            if status == "CONFIRMED":
+                slot_bookings[slot] = slot_bookings.get(slot, 0) + party_size
+            yield {
+                "reservation_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "user_id": generated_id(user_base, user_picker.pick()),
+                "restaurant_id": slot[0],
+                "date": slot[1],
+                "time": slot[2],
+                "party_size": party_size,
+                # Same booking fee create_reservation charges
+                "amount": max(300.0, party_size * 100.0),
+                "status": status,
+                "payment_status": "paid",
+                "created_at": created.isoformat(),
+                "generated": True,
+            }
+
+    def reservation_slots():
+        # reserve_seats trusts an existing counter, so every held slot needs one
+        for (restaurant_id, day, time_str), booked in slot_bookings.items():
+            yield {"restaurant_id": restaurant_id, "date": day, "time": time_str, "booked": booked, "generated": True}
+
+    def reviews():
+        for _ in range(args.reviews):
+            r = restaurant_picker.pick()
+            # Each restaurant's quality shifts its ratings around the platform-wide skew
+            rating = min(5, max(1, rng.choices(range(1, 6), RATING_WEIGHTS)[0] + round(quality[r])))
+            yield {
+                "review_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "user_id": generated_id(user_base, user_picker.pick()),
+                "restaurant_id": restaurants[r]['restaurant_id'],
+                "order_id": None,
+                "rating": rating,
+                "comment": None,
+                "created_at": timestamp().isoformat(),
+                "generated": True,
+            }
+
+    print(f"Generating {args.restaurants:,} restaurants, {args.users:,} users, {args.orders:,} orders, "
+          f"{args.reservations:,} reservations and {args.reviews:,} reviews "
+          f"(batch {args.batch_size}, {args.concurrency} writers)...")
+    started = time.perf_counter()
+    total = 0
+    total += await generate_collection("users", users(), args.batch_size, args.concurrency)
+    total += await generate_collection("restaurants", restaurants, args.batch_size, args.concurrency)
+    total += await generate_collection("menu_categories", categories, args.batch_size, args.concurrency)
+    total += await generate_collection("menu_items", items, args.batch_size, args.concurrency)
+    total += await generate_collection("orders", orders(), args.batch_size, args.concurrency)
+    total += await generate_collection("reservations", reservations(), args.batch_size, args.concurrency)
+    total += await generate_collection("reservation_slots", reservation_slots(), args.batch_size, args.concurrency)
+    total += await generate_collection("reviews", reviews(), args.batch_size, args.concurrency)
+    elapsed = time.perf_counter() - started
+    print(f"\nGenerated {total:,} documents in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} docs/s)")
+    print("Derived data is now stale: POST /api/admin/analytics/backfill, /api/admin/system/platform-stats/rebuild "
+          "and /api/admin/restaurants/<restaurant_id>/insights/rebuild for each restaurant")
+    print("Generated logins: user<N>@generated.dinedash.test / owner<N>@generated.dinedash.test, Password: password123")
+
 if __name__ == "__main__":
-    asyncio.run(seed_database())
+    parser = argparse.ArgumentParser(description="Seed demo data, or generate synthetic data at scale with --generate")
+    parser.add_argument("--generate", action="store_true", help="Generate synthetic data instead of the demo set")
+    parser.add_argument("--restaurants", type=count_arg, default=1000)
+    parser.add_argument("--users", type=count_arg, default=100000)
+    parser.add_argument("--orders", type=count_arg, default=1000000)
+    parser.add_argument("--reservations", type=count_arg, default=200000)
+    parser.add_argument("--reviews", type=count_arg, default=100000)
+    parser.add_argument("--days", type=count_arg, default=365, help="Spread activity over this many past days")
+    parser.add_argument("--batch-size", type=count_arg, default=5000)
+    parser.add_argument("--concurrency", type=count_arg, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="Delete previously generated documents first")
+    args = parser.parse_args()
+    asyncio.run(generate_database(args) if args.generate else seed_database())
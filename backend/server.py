@@ -1,31 +1,94 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Header, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Header, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
 import os
+import re
 import logging
 import asyncio
-import resend
+from contextlib import asynccontextmanager
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+from availability_cache import AvailabilityCalendarCache, ACTIVE_RESERVATION_STATUSES, reservation_seat_delta
+from auth_crypto import AuthCryptoExecutor, AuthCryptoSaturated
+from revocation import RevocationList
+from invalidation_bus import InvalidationBus
+from rate_limit import RateLimiter, AuthRateLimitMiddleware
+from payment_gateway import PaymentGateway, PaymentGatewayError, PaymentGatewayUnavailable
+from payment_reconciler import PaymentReconciler, StatusWaiters
+from payment_events import PaymentEventJournal
+from singleflight import SingleFlight
+from platform_stats import PlatformStats
+from analytics_rollups import AnalyticsRollups, PLATFORM_SCOPE, parse_range_bound
+from exports import EXPORTS, stream_export
+from deletion_jobs import DeletionJobs
+from sales_insights import SalesInsights
+from mongo_config import client_options, describe_workload, read_preference, write_concern
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ConnectionPoolMetrics, MetricsMiddleware, Registry
+from query_accounting import QueryAccountingMiddleware, QueryMonitor
+from profiling import MemoryProfiler, ProfilingMiddleware, SamplingProfiler
+from listing import batch_join, created_at_range, grouped_counts, keyset_filter, next_cursor, parse_fields
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '0'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '0'))
+CATALOG_READ_PREFERENCE = os.environ.get('CATALOG_READ_PREFERENCE', 'primary')
+CATALOG_MAX_STALENESS_SECONDS = int(os.environ.get('CATALOG_MAX_STALENESS_SECONDS', '-1'))
+ANALYTICS_MONGO_URL = os.environ.get('ANALYTICS_MONGO_URL', mongo_url)
+ANALYTICS_MAX_POOL_SIZE = int(os.environ.get('ANALYTICS_MAX_POOL_SIZE', '10'))
+ANALYTICS_READ_PREFERENCE = os.environ.get('ANALYTICS_READ_PREFERENCE', 'primary')
+ANALYTICS_MAX_STALENESS_SECONDS = int(os.environ.get('ANALYTICS_MAX_STALENESS_SECONDS', '-1'))
+ANALYTICS_MAX_TIME_MS = int(os.environ.get('ANALYTICS_MAX_TIME_MS', '15000'))
+TRANSACTIONAL_WRITE_CONCERN = os.environ.get('TRANSACTIONAL_WRITE_CONCERN', 'majority')
+TRANSACTIONAL_WTIMEOUT_MS = int(os.environ.get('TRANSACTIONAL_WTIMEOUT_MS', '5000'))
+
+query_monitor = QueryMonitor()
+mongo_pool_metrics = ConnectionPoolMetrics()
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_pool_metrics, query_monitor], **client_options(
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS, MONGO_WAIT_QUEUE_TIMEOUT_MS, appname='dinedash-api'))
 db = client[os.environ['DB_NAME']]
+# Restaurants, menus and reviews; may be served by secondaries
+catalog_db = client.get_database(
+    os.environ['DB_NAME'], read_preference=read_preference(CATALOG_READ_PREFERENCE, CATALOG_MAX_STALENESS_SECONDS))
+# Orders and payments; acknowledged by a majority so they survive a failover
+txn_db = client.get_database(
+    os.environ['DB_NAME'], write_concern=write_concern(TRANSACTIONAL_WRITE_CONCERN, TRANSACTIONAL_WTIMEOUT_MS))
+# Admin analytics and listings; own pool, and every operation is bounded by maxTimeMS
+analytics_pool_metrics = ConnectionPoolMetrics()
+analytics_client = AsyncIOMotorClient(ANALYTICS_MONGO_URL, event_listeners=[analytics_pool_metrics, query_monitor], **client_options(
+    ANALYTICS_MAX_POOL_SIZE, max_idle_time_ms=MONGO_MAX_IDLE_TIME_MS, wait_queue_timeout_ms=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    timeout_ms=ANALYTICS_MAX_TIME_MS, appname='dinedash-analytics'))
+analytics_db = analytics_client.get_database(
+    os.environ['DB_NAME'], read_preference=read_preference(ANALYTICS_READ_PREFERENCE, ANALYTICS_MAX_STALENESS_SECONDS))
 
 # Configuration
 STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY')
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE', 'https://api.stripe.com')
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+STRIPE_TIMEOUT_SECONDS = float(os.environ.get('STRIPE_TIMEOUT_SECONDS', '10'))
+STRIPE_MAX_CONNECTIONS = int(os.environ.get('STRIPE_MAX_CONNECTIONS', '20'))
+STRIPE_BREAKER_FAILURES = int(os.environ.get('STRIPE_BREAKER_FAILURES', '5'))
+STRIPE_BREAKER_RESET_SECONDS = float(os.environ.get('STRIPE_BREAKER_RESET_SECONDS', '30'))
+PAYMENT_RECONCILE_INTERVAL_SECONDS = float(os.environ.get('PAYMENT_RECONCILE_INTERVAL_SECONDS', '10'))
+PAYMENT_RECONCILE_BATCH_SIZE = int(os.environ.get('PAYMENT_RECONCILE_BATCH_SIZE', '50'))
+PAYMENT_RECONCILE_RATE_PER_SECOND = float(os.environ.get('PAYMENT_RECONCILE_RATE_PER_SECOND', '5'))
+PAYMENT_STATUS_MAX_WAIT_SECONDS = float(os.environ.get('PAYMENT_STATUS_MAX_WAIT_SECONDS', '25'))
+PAYMENT_STATUS_NUDGE_SECONDS = float(os.environ.get('PAYMENT_STATUS_NUDGE_SECONDS', '3'))
+PAYMENT_EVENT_MAX_ATTEMPTS = int(os.environ.get('PAYMENT_EVENT_MAX_ATTEMPTS', '10'))
 RESEND_API_KEY = os.environ.get('RESEND_API_KEY')
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL')
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
@@ -33,13 +96,150 @@ TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
 TWILIO_VERIFY_SERVICE = os.environ.get('TWILIO_VERIFY_SERVICE')
 JWT_SECRET = os.environ.get('JWT_SECRET', 'secret')
 JWT_ALGORITHM = 'HS256'
+ACCESS_TOKEN_TTL_MINUTES = int(os.environ.get('ACCESS_TOKEN_TTL_MINUTES', '15'))
+REFRESH_TOKEN_TTL_DAYS = int(os.environ.get('REFRESH_TOKEN_TTL_DAYS', '7'))
+REVOCATION_SYNC_SECONDS = float(os.environ.get('REVOCATION_SYNC_SECONDS', '5'))
+INVALIDATION_BUS_ENABLED = os.environ.get('INVALIDATION_BUS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+INVALIDATION_BUS_SIZE_BYTES = int(os.environ.get('INVALIDATION_BUS_SIZE_BYTES', str(16 * 1024 * 1024)))
+INVALIDATION_MAX_STALENESS_SECONDS = float(os.environ.get('INVALIDATION_MAX_STALENESS_SECONDS', '5'))
+INVALIDATION_REPLAY_SECONDS = float(os.environ.get('INVALIDATION_REPLAY_SECONDS', '5'))
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_IP_PER_MINUTE = int(os.environ.get('RATE_LIMIT_IP_PER_MINUTE', '60'))
+RATE_LIMIT_EMAIL_PER_MINUTE = int(os.environ.get('RATE_LIMIT_EMAIL_PER_MINUTE', '20'))
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '0'))
+CALENDAR_HORIZON_DAYS = int(os.environ.get('CALENDAR_HORIZON_DAYS', '42'))
+CALENDAR_MAX_DAYS = int(os.environ.get('CALENDAR_MAX_DAYS', '90'))
+CALENDAR_CACHE_MAX_RESTAURANTS = int(os.environ.get('CALENDAR_CACHE_MAX_RESTAURANTS', '1000'))
+CALENDAR_CACHE_MAX_BYTES = int(os.environ.get('CALENDAR_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+AUTH_CRYPTO_WORKERS = int(os.environ.get('AUTH_CRYPTO_WORKERS', str(min(4, os.cpu_count() or 1))))
+AUTH_CRYPTO_MAX_QUEUE = int(os.environ.get('AUTH_CRYPTO_MAX_QUEUE', '64'))
+AUTH_CRYPTO_EXECUTOR = os.environ.get('AUTH_CRYPTO_EXECUTOR', 'thread')
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+INSIGHTS_UTC_OFFSET_MINUTES = int(os.environ.get('INSIGHTS_UTC_OFFSET_MINUTES', '0'))
+DELETION_BATCH_SIZE = int(os.environ.get('DELETION_BATCH_SIZE', '500'))
+DELETION_BATCH_PAUSE_SECONDS = float(os.environ.get('DELETION_BATCH_PAUSE_SECONDS', '0.05'))
+PLATFORM_STATS_REBUILD_SECONDS = float(os.environ.get('PLATFORM_STATS_REBUILD_SECONDS', '3600'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+QUERY_BUDGET_MAX_QUERIES = int(os.environ.get('QUERY_BUDGET_MAX_QUERIES', '50'))
+QUERY_BUDGET_MAX_REPEATS = int(os.environ.get('QUERY_BUDGET_MAX_REPEATS', '10'))
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '50'))
+TRACEMALLOC_FRAMES = int(os.environ.get('TRACEMALLOC_FRAMES', '25'))
+TRACEMALLOC_ON_START = os.environ.get('TRACEMALLOC_ON_START', 'false').lower() == 'true'
+
+# Seats-remaining calendar, kept current by the reservation routes
+availability_calendar = AvailabilityCalendarCache(
+    horizon_days=CALENDAR_HORIZON_DAYS,
+    max_restaurants=CALENDAR_CACHE_MAX_RESTAURANTS,
+    max_bytes=CALENDAR_CACHE_MAX_BYTES
+)
+
+# bcrypt runs on a bounded pool so password checks never block the event loop
+auth_crypto = AuthCryptoExecutor(
+    workers=AUTH_CRYPTO_WORKERS,
+    max_queue=AUTH_CRYPTO_MAX_QUEUE,
+    rounds=BCRYPT_ROUNDS,
+    mode=AUTH_CRYPTO_EXECUTOR
+)
+
+# Suspended users/restaurant owners, checked on every authenticated request
+revocation_list = RevocationList(sync_interval=REVOCATION_SYNC_SECONDS)
 
-# Resend setup
-resend.api_key = RESEND_API_KEY
+# Tells other workers to evict their calendars and refresh revocations; see invalidation_bus.py
+invalidation_bus = InvalidationBus(
+    size_bytes=INVALIDATION_BUS_SIZE_BYTES,
+    max_staleness=INVALIDATION_MAX_STALENESS_SECONDS,
+    replay_seconds=INVALIDATION_REPLAY_SECONDS
+)
+invalidation_bus.subscribe("calendar", availability_calendar.invalidate)
+invalidation_bus.subscribe("restaurant", availability_calendar.invalidate)
+invalidation_bus.subscribe("restaurant", lambda restaurant_id: revocation_list.refresh_restaurant(db, restaurant_id))
+invalidation_bus.subscribe("user", lambda user_id: revocation_list.refresh_user(db, user_id))
+invalidation_bus.on_reset(availability_calendar.clear)
+invalidation_bus.on_reset(lambda: revocation_list.load(db))
+
+# Login/signup throttling; 'mongo' backend shares counters across workers
+rate_limit_collection = db.rate_limits if RATE_LIMIT_BACKEND == 'mongo' else None
+ip_rate_limiter = RateLimiter("ip", RATE_LIMIT_IP_PER_MINUTE, collection=rate_limit_collection)
+email_rate_limiter = RateLimiter("email", RATE_LIMIT_EMAIL_PER_MINUTE, collection=rate_limit_collection)
+
+# One keep-alive Stripe client shared by every payment route
+payment_gateway = PaymentGateway(
+    api_key=STRIPE_API_KEY,
+    api_base=STRIPE_API_BASE,
+    webhook_secret=STRIPE_WEBHOOK_SECRET,
+    timeout=STRIPE_TIMEOUT_SECONDS,
+    max_connections=STRIPE_MAX_CONNECTIONS,
+    failure_threshold=STRIPE_BREAKER_FAILURES,
+    reset_timeout=STRIPE_BREAKER_RESET_SECONDS
+)
+
+# Pending payments are confirmed in the background; status reads can long-poll
+payment_status_waiters = StatusWaiters()
+payment_reconciler = PaymentReconciler(
+    payment_gateway,
+    on_paid=lambda session_id: confirm_payment(session_id),
+    batch_size=PAYMENT_RECONCILE_BATCH_SIZE,
+    checks_per_second=PAYMENT_RECONCILE_RATE_PER_SECOND,
+    interval=PAYMENT_RECONCILE_INTERVAL_SECONDS
+)
+
+# Webhooks are journaled and acknowledged at once, then applied by a consumer task
+payment_event_journal = PaymentEventJournal(
+    apply_event=lambda event: apply_payment_event(event),
+    max_attempts=PAYMENT_EVENT_MAX_ATTEMPTS
+)
+
+# Admin dashboard counters, maintained incrementally by the routes
+platform_stats = PlatformStats(rebuild_interval=PLATFORM_STATS_REBUILD_SECONDS)
+
+# Hourly/daily activity buckets behind the analytics endpoints
+analytics = AnalyticsRollups()
+
+# Item-level sales counters for the owner insights view
+sales_insights = SalesInsights(utc_offset_minutes=INSIGHTS_UTC_OFFSET_MINUTES)
+
+# Restaurant/user deletions cascade in the background, in throttled batches
+deletion_jobs = DeletionJobs(batch_size=DELETION_BATCH_SIZE, pause_seconds=DELETION_BATCH_PAUSE_SECONDS)
+
+# Identical concurrent reads share one in-flight query
+restaurant_reads = SingleFlight("restaurants")
+menu_reads = SingleFlight("menus")
+admin_stats_reads = SingleFlight("admin_stats")
+payment_status_reads = SingleFlight("payment_status")
+
+# Prometheus-format metrics; request metrics come from MetricsMiddleware
+metrics_registry = Registry()
+http_requests = metrics_registry.counter(
+    "dinedash_http_requests_total", "HTTP requests by method, route template and status", ["method", "route", "status"])
+http_request_latency = metrics_registry.histogram(
+    "dinedash_http_request_duration_seconds", "HTTP request latency by method and route template", ["method", "route"])
+notifications_sent = metrics_registry.counter(
+    "dinedash_notifications_total", "Notifications sent by channel and result", ["channel", "result"])
+mongo_timeouts = metrics_registry.counter(
+    "dinedash_mongo_timeouts_total", "Requests failed by a MongoDB operation timeout, by pool and route template", ["pool", "route"])
+notifications_in_flight = 0
+
+# Admin-triggered CPU sampling and tracemalloc snapshots
+sampling_profiler = SamplingProfiler(interval=PROFILE_INTERVAL_MS / 1000, keep=PROFILE_KEEP)
+memory_profiler = MemoryProfiler()
+if TRACEMALLOC_ON_START:
+    memory_profiler.start(TRACEMALLOC_FRAMES)
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+background_tasks = set()
+
+def start_background_task(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
 
-# Create the main app
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
+metrics_router = APIRouter()
 security = HTTPBearer()
 
 # Configure logging
@@ -70,11 +270,15 @@ class UserLogin(BaseModel):
 
 class TokenResponse(BaseModel):
     token: str
+    refresh_token: Optional[str] = None
     user_id: str
     email: str
     name: str
     role: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class Restaurant(BaseModel):
     model_config = ConfigDict(extra="ignore")
     restaurant_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -242,52 +446,136 @@ class Favorite(BaseModel):
 
 # ============= AUTH HELPERS =============
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+AUTH_BUSY_DETAIL = "Authentication service is busy, please retry shortly"
 
-def verify_password(password: str, password_hash: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+async def hash_password(password: str) -> str:
+    try:
+        return await auth_crypto.hash_password(password)
+    except AuthCryptoSaturated:
+        raise HTTPException(status_code=503, detail=AUTH_BUSY_DETAIL, headers={"Retry-After": "1"})
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    try:
+        return await auth_crypto.verify_password(password, password_hash)
+    except AuthCryptoSaturated:
+        raise HTTPException(status_code=503, detail=AUTH_BUSY_DETAIL, headers={"Retry-After": "1"})
+
+async def rehash_password(user_id: str, password: str, old_hash: str):
+    try:
+        new_hash = await auth_crypto.hash_password(password)
+    except AuthCryptoSaturated:
+        return  # Try again on a later login
+    # Compare-and-set so a concurrent password change is never overwritten
+    await db.users.update_one({"user_id": user_id, "password_hash": old_hash}, {"$set": {"password_hash": new_hash}})
+    logger.info(f"Rehashed password for user {user_id} at cost {auth_crypto.rounds}")
+
+async def enforce_email_rate_limit(email: str):
+    retry_after = await email_rate_limiter.hit(email.lower())
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many attempts, retry in {int(retry_after) + 1} seconds",
+            headers={"Retry-After": str(int(retry_after) + 1)}
+        )
+
+def schedule_rehash_if_needed(user: dict, password: str):
+    if auth_crypto.needs_rehash(user['password_hash']):
+        start_background_task(rehash_password(user['user_id'], password, user['password_hash']))
 
 def create_token(user_id: str, email: str, role: str) -> str:
     payload = {
         "user_id": user_id,
         "email": email,
         "role": role,
-        "exp": datetime.now(timezone.utc) + timedelta(days=7)
+        "type": "access",
+        "exp": datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_TTL_MINUTES)
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def create_refresh_token(user_id: str, email: str, name: str, role: str) -> str:
+    payload = {
+        "user_id": user_id,
+        "email": email,
+        "name": name,
+        "role": role,
+        "type": "refresh",
+        "jti": str(uuid.uuid4()),
+        "exp": datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_TTL_DAYS)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-def verify_token(token: str) -> dict:
+def issue_tokens(user_id: str, email: str, name: str, role: str) -> TokenResponse:
+    return TokenResponse(
+        token=create_token(user_id, email, role),
+        refresh_token=create_refresh_token(user_id, email, name, role),
+        user_id=user_id,
+        email=email,
+        name=name,
+        role=role
+    )
+
+def verify_token(token: str, token_type: str = "access") -> dict:
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    # Tokens issued before refresh tokens existed carry no type and act as access tokens
+    if payload.get("type", "access") != token_type:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
+def authorize(token: str) -> dict:
     payload = verify_token(token)
+    reason = revocation_list.revocation_reason(payload)
+    if reason:
+        raise HTTPException(status_code=403, detail=reason)
     return payload
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return authorize(credentials.credentials)
+
 async def get_current_restaurant_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-    payload = verify_token(token)
+    payload = authorize(credentials.credentials)
     if payload.get("role") != "restaurant":
         raise HTTPException(status_code=403, detail="Restaurant access required")
     return payload
 
 async def get_current_admin_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-    payload = verify_token(token)
+    payload = authorize(credentials.credentials)
     if payload.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return payload
 
+def is_admin_request(scope) -> bool:
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return False
+            try:
+                return authorize(token).get("role") == "admin"
+            except HTTPException:
+                return False
+    return False
+
 # ============= NOTIFICATION HELPERS =============
 
+_resend = None
+
+def get_resend():
+    # resend pulls in requests; import it on the first email rather than at startup
+    global _resend
+    if _resend is None:
+        import resend
+        resend.api_key = RESEND_API_KEY
+        _resend = resend
+    return _resend
+
 async def send_email_notification(recipient_email: str, subject: str, html_content: str):
+    global notifications_in_flight
+    notifications_in_flight += 1
     try:
         params = {
             "from": SENDER_EMAIL,
@@ -295,14 +583,19 @@ async def send_email_notification(recipient_email: str, subject: str, html_conte
             "subject": subject,
             "html": html_content
         }
-        email = await asyncio.to_thread(resend.Emails.send, params)
+        email = await asyncio.to_thread(get_resend().Emails.send, params)
         logger.info(f"Email sent to {recipient_email}")
+        notifications_sent.inc("email", "sent")
         return email
     except Exception as e:
         logger.error(f"Failed to send email to {recipient_email}: {str(e)}")
+        notifications_sent.inc("email", "failed")
+    finally:
+        notifications_in_flight -= 1
 
 async def send_sms_notification(phone: str, message: str):
     logger.info(f"SMS notification (simulated) to {phone}: {message}")
+    notifications_sent.inc("sms", "sent")
 
 # ============= AUTH ROUTES =============
 
@@ -314,7 +607,7 @@ async def customer_signup(user_data: UserSignup):
     
     user = User(
         email=user_data.email,
-        password_hash=hash_password(user_data.password),
+        password_hash=await hash_password(user_data.password),
         phone=user_data.phone,
         name=user_data.name,
         role="customer"
@@ -322,22 +615,23 @@ async def customer_signup(user_data: UserSignup):
     doc = user.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.users.insert_one(doc)
+    await platform_stats.user_created(db, user.role)
     
-    token = create_token(user.user_id, user.email, user.role)
-    return TokenResponse(token=token, user_id=user.user_id, email=user.email, name=user.name, role=user.role)
+    return issue_tokens(user.user_id, user.email, user.name, user.role)
 
 @api_router.post("/auth/customer/login", response_model=TokenResponse)
 async def customer_login(credentials: UserLogin):
-    user = await db.users.find_one({"email": credentials.email, "role": "customer"}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user['password_hash']):
+    await enforce_email_rate_limit(credentials.email)
+    user = await db.users.find_one({"email": credentials.email, "role": "customer", "status": {"$ne": "deleting"}}, {"_id": 0})
+    if not user or not await verify_password(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Check if user is suspended
     if user.get('status') == 'suspended':
         raise HTTPException(status_code=403, detail="Your account has been suspended. Please contact support.")
     
-    token = create_token(user['user_id'], user['email'], user['role'])
-    return TokenResponse(token=token, user_id=user['user_id'], email=user['email'], name=user['name'], role=user['role'])
+    schedule_rehash_if_needed(user, credentials.password)
+    return issue_tokens(user['user_id'], user['email'], user['name'], user['role'])
 
 @api_router.post("/auth/restaurant/signup", response_model=TokenResponse)
 async def restaurant_signup(user_data: UserSignup):
@@ -347,7 +641,7 @@ async def restaurant_signup(user_data: UserSignup):
     
     user = User(
         email=user_data.email,
-        password_hash=hash_password(user_data.password),
+        password_hash=await hash_password(user_data.password),
         phone=user_data.phone,
         name=user_data.name,
         role="restaurant"
@@ -355,14 +649,15 @@ async def restaurant_signup(user_data: UserSignup):
     doc = user.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.users.insert_one(doc)
+    await platform_stats.user_created(db, user.role)
     
-    token = create_token(user.user_id, user.email, user.role)
-    return TokenResponse(token=token, user_id=user.user_id, email=user.email, name=user.name, role=user.role)
+    return issue_tokens(user.user_id, user.email, user.name, user.role)
 
 @api_router.post("/auth/restaurant/login", response_model=TokenResponse)
 async def restaurant_login(credentials: UserLogin):
-    user = await db.users.find_one({"email": credentials.email, "role": "restaurant"}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user['password_hash']):
+    await enforce_email_rate_limit(credentials.email)
+    user = await db.users.find_one({"email": credentials.email, "role": "restaurant", "status": {"$ne": "deleting"}}, {"_id": 0})
+    if not user or not await verify_password(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Check if user is suspended
@@ -374,16 +669,46 @@ async def restaurant_login(credentials: UserLogin):
     if restaurant and restaurant.get('status') == 'suspended':
         raise HTTPException(status_code=403, detail="Your restaurant has been suspended. Please contact support.")
     
-    token = create_token(user['user_id'], user['email'], user['role'])
-    return TokenResponse(token=token, user_id=user['user_id'], email=user['email'], name=user['name'], role=user['role'])
+    schedule_rehash_if_needed(user, credentials.password)
+    return issue_tokens(user['user_id'], user['email'], user['name'], user['role'])
+
+@api_router.post("/auth/refresh", response_model=TokenResponse)
+async def refresh_access_token(body: RefreshRequest):
+    payload = verify_token(body.refresh_token, token_type="refresh")
+    reason = revocation_list.revocation_reason(payload)
+    if reason:
+        raise HTTPException(status_code=403, detail=reason)
+
+    # One lookup per refresh (not per request) so deleted accounts stop refreshing
+    user = await db.users.find_one({"user_id": payload['user_id']}, {"_id": 0, "user_id": 1, "status": 1})
+    if not user or user.get('status') == 'deleting':
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if user.get('status') == 'suspended':
+        revocation_list.set_user_suspended(payload['user_id'], True)
+        raise HTTPException(status_code=403, detail="Your account has been suspended. Please contact support.")
+
+    return TokenResponse(
+        token=create_token(payload['user_id'], payload['email'], payload['role']),
+        refresh_token=body.refresh_token,
+        user_id=payload['user_id'],
+        email=payload['email'],
+        name=payload.get('name', ''),
+        role=payload['role']
+    )
 
 # ============= RESTAURANT ROUTES =============
 
 @api_router.get("/restaurants")
 async def get_restaurants(search: Optional[str] = None, cuisine: Optional[str] = None, diet: Optional[str] = None, service_type: Optional[str] = None):
+    return await restaurant_reads.do(
+        ("list", search, cuisine, diet, service_type),
+        lambda: load_restaurants(search, cuisine, diet, service_type)
+    )
+
+async def load_restaurants(search: Optional[str], cuisine: Optional[str], diet: Optional[str], service_type: Optional[str]):
     query = {}
-    # Filter out suspended restaurants
-    query["status"] = {"$ne": "suspended"}
+    # Filter out suspended restaurants and ones being deleted
+    query["status"] = {"$nin": ["suspended", "deleting"]}
     
     if search:
         query["name"] = {"$regex": search, "$options": "i"}
@@ -396,15 +721,19 @@ async def get_restaurants(search: Optional[str] = None, cuisine: Optional[str] =
     if service_type:
         query["service_type"] = {"$in": [service_type, "both"]}
     
-    restaurants = await db.restaurants.find(query, {"_id": 0}).to_list(100)
+    restaurants = await catalog_db.restaurants.find(query, {"_id": 0}).to_list(100)
     
-    # Add ratings to each restaurant
+    # Ratings for the whole page in one aggregation
+    ratings = await catalog_db.reviews.aggregate([
+        {"$match": {"restaurant_id": {"$in": [r['restaurant_id'] for r in restaurants]}}},
+        {"$group": {"_id": "$restaurant_id", "total": {"$sum": "$rating"}, "count": {"$sum": 1}}}
+    ]).to_list(None)
+    ratings = {row['_id']: row for row in ratings}
     for restaurant in restaurants:
-        reviews = await db.reviews.find({"restaurant_id": restaurant['restaurant_id']}, {"_id": 0}).to_list(1000)
-        if reviews:
-            total_rating = sum(r['rating'] for r in reviews)
-            restaurant['average_rating'] = round(total_rating / len(reviews), 1)
-            restaurant['total_reviews'] = len(reviews)
+        rating = ratings.get(restaurant['restaurant_id'])
+        if rating:
+            restaurant['average_rating'] = round(rating['total'] / rating['count'], 1)
+            restaurant['total_reviews'] = rating['count']
         else:
             restaurant['average_rating'] = 0
             restaurant['total_reviews'] = 0
@@ -413,8 +742,11 @@ async def get_restaurants(search: Optional[str] = None, cuisine: Optional[str] =
 
 @api_router.get("/restaurants/{restaurant_id}")
 async def get_restaurant(restaurant_id: str):
-    restaurant = await db.restaurants.find_one({"restaurant_id": restaurant_id}, {"_id": 0})
-    if not restaurant:
+    restaurant = await restaurant_reads.do(
+        ("one", restaurant_id),
+        lambda: catalog_db.restaurants.find_one({"restaurant_id": restaurant_id}, {"_id": 0})
+    )
+    if not restaurant or restaurant.get('status') == 'deleting':
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
     # Check if restaurant is suspended
@@ -425,17 +757,23 @@ async def get_restaurant(restaurant_id: str):
 
 @api_router.get("/restaurants/{restaurant_id}/menu")
 async def get_restaurant_menu(restaurant_id: str, diet: Optional[str] = None):
-    categories = await db.menu_categories.find({"restaurant_id": restaurant_id}, {"_id": 0}).sort("display_order", 1).to_list(100)
+    return await menu_reads.do((restaurant_id, diet), lambda: load_restaurant_menu(restaurant_id, diet))
+
+async def load_restaurant_menu(restaurant_id: str, diet: Optional[str]):
+    categories = await catalog_db.menu_categories.find({"restaurant_id": restaurant_id}, {"_id": 0}).sort("display_order", 1).to_list(100)
+    
+    item_query = {"restaurant_id": restaurant_id, "category_id": {"$in": [c['category_id'] for c in categories]}}
+    if diet == "veg":
+        item_query["is_veg"] = True
+    elif diet == "non_veg":
+        item_query["is_veg"] = False
     
+    # One query for every category's items, grouped here
+    items_by_category = {}
+    async for item in catalog_db.menu_items.find(item_query, {"_id": 0}):
+        items_by_category.setdefault(item['category_id'], []).append(item)
     for category in categories:
-        item_query = {"restaurant_id": restaurant_id, "category_id": category['category_id']}
-        if diet == "veg":
-            item_query["is_veg"] = True
-        elif diet == "non_veg":
-            item_query["is_veg"] = False
-        
-        items = await db.menu_items.find(item_query, {"_id": 0}).to_list(100)
-        category['items'] = items
+        category['items'] = items_by_category.get(category['category_id'], [])[:100]
     
     return categories
 
@@ -445,6 +783,7 @@ async def create_restaurant(restaurant_data: RestaurantCreate, current_user: dic
     doc = restaurant.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.restaurants.insert_one(doc)
+    await platform_stats.restaurant_created(db)
     return restaurant
 
 @api_router.put("/restaurants/{restaurant_id}")
@@ -454,6 +793,8 @@ async def update_restaurant(restaurant_id: str, restaurant_data: RestaurantCreat
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
     await db.restaurants.update_one({"restaurant_id": restaurant_id}, {"$set": restaurant_data.model_dump()})
+    availability_calendar.invalidate(restaurant_id)
+    await invalidation_bus.publish(db, "restaurant", restaurant_id)
     return {"message": "Restaurant updated successfully"}
 
 # ============= MENU ROUTES =============
@@ -501,7 +842,7 @@ async def delete_menu_item(restaurant_id: str, item_id: str, current_user: dict
 async def create_order(order_data: OrderCreate, current_user: dict = Depends(get_current_user)):
     # Check if restaurant is suspended
     restaurant = await db.restaurants.find_one({"restaurant_id": order_data.restaurant_id}, {"_id": 0})
-    if not restaurant:
+    if not restaurant or restaurant.get('status') == 'deleting':
         raise HTTPException(status_code=404, detail="Restaurant not found")
     if restaurant.get('status') == 'suspended':
         raise HTTPException(status_code=403, detail="This restaurant is currently unavailable and not accepting orders")
@@ -533,7 +874,10 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
     doc['updated_at'] = doc['updated_at'].isoformat()
     if doc['estimated_delivery_time']:
         doc['estimated_delivery_time'] = doc['estimated_delivery_time'].isoformat()
-    await db.orders.insert_one(doc)
+    await txn_db.orders.insert_one(doc)
+    await platform_stats.order_created(db, doc)
+    await analytics.order_created(db, doc)
+    await sales_insights.order_created(db, doc)
     
     user = await db.users.find_one({"user_id": current_user['user_id']}, {"_id": 0})
     if user and user.get('email'):
@@ -549,7 +893,7 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
 
 @api_router.get("/orders/{order_id}")
 async def get_order(order_id: str, current_user: dict = Depends(get_current_user)):
-    order = await db.orders.find_one({"order_id": order_id}, {"_id": 0})
+    order = await txn_db.orders.find_one({"order_id": order_id}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if order['user_id'] != current_user['user_id']:
@@ -558,12 +902,12 @@ async def get_order(order_id: str, current_user: dict = Depends(get_current_user
 
 @api_router.get("/orders")
 async def get_user_orders(current_user: dict = Depends(get_current_user)):
-    orders = await db.orders.find({"user_id": current_user['user_id']}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    orders = await txn_db.orders.find({"user_id": current_user['user_id']}, {"_id": 0}).sort("created_at", -1).to_list(100)
     return orders
 
 @api_router.put("/orders/{order_id}/status")
 async def update_order_status(order_id: str, status_update: OrderStatusUpdate, current_user: dict = Depends(get_current_restaurant_user)):
-    order = await db.orders.find_one({"order_id": order_id}, {"_id": 0})
+    order = await txn_db.orders.find_one({"order_id": order_id}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -571,11 +915,8 @@ async def update_order_status(order_id: str, status_update: OrderStatusUpdate, c
     if not restaurant:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Update status timestamps
-    status_timestamps = order.get('status_timestamps', {})
     now = datetime.now(timezone.utc)
-    status_timestamps[status_update.status] = now.isoformat()
-    
+
     # Calculate new ETA based on status
     eta_minutes = {
         'ACCEPTED': 35,
@@ -589,13 +930,25 @@ async def update_order_status(order_id: str, status_update: OrderStatusUpdate, c
     
     update_data = {
         "status": status_update.status,
-        "status_timestamps": status_timestamps,
+        f"status_timestamps.{status_update.status}": now.isoformat(),
         "updated_at": now.isoformat()
     }
     if new_eta:
         update_data["estimated_delivery_time"] = new_eta
     
-    await db.orders.update_one({"order_id": order_id}, {"$set": update_data})
+    # Deltas come from the status this write replaced, not the one read above,
+    # so two concurrent transitions cannot both apply a cancellation
+    previous = await txn_db.orders.find_one_and_update(
+        {"order_id": order_id},
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not previous:
+        raise HTTPException(status_code=404, detail="Order not found")
+    await platform_stats.order_status_changed(db, previous.get('status'), status_update.status)
+    await analytics.order_status_changed(db, previous, previous.get('status'), status_update.status)
+    await sales_insights.order_status_changed(db, previous, previous.get('status'), status_update.status)
     
     user = await db.users.find_one({"user_id": order['user_id']}, {"_id": 0})
     if user and user.get('email'):
@@ -620,9 +973,127 @@ async def update_order_status(order_id: str, status_update: OrderStatusUpdate, c
 async def get_restaurant_orders(current_user: dict = Depends(get_current_restaurant_user)):
     restaurants = await db.restaurants.find({"owner_id": current_user['user_id']}, {"_id": 0}).to_list(10)
     restaurant_ids = [r['restaurant_id'] for r in restaurants]
-    orders = await db.orders.find({"restaurant_id": {"$in": restaurant_ids}}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    orders = await txn_db.orders.find({"restaurant_id": {"$in": restaurant_ids}}, {"_id": 0}).sort("created_at", -1).to_list(100)
     return orders
 
+def analytics_range(date_from: Optional[str], date_to: Optional[str]):
+    try:
+        end = parse_range_bound(date_to, end=True) if date_to else parse_range_bound(datetime.now(timezone.utc).isoformat(), end=True)
+        start = parse_range_bound(date_from) if date_from else end - timedelta(days=30)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    return start, end
+
+async def query_analytics(scope: str, date_from: Optional[str], date_to: Optional[str], granularity: str):
+    if granularity not in ("hour", "day"):
+        raise HTTPException(status_code=400, detail="Invalid granularity")
+    start, end = analytics_range(date_from, date_to)
+    try:
+        return await analytics.query(analytics_db, scope, start, end, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/restaurant/analytics")
+async def get_restaurant_analytics(
+    restaurant_id: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    granularity: str = "day",
+    current_user: dict = Depends(get_current_restaurant_user)
+):
+    query = {"owner_id": current_user['user_id']}
+    if restaurant_id:
+        query["restaurant_id"] = restaurant_id
+    restaurant = await db.restaurants.find_one(query, {"_id": 0, "restaurant_id": 1})
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    return await query_analytics(restaurant['restaurant_id'], date_from, date_to, granularity)
+
+@api_router.get("/restaurant/insights")
+async def get_restaurant_insights(
+    restaurant_id: Optional[str] = None,
+    top: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_current_restaurant_user)
+):
+    query = {"owner_id": current_user['user_id']}
+    if restaurant_id:
+        query["restaurant_id"] = restaurant_id
+    restaurant = await db.restaurants.find_one(query, {"_id": 0, "restaurant_id": 1})
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    return await sales_insights.read(analytics_db, restaurant['restaurant_id'], top=top)
+
+# ============= RESERVATION HELPERS =============
+
+def reservation_slot_key(restaurant_id: str, date: str, time: str) -> dict:
+    return {"restaurant_id": restaurant_id, "date": date, "time": time}
+
+async def reserve_seats(restaurant: dict, date: str, time: str, party_size: int) -> bool:
+    # Seats are claimed with a conditional $inc on one counter document per slot,
+    # so concurrent bookings can never push a slot past seat_capacity.
+    key = reservation_slot_key(restaurant['restaurant_id'], date, time)
+    capacity = restaurant.get('seat_capacity', 20)
+
+    slot = await db.reservation_slots.find_one(key, {"_id": 0, "booked": 1})
+    if slot is None:
+        # First booking for this slot: seed the counter from existing reservations
+        existing = await db.reservations.aggregate([
+            {"$match": {**key, "status": {"$in": ACTIVE_RESERVATION_STATUSES}}},
+            {"$group": {"_id": None, "booked": {"$sum": "$party_size"}}}
+        ]).to_list(1)
+        try:
+            await db.reservation_slots.insert_one({**key, "booked": existing[0]['booked'] if existing else 0})
+        except DuplicateKeyError:
+            pass
+
+    result = await db.reservation_slots.update_one(
+        {**key, "booked": {"$lte": capacity - party_size}},
+        {"$inc": {"booked": party_size}}
+    )
+    return result.modified_count == 1
+
+async def apply_reservation_seat_change(reservation: dict, old_status: Optional[str], new_status: str) -> bool:
+    seats = reservation_seat_delta(old_status, new_status, reservation.get('party_size', 0))
+    if not seats:
+        return True
+    if seats > 0:
+        # Re-activating a released reservation claims its seats again, under the same capacity guard
+        restaurant = await db.restaurants.find_one(
+            {"restaurant_id": reservation['restaurant_id']}, {"_id": 0, "restaurant_id": 1, "seat_capacity": 1})
+        if not restaurant or not await reserve_seats(restaurant, reservation['date'], reservation['time'], seats):
+            return False
+    else:
+        await db.reservation_slots.update_one(
+            reservation_slot_key(reservation['restaurant_id'], reservation['date'], reservation['time']),
+            {"$inc": {"booked": seats}}
+        )
+    availability_calendar.apply_delta(reservation['restaurant_id'], reservation['date'], reservation['time'], seats)
+    await invalidation_bus.publish(db, "calendar", reservation['restaurant_id'])
+    return True
+
+async def change_reservation_status(reservation: dict, new_status: str, extra_set: Optional[dict] = None, database=None) -> Optional[dict]:
+    """Returns the reservation as it was, or None if its status changed since it was read."""
+    # Conditional on the status the caller read, so two concurrent changes cannot both apply a seat delta
+    database = database if database is not None else db
+    old_status = reservation.get('status')
+    previous = await database.reservations.find_one_and_update(
+        {"reservation_id": reservation['reservation_id'], "status": old_status},
+        {"$set": {"status": new_status, **(extra_set or {})}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is None:
+        return None
+    if not await apply_reservation_seat_change(previous, old_status, new_status):
+        await database.reservations.update_one(
+            {"reservation_id": reservation['reservation_id'], "status": new_status},
+            {"$set": {"status": old_status}}
+        )
+        raise HTTPException(status_code=409, detail="Not enough seats available for this time slot")
+    return previous
+
 # ============= RESERVATION ROUTES =============
 
 @api_router.get("/restaurants/{restaurant_id}/availability")
@@ -635,7 +1106,7 @@ async def check_availability(restaurant_id: str, date: str, time: str):
         "restaurant_id": restaurant_id,
         "date": date,
         "time": time,
-        "status": {"$in": ["PENDING_PAYMENT", "CONFIRMED", "SEATED"]}
+        "status": {"$in": ACTIVE_RESERVATION_STATUSES}
     }, {"_id": 0}).to_list(100)
     
     booked_seats = sum(r.get('party_size', 0) for r in existing_reservations)
@@ -643,19 +1114,46 @@ async def check_availability(restaurant_id: str, date: str, time: str):
     
     return {"available": available_seats > 0, "available_seats": available_seats}
 
+@api_router.get("/restaurants/{restaurant_id}/availability/calendar")
+async def get_availability_calendar(restaurant_id: str, from_date: Optional[str] = Query(None, alias="from"), days: int = 14):
+    try:
+        start = datetime.strptime(from_date, "%Y-%m-%d").date() if from_date else datetime.now(timezone.utc).date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid from date, expected YYYY-MM-DD")
+    if days < 1 or days > CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {CALENDAR_MAX_DAYS}")
+
+    # A worker that may have missed another's invalidation reads through
+    calendar = availability_calendar.lookup(restaurant_id, start, days) if invalidation_bus.is_fresh() else None
+    if calendar is None:
+        restaurant = await db.restaurants.find_one({"restaurant_id": restaurant_id}, {"_id": 0})
+        if not restaurant or restaurant.get('status') == 'deleting':
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        if restaurant.get('status') == 'suspended':
+            raise HTTPException(status_code=403, detail="This restaurant is currently unavailable")
+        calendar = await availability_calendar.load(db, restaurant, start, days)
+
+    return {
+        "restaurant_id": restaurant_id,
+        "from": start.isoformat(),
+        "days": days,
+        "seat_capacity": calendar.capacity,
+        "slot_length_minutes": calendar.slot_length,
+        "dates": [(start + timedelta(days=d)).isoformat() for d in range(days)],
+        "slots": calendar.slot_labels(),
+        "available_seats": calendar.rows(start, days)
+    }
+
 @api_router.post("/reservations", response_model=Reservation)
 async def create_reservation(reservation_data: ReservationCreate, current_user: dict = Depends(get_current_user)):
     restaurant = await db.restaurants.find_one({"restaurant_id": reservation_data.restaurant_id}, {"_id": 0})
-    if not restaurant:
+    if not restaurant or restaurant.get('status') == 'deleting':
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
-    availability = await check_availability(
-        reservation_data.restaurant_id,
-        reservation_data.date,
-        reservation_data.time
-    )
-    
-    if not availability['available'] or availability['available_seats'] < reservation_data.party_size:
+    if reservation_data.party_size < 1:
+        raise HTTPException(status_code=400, detail="Party size must be at least 1")
+
+    if not await reserve_seats(restaurant, reservation_data.date, reservation_data.time, reservation_data.party_size):
         raise HTTPException(status_code=400, detail="Not enough seats available")
     
     amount = max(300.0, reservation_data.party_size * 100.0)
@@ -674,7 +1172,11 @@ async def create_reservation(reservation_data: ReservationCreate, current_user:
     doc = reservation.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.reservations.insert_one(doc)
-    
+    await platform_stats.reservation_created(db, doc)
+    await analytics.reservation_created(db, doc)
+    availability_calendar.apply_delta(reservation.restaurant_id, reservation.date, reservation.time, reservation.party_size)
+    await invalidation_bus.publish(db, "calendar", reservation.restaurant_id)
+
     return reservation
 
 @api_router.get("/reservations/{reservation_id}")
@@ -701,8 +1203,11 @@ async def update_reservation_status(reservation_id: str, status_update: Reservat
     if not restaurant:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    await db.reservations.update_one({"reservation_id": reservation_id}, {"$set": {"status": status_update.status}})
-    
+    if not await change_reservation_status(reservation, status_update.status):
+        raise HTTPException(status_code=409, detail="Reservation status changed, please retry")
+    await platform_stats.reservation_status_changed(db, reservation.get('status'), status_update.status)
+    await analytics.reservation_status_changed(db, reservation, reservation.get('status'), status_update.status)
+
     user = await db.users.find_one({"user_id": reservation['user_id']}, {"_id": 0})
     if user and user.get('email'):
         await send_email_notification(
@@ -740,18 +1245,19 @@ async def create_review(review_data: ReviewCreate, current_user: dict = Depends(
 
 @api_router.get("/restaurants/{restaurant_id}/reviews")
 async def get_restaurant_reviews(restaurant_id: str):
-    reviews = await db.reviews.find({"restaurant_id": restaurant_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    reviews = await catalog_db.reviews.find({"restaurant_id": restaurant_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
     
     # Get user names for reviews
-    for review in reviews:
-        user = await db.users.find_one({"user_id": review['user_id']}, {"_id": 0, "name": 1})
-        review['user_name'] = user.get('name', 'Anonymous') if user else 'Anonymous'
+    await batch_join(
+        reviews, "user_id", catalog_db.users, "user_id", {"name": 1}, "user_name",
+        transform=lambda user: user.get('name', 'Anonymous'), default='Anonymous'
+    )
     
     return reviews
 
 @api_router.get("/restaurants/{restaurant_id}/rating")
 async def get_restaurant_rating(restaurant_id: str):
-    reviews = await db.reviews.find({"restaurant_id": restaurant_id}, {"_id": 0}).to_list(1000)
+    reviews = await catalog_db.reviews.find({"restaurant_id": restaurant_id}, {"_id": 0}).to_list(1000)
     if not reviews:
         return {"average_rating": 0, "total_reviews": 0}
     
@@ -801,6 +1307,109 @@ async def get_favorites(current_user: dict = Depends(get_current_user)):
     restaurants = await db.restaurants.find({"restaurant_id": {"$in": restaurant_ids}}, {"_id": 0}).to_list(100)
     return restaurants
 
+# ============= PAYMENT HELPERS =============
+
+async def confirm_payment(session_id: str) -> Optional[dict]:
+    # The pending -> paid flip is atomic, so however many paths (webhook,
+    # reconciler) see the same payment, notifications go out exactly once.
+    # The order/reservation write is repeated for an already-paid transaction:
+    # it is idempotent and its revenue hooks are gated on the reference's own
+    # payment_status, so a retry or replay repairs a crash between the writes.
+    now = datetime.now(timezone.utc).isoformat()
+    transaction = await txn_db.payment_transactions.find_one_and_update(
+        {"session_id": session_id, "payment_status": {"$ne": "paid"}},
+        {"$set": {"payment_status": "paid", "updated_at": now}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    flipped = transaction is not None
+    if not flipped:
+        transaction = await txn_db.payment_transactions.find_one(
+            {"session_id": session_id, "payment_status": "paid"}, {"_id": 0})
+        if not transaction:
+            return None
+
+    payment_type = transaction['payment_type']
+    reference_id = transaction['reference_id']
+    user = await db.users.find_one({"user_id": transaction['user_id']}, {"_id": 0}) if flipped else None
+
+    if payment_type == "order":
+        order = await txn_db.orders.find_one_and_update(
+            {"order_id": reference_id},
+            {"$set": {"payment_status": "paid"}},
+            projection={"_id": 0, "restaurant_id": 1, "created_at": 1, "total_amount": 1, "payment_status": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        # Revenue counts once per order, however many sessions were paid for it
+        if order and order.get('payment_status') != "paid":
+            await platform_stats.payment_confirmed(db, payment_type, transaction.get('amount', 0))
+            await analytics.order_paid(db, order)
+        if user and user.get('email'):
+            await send_email_notification(
+                user['email'],
+                "Payment Confirmed - DineDash Reserve",
+                f"<h2>Payment Received!</h2><p>Your payment for order has been confirmed.</p>"
+            )
+    elif payment_type == "reservation":
+        previous = await confirm_reservation_payment(reference_id)
+        if previous and previous.get('payment_status') != "paid":
+            await platform_stats.payment_confirmed(db, payment_type, transaction.get('amount', 0))
+            await analytics.reservation_paid(db, previous)
+        if user and user.get('email'):
+            await send_email_notification(
+                user['email'],
+                "Reservation Confirmed - DineDash Reserve",
+                f"<h2>Reservation Confirmed!</h2><p>Your reservation payment has been received.</p>"
+            )
+
+    payment_status_waiters.notify(session_id)
+    return transaction if flipped else None
+
+async def confirm_reservation_payment(reservation_id: str) -> Optional[dict]:
+    # Only a reservation still waiting for payment is confirmed; one that was
+    # cancelled or expired first keeps its status and just records the payment
+    for _ in range(3):
+        reservation = await txn_db.reservations.find_one({"reservation_id": reservation_id}, {"_id": 0})
+        if not reservation:
+            return None
+        if reservation.get('status') != "PENDING_PAYMENT":
+            previous = await txn_db.reservations.find_one_and_update(
+                {"reservation_id": reservation_id},
+                {"$set": {"payment_status": "paid"}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.BEFORE
+            )
+            if previous and previous.get('payment_status') != "paid" \
+                    and reservation.get('status') not in ACTIVE_RESERVATION_STATUSES:
+                logger.warning(f"Payment received for {reservation.get('status')} reservation {reservation_id}; needs a refund")
+            return previous
+        previous = await change_reservation_status(reservation, "CONFIRMED", {"payment_status": "paid"}, database=txn_db)
+        if previous:
+            await platform_stats.reservation_status_changed(db, previous.get('status'), "CONFIRMED")
+            return previous
+    logger.error(f"Reservation {reservation_id} kept changing status while confirming its payment")
+    return None
+
+async def apply_payment_event(event: dict):
+    session_id = event.get('session_id')
+    if not session_id:
+        return
+    if event['event_type'] in ("checkout.session.completed", "checkout.session.async_payment_succeeded") \
+            and event.get('payment_status') == "paid":
+        await confirm_payment(session_id)
+    elif event['event_type'] == "checkout.session.expired":
+        await txn_db.payment_transactions.update_one(
+            {"session_id": session_id, "payment_status": "pending"},
+            {"$set": {"payment_status": "expired", "updated_at": datetime.now(timezone.utc).isoformat()}}
+        )
+
+async def read_payment_transaction(session_id: str):
+    # Success page, tracking page and retries poll the same session together
+    return await payment_status_reads.do(
+        session_id,
+        lambda: txn_db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
+    )
+
 # ============= PAYMENT ROUTES =============
 
 @api_router.post("/payments/checkout")
@@ -817,7 +1426,7 @@ async def create_checkout_session(request: Request, current_user: dict = Depends
     restaurant_id = None
     
     if payment_type == "order":
-        order = await db.orders.find_one({"order_id": reference_id}, {"_id": 0})
+        order = await txn_db.orders.find_one({"order_id": reference_id}, {"_id": 0})
         if not order or order['user_id'] != current_user['user_id']:
             raise HTTPException(status_code=404, detail="Order not found")
         amount = order['total_amount']
@@ -832,25 +1441,28 @@ async def create_checkout_session(request: Request, current_user: dict = Depends
         raise HTTPException(status_code=400, detail="Invalid payment type")
     
     host_url = origin_url.rstrip('/')
-    webhook_url = f"{host_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
     success_url = f"{host_url}/payment-success?session_id={{CHECKOUT_SESSION_ID}}"
     cancel_url = f"{host_url}/payment-cancel"
-    
-    checkout_request = CheckoutSessionRequest(
-        amount=amount,
-        currency="inr",
-        success_url=success_url,
-        cancel_url=cancel_url,
-        metadata={
-            "payment_type": payment_type,
-            "reference_id": reference_id,
-            "user_id": current_user['user_id']
-        }
-    )
-    
-    session = await stripe_checkout.create_checkout_session(checkout_request)
+    metadata = {
+        "payment_type": payment_type,
+        "reference_id": reference_id,
+        "user_id": current_user['user_id']
+    }
+
+    try:
+        session = await payment_gateway.create_checkout_session(
+            amount=amount,
+            currency="inr",
+            success_url=success_url,
+            cancel_url=cancel_url,
+            metadata=metadata
+        )
+    except PaymentGatewayUnavailable as e:
+        logger.error(f"Checkout session creation failed: {str(e)}")
+        raise HTTPException(status_code=503, detail="Payment service is temporarily unavailable")
+    except PaymentGatewayError as e:
+        logger.error(f"Checkout session creation rejected: {str(e)}")
+        raise HTTPException(status_code=502, detail="Could not start payment")
     
     transaction = PaymentTransaction(
         session_id=session.session_id,
@@ -861,188 +1473,185 @@ async def create_checkout_session(request: Request, current_user: dict = Depends
         payment_type=payment_type,
         reference_id=reference_id,
         payment_status="pending",
-        metadata=checkout_request.metadata
+        metadata=metadata
     )
     doc = transaction.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     doc['updated_at'] = doc['updated_at'].isoformat()
-    await db.payment_transactions.insert_one(doc)
+    await txn_db.payment_transactions.insert_one(doc)
     
     if payment_type == "order":
-        await db.orders.update_one({"order_id": reference_id}, {"$set": {"stripe_session_id": session.session_id}})
+        await txn_db.orders.update_one({"order_id": reference_id}, {"$set": {"stripe_session_id": session.session_id}})
     elif payment_type == "reservation":
-        await db.reservations.update_one({"reservation_id": reference_id}, {"$set": {"stripe_session_id": session.session_id}})
+        await txn_db.reservations.update_one({"reservation_id": reference_id}, {"$set": {"stripe_session_id": session.session_id}})
     
     return {"url": session.url, "session_id": session.session_id}
 
 @api_router.get("/payments/status/{session_id}")
-async def get_payment_status(session_id: str, current_user: dict = Depends(get_current_user)):
-    transaction = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
+async def get_payment_status(session_id: str, wait: float = 0, current_user: dict = Depends(get_current_user)):
+    # A cheap indexed read; Stripe is polled by the reconciler, not by page loads
+    transaction = await read_payment_transaction(session_id)
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
-    
-    if transaction['payment_status'] == "paid":
-        return transaction
-    
-    host_url = str(os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001'))
-    webhook_url = f"{host_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
-    try:
-        status_response = await stripe_checkout.get_checkout_status(session_id)
-        
-        if status_response.payment_status == "paid" and transaction['payment_status'] != "paid":
-            await db.payment_transactions.update_one(
-                {"session_id": session_id},
-                {"$set": {"payment_status": "paid", "updated_at": datetime.now(timezone.utc).isoformat()}}
-            )
-            
-            payment_type = transaction['payment_type']
-            reference_id = transaction['reference_id']
-            
-            if payment_type == "order":
-                await db.orders.update_one(
-                    {"order_id": reference_id},
-                    {"$set": {"payment_status": "paid"}}
-                )
-                user = await db.users.find_one({"user_id": transaction['user_id']}, {"_id": 0})
-                if user and user.get('email'):
-                    await send_email_notification(
-                        user['email'],
-                        "Payment Confirmed - DineDash Reserve",
-                        f"<h2>Payment Received!</h2><p>Your payment for order has been confirmed.</p>"
-                    )
-            elif payment_type == "reservation":
-                await db.reservations.update_one(
-                    {"reservation_id": reference_id},
-                    {"$set": {"payment_status": "paid", "status": "CONFIRMED"}}
-                )
-                user = await db.users.find_one({"user_id": transaction['user_id']}, {"_id": 0})
-                if user and user.get('email'):
-                    await send_email_notification(
-                        user['email'],
-                        "Reservation Confirmed - DineDash Reserve",
-                        f"<h2>Reservation Confirmed!</h2><p>Your reservation payment has been received.</p>"
-                    )
-            
-            transaction['payment_status'] = "paid"
-        
-        return transaction
-    except Exception as e:
-        logger.error(f"Error checking payment status: {str(e)}")
+
+    if transaction['payment_status'] != "pending":
         return transaction
 
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(max(wait, 0), PAYMENT_STATUS_MAX_WAIT_SECONDS)
+    next_nudge = loop.time()
+    while True:
+        if loop.time() >= next_nudge:
+            # Ask the reconciler for a prompt check, at most every few seconds per waiter
+            payment_reconciler.nudge(session_id)
+            next_nudge = loop.time() + PAYMENT_STATUS_NUDGE_SECONDS
+        if loop.time() >= deadline:
+            break
+        # Woken by a local confirmation, or re-read periodically for other workers'
+        await payment_status_waiters.wait(session_id, min(1.0, deadline - loop.time()))
+        transaction = await read_payment_transaction(session_id)
+        if transaction['payment_status'] != "pending":
+            break
+
+    return transaction
+
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
     body_bytes = await request.body()
     signature = request.headers.get("Stripe-Signature")
     
-    host_url = str(os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001'))
-    webhook_url = f"{host_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
     try:
-        webhook_response = await stripe_checkout.handle_webhook(body_bytes, signature)
-        
-        if webhook_response.payment_status == "paid":
-            session_id = webhook_response.session_id
-            transaction = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
-            
-            if transaction and transaction['payment_status'] != "paid":
-                await db.payment_transactions.update_one(
-                    {"session_id": session_id},
-                    {"$set": {"payment_status": "paid", "updated_at": datetime.now(timezone.utc).isoformat()}}
-                )
-                
-                payment_type = transaction['payment_type']
-                reference_id = transaction['reference_id']
-                
-                if payment_type == "order":
-                    await db.orders.update_one({"order_id": reference_id}, {"$set": {"payment_status": "paid"}})
-                elif payment_type == "reservation":
-                    await db.reservations.update_one({"reservation_id": reference_id}, {"$set": {"payment_status": "paid", "status": "CONFIRMED"}})
-        
-        return {"status": "success"}
-    except Exception as e:
+        event = payment_gateway.handle_webhook(body_bytes, signature)
+    except PaymentGatewayError as e:
         logger.error(f"Webhook error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=e.status_code or 400, detail=str(e))
+    if not event.event_id:
+        raise HTTPException(status_code=400, detail="Missing event id")
+
+    # Journal and acknowledge; the consumer task applies the event
+    recorded = await payment_event_journal.record(txn_db, event)
+    return {"status": "success", "duplicate": not recorded}
 
 # ============= ADMIN AUTH ROUTES =============
 
 @api_router.post("/auth/admin/login", response_model=TokenResponse)
 async def admin_login(credentials: UserLogin):
+    await enforce_email_rate_limit(credentials.email)
     user = await db.users.find_one({"email": credentials.email, "role": "admin"}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user['password_hash']):
+    if not user or not await verify_password(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid admin credentials")
     
-    token = create_token(user['user_id'], user['email'], user['role'])
-    return TokenResponse(token=token, user_id=user['user_id'], email=user['email'], name=user['name'], role=user['role'])
+    schedule_rehash_if_needed(user, credentials.password)
+    return issue_tokens(user['user_id'], user['email'], user['name'], user['role'])
 
 # ============= ADMIN DASHBOARD ROUTES =============
 
 @api_router.get("/admin/dashboard/stats")
 async def get_admin_dashboard_stats(current_user: dict = Depends(get_current_admin_user)):
-    # Get counts
-    total_users = await db.users.count_documents({"role": "customer"})
-    total_restaurants = await db.restaurants.count_documents({})
-    total_orders = await db.orders.count_documents({})
-    total_reservations = await db.reservations.count_documents({})
-    
-    # Get pending items
-    pending_orders = await db.orders.count_documents({"status": {"$in": ["PLACED", "ACCEPTED", "PREPARING"]}})
-    pending_reservations = await db.reservations.count_documents({"status": "PENDING_PAYMENT"})
-    
-    # Calculate revenue
-    orders = await db.orders.find({"payment_status": "paid"}, {"_id": 0, "total_amount": 1}).to_list(10000)
-    order_revenue = sum(o.get('total_amount', 0) for o in orders)
-    
-    reservations = await db.reservations.find({"payment_status": "paid"}, {"_id": 0, "amount": 1}).to_list(10000)
-    reservation_revenue = sum(r.get('amount', 0) for r in reservations)
-    
-    total_revenue = order_revenue + reservation_revenue
-    
-    # Get recent activity (last 7 days)
-    seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-    recent_orders = await db.orders.count_documents({"created_at": {"$gte": seven_days_ago}})
-    recent_reservations = await db.reservations.count_documents({"created_at": {"$gte": seven_days_ago}})
-    
-    return {
-        "total_users": total_users,
-        "total_restaurants": total_restaurants,
-        "total_orders": total_orders,
-        "total_reservations": total_reservations,
-        "pending_orders": pending_orders,
-        "pending_reservations": pending_reservations,
-        "total_revenue": total_revenue,
-        "order_revenue": order_revenue,
-        "reservation_revenue": reservation_revenue,
-        "recent_orders": recent_orders,
-        "recent_reservations": recent_reservations
-    }
+    # One lookup of the materialized counters; rebuilt by aggregation if missing
+    return await admin_stats_reads.do("dashboard", lambda: platform_stats.read(analytics_db))
+
+@api_router.get("/admin/analytics")
+async def get_admin_analytics(
+    restaurant_id: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    granularity: str = "day",
+    current_user: dict = Depends(get_current_admin_user)
+):
+    return await query_analytics(restaurant_id or PLATFORM_SCOPE, date_from, date_to, granularity)
+
+@api_router.post("/admin/analytics/backfill", status_code=202)
+async def start_analytics_backfill(current_user: dict = Depends(get_current_admin_user)):
+    if not analytics.backfill_state['running']:
+        analytics.backfill_state['running'] = True
+        start_background_task(analytics.run_backfill(db))
+    return analytics.backfill_state
+
+@api_router.get("/admin/analytics/backfill")
+async def get_analytics_backfill_status(current_user: dict = Depends(get_current_admin_user)):
+    return analytics.backfill_state
 
 # ============= ADMIN RESTAURANT MANAGEMENT =============
 
+async def restaurant_activity_totals(restaurant_ids: Optional[List[str]] = None) -> dict:
+    # One $group per collection instead of count/scan queries per restaurant
+    match = {"restaurant_id": {"$in": restaurant_ids}} if restaurant_ids is not None else {}
+    order_rows, reservation_rows = await asyncio.gather(
+        analytics_db.orders.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": "$restaurant_id",
+                "order_count": {"$sum": 1},
+                "revenue": {"$sum": {"$cond": [{"$eq": ["$payment_status", "paid"]}, "$total_amount", 0]}}
+            }}
+        ]).to_list(None),
+        analytics_db.reservations.aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$restaurant_id", "reservation_count": {"$sum": 1}}}
+        ]).to_list(None)
+    )
+    totals = {}
+    for row in order_rows:
+        totals.setdefault(row['_id'], {})
+        totals[row['_id']].update(order_count=row['order_count'], revenue=row['revenue'] or 0)
+    for row in reservation_rows:
+        totals.setdefault(row['_id'], {})['reservation_count'] = row['reservation_count']
+    return totals
+
+ADMIN_RESTAURANT_SORT_FIELDS = {"created_at", "name", "revenue", "order_count", "reservation_count"}
+
 @api_router.get("/admin/restaurants")
-async def admin_get_all_restaurants(current_user: dict = Depends(get_current_admin_user)):
-    restaurants = await db.restaurants.find({}, {"_id": 0}).to_list(1000)
-    
-    # Add owner info and stats for each restaurant
+async def admin_get_all_restaurants(
+    response: Response,
+    status: Optional[str] = None,
+    sort_by: str = "created_at",
+    order: str = "desc",
+    page: int = Query(1, ge=1),
+    page_size: int = Query(1000, ge=1, le=1000),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    if sort_by not in ADMIN_RESTAURANT_SORT_FIELDS or order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Invalid sort")
+
+    query = {"status": status} if status else {"status": {"$ne": "deleting"}}
+    skip = (page - 1) * page_size
+    direction = -1 if order == "desc" else 1
+
+    if sort_by in ("created_at", "name"):
+        total = await analytics_db.restaurants.count_documents(query)
+        restaurants = await analytics_db.restaurants.find(query, {"_id": 0}).sort([(sort_by, direction), ("restaurant_id", 1)]).skip(skip).limit(page_size).to_list(page_size)
+        totals = await restaurant_activity_totals([r['restaurant_id'] for r in restaurants])
+    else:
+        # Sorting by activity needs every restaurant's totals; only ids are loaded before slicing
+        ids = [r['restaurant_id'] for r in await analytics_db.restaurants.find(query, {"_id": 0, "restaurant_id": 1}).to_list(None)]
+        total = len(ids)
+        totals = await restaurant_activity_totals(ids)
+        ids.sort(key=lambda rid: (totals.get(rid, {}).get(sort_by, 0), rid), reverse=direction == -1)
+        page_ids = ids[skip:skip + page_size]
+        by_id = {r['restaurant_id']: r for r in await analytics_db.restaurants.find({"restaurant_id": {"$in": page_ids}}, {"_id": 0}).to_list(None)}
+        restaurants = [by_id[rid] for rid in page_ids if rid in by_id]
+
+    owner_ids = list({r['owner_id'] for r in restaurants})
+    owners = {
+        u['user_id']: {"name": u.get('name'), "email": u.get('email')}
+        for u in await analytics_db.users.find({"user_id": {"$in": owner_ids}}, {"_id": 0, "user_id": 1, "name": 1, "email": 1}).to_list(None)
+    }
     for restaurant in restaurants:
-        owner = await db.users.find_one({"user_id": restaurant['owner_id']}, {"_id": 0, "name": 1, "email": 1})
-        restaurant['owner'] = owner or {"name": "Unknown", "email": "Unknown"}
-        
-        # Get order stats
-        order_count = await db.orders.count_documents({"restaurant_id": restaurant['restaurant_id']})
-        reservation_count = await db.reservations.count_documents({"restaurant_id": restaurant['restaurant_id']})
-        restaurant['order_count'] = order_count
-        restaurant['reservation_count'] = reservation_count
-        
-        # Get revenue
-        orders = await db.orders.find({"restaurant_id": restaurant['restaurant_id'], "payment_status": "paid"}, {"_id": 0, "total_amount": 1}).to_list(10000)
-        restaurant['revenue'] = sum(o.get('total_amount', 0) for o in orders)
-    
+        stats = totals.get(restaurant['restaurant_id'], {})
+        restaurant['owner'] = owners.get(restaurant['owner_id']) or {"name": "Unknown", "email": "Unknown"}
+        restaurant['order_count'] = stats.get('order_count', 0)
+        restaurant['reservation_count'] = stats.get('reservation_count', 0)
+        restaurant['revenue'] = stats.get('revenue', 0)
+
+    response.headers["X-Total-Count"] = str(total)
     return restaurants
 
+@api_router.post("/admin/restaurants/{restaurant_id}/insights/rebuild")
+async def admin_rebuild_restaurant_insights(restaurant_id: str, current_user: dict = Depends(get_current_admin_user)):
+    orders = await sales_insights.rebuild(db, restaurant_id)
+    return {"message": "Sales insights rebuilt", "orders": orders}
+
 @api_router.put("/admin/restaurants/{restaurant_id}/status")
 async def admin_update_restaurant_status(restaurant_id: str, request: Request, current_user: dict = Depends(get_current_admin_user)):
     body = await request.json()
@@ -1051,44 +1660,100 @@ async def admin_update_restaurant_status(restaurant_id: str, request: Request, c
     if status not in ['approved', 'suspended', 'rejected']:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    result = await db.restaurants.update_one(
-        {"restaurant_id": restaurant_id},
-        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    # A restaurant being deleted stays that way while its data is cascaded
+    restaurant = await db.restaurants.find_one_and_update(
+        {"restaurant_id": restaurant_id, "status": {"$ne": "deleting"}},
+        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "owner_id": 1}
     )
-    
-    if result.matched_count == 0:
+
+    if not restaurant:
+        if await db.restaurants.find_one({"restaurant_id": restaurant_id}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="Restaurant is being deleted")
         raise HTTPException(status_code=404, detail="Restaurant not found")
-    
+
+    revocation_list.set_restaurant_owner_suspended(restaurant['owner_id'], status == 'suspended')
+
+    availability_calendar.invalidate(restaurant_id)
+    await invalidation_bus.publish(db, "restaurant", restaurant_id)
     return {"message": f"Restaurant {status} successfully"}
 
-@api_router.delete("/admin/restaurants/{restaurant_id}")
+async def mark_restaurant_deleting(restaurant_id: str) -> bool:
+    result = await db.restaurants.update_one(
+        {"restaurant_id": restaurant_id, "status": {"$ne": "deleting"}},
+        {"$set": {"status": "deleting", "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    availability_calendar.invalidate(restaurant_id)
+    await invalidation_bus.publish(db, "restaurant", restaurant_id)
+    if result.modified_count:
+        await platform_stats.restaurant_deleted(db)
+    return result.matched_count == 1
+
+@api_router.delete("/admin/restaurants/{restaurant_id}", status_code=202)
 async def admin_delete_restaurant(restaurant_id: str, current_user: dict = Depends(get_current_admin_user)):
-    # Delete restaurant and all related data
-    await db.restaurants.delete_one({"restaurant_id": restaurant_id})
-    await db.menu_categories.delete_many({"restaurant_id": restaurant_id})
-    await db.menu_items.delete_many({"restaurant_id": restaurant_id})
-    
-    return {"message": "Restaurant deleted successfully"}
+    # Hidden at once; menus, reviews, favorites etc. are removed by a background job
+    restaurant = await db.restaurants.find_one({"restaurant_id": restaurant_id}, {"_id": 0, "restaurant_id": 1})
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+
+    await mark_restaurant_deleting(restaurant_id)
+    job = await deletion_jobs.create(db, "restaurant", restaurant_id)
+    return {"message": "Restaurant deletion started", "job": job}
 
 # ============= ADMIN ORDER MANAGEMENT =============
 
-@api_router.get("/admin/orders")
-async def admin_get_all_orders(status: Optional[str] = None, current_user: dict = Depends(get_current_admin_user)):
-    query = {}
+async def admin_list_bookings(
+    collection,
+    id_field: str,
+    response: Response,
+    status: Optional[str],
+    restaurant_id: Optional[str],
+    customer_id: Optional[str],
+    date_from: Optional[str],
+    date_to: Optional[str],
+    cursor: Optional[str],
+    limit: int,
+    fields: Optional[str]
+):
+    try:
+        query = {**created_at_range(date_from, date_to), **keyset_filter("created_at", id_field, cursor)}
+        projection = parse_fields(fields, ("created_at", id_field, "restaurant_id", "user_id")) or {"_id": 0}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if status:
         query["status"] = status
-    
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    
-    # Add restaurant and user info
-    for order in orders:
-        restaurant = await db.restaurants.find_one({"restaurant_id": order['restaurant_id']}, {"_id": 0, "name": 1})
-        order['restaurant_name'] = restaurant['name'] if restaurant else "Unknown"
-        
-        user = await db.users.find_one({"user_id": order['user_id']}, {"_id": 0, "name": 1, "email": 1})
-        order['customer'] = user or {"name": "Unknown", "email": "Unknown"}
-    
-    return orders
+    if restaurant_id:
+        query["restaurant_id"] = restaurant_id
+    if customer_id:
+        query["user_id"] = customer_id
+
+    docs = await collection.find(query, projection).sort([("created_at", -1), (id_field, -1)]).limit(limit).to_list(limit)
+
+    # One $in lookup per referenced collection for the whole page
+    await batch_join(docs, "restaurant_id", analytics_db.restaurants, "restaurant_id", {"name": 1}, "restaurant_name",
+                     transform=lambda r: r.get('name', "Unknown"), default="Unknown")
+    await batch_join(docs, "user_id", analytics_db.users, "user_id", {"name": 1, "email": 1}, "customer",
+                     default={"name": "Unknown", "email": "Unknown"})
+
+    cursor = next_cursor(docs, limit, "created_at", id_field)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    return docs
+
+@api_router.get("/admin/orders")
+async def admin_get_all_orders(
+    response: Response,
+    status: Optional[str] = None,
+    restaurant_id: Optional[str] = None,
+    customer_id: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    return await admin_list_bookings(analytics_db.orders, "order_id", response, status, restaurant_id, customer_id, date_from, date_to, cursor, limit, fields)
 
 @api_router.put("/admin/orders/{order_id}/status")
 async def admin_update_order_status(order_id: str, status_update: OrderStatusUpdate, current_user: dict = Depends(get_current_admin_user)):
@@ -1096,39 +1761,41 @@ async def admin_update_order_status(order_id: str, status_update: OrderStatusUpd
     if status_update.status not in valid_statuses:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    result = await db.orders.update_one(
+    previous = await txn_db.orders.find_one_and_update(
         {"order_id": order_id},
         {"$set": {
             "status": status_update.status,
             "updated_at": datetime.now(timezone.utc).isoformat(),
             f"status_timestamps.{status_update.status}": datetime.now(timezone.utc).isoformat()
-        }}
+        }},
+        projection={"_id": 0, "status": 1, "restaurant_id": 1, "created_at": 1, "total_amount": 1, "items": 1},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if not previous:
         raise HTTPException(status_code=404, detail="Order not found")
-    
+
+    await platform_stats.order_status_changed(db, previous.get('status'), status_update.status)
+    await analytics.order_status_changed(db, previous, previous.get('status'), status_update.status)
+    await sales_insights.order_status_changed(db, previous, previous.get('status'), status_update.status)
     return {"message": "Order status updated"}
 
 # ============= ADMIN RESERVATION MANAGEMENT =============
 
 @api_router.get("/admin/reservations")
-async def admin_get_all_reservations(status: Optional[str] = None, current_user: dict = Depends(get_current_admin_user)):
-    query = {}
-    if status:
-        query["status"] = status
-    
-    reservations = await db.reservations.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    
-    # Add restaurant and user info
-    for reservation in reservations:
-        restaurant = await db.restaurants.find_one({"restaurant_id": reservation['restaurant_id']}, {"_id": 0, "name": 1})
-        reservation['restaurant_name'] = restaurant['name'] if restaurant else "Unknown"
-        
-        user = await db.users.find_one({"user_id": reservation['user_id']}, {"_id": 0, "name": 1, "email": 1})
-        reservation['customer'] = user or {"name": "Unknown", "email": "Unknown"}
-    
-    return reservations
+async def admin_get_all_reservations(
+    response: Response,
+    status: Optional[str] = None,
+    restaurant_id: Optional[str] = None,
+    customer_id: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    return await admin_list_bookings(analytics_db.reservations, "reservation_id", response, status, restaurant_id, customer_id, date_from, date_to, cursor, limit, fields)
 
 @api_router.put("/admin/reservations/{reservation_id}/status")
 async def admin_update_reservation_status(reservation_id: str, status_update: ReservationStatusUpdate, current_user: dict = Depends(get_current_admin_user)):
@@ -1136,32 +1803,59 @@ async def admin_update_reservation_status(reservation_id: str, status_update: Re
     if status_update.status not in valid_statuses:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    result = await db.reservations.update_one(
-        {"reservation_id": reservation_id},
-        {"$set": {"status": status_update.status}}
-    )
-    
-    if result.matched_count == 0:
+    reservation = await db.reservations.find_one({"reservation_id": reservation_id}, {"_id": 0})
+    if not reservation:
         raise HTTPException(status_code=404, detail="Reservation not found")
-    
+
+    previous = await change_reservation_status(reservation, status_update.status)
+    if not previous:
+        raise HTTPException(status_code=409, detail="Reservation status changed, please retry")
+
+    await platform_stats.reservation_status_changed(db, previous.get('status'), status_update.status)
+    await analytics.reservation_status_changed(db, previous, previous.get('status'), status_update.status)
+
     return {"message": "Reservation status updated"}
 
 # ============= ADMIN USER MANAGEMENT =============
 
 @api_router.get("/admin/users")
-async def admin_get_all_users(role: Optional[str] = None, current_user: dict = Depends(get_current_admin_user)):
+async def admin_get_all_users(
+    response: Response,
+    role: Optional[str] = None,
+    search: Optional[str] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    current_user: dict = Depends(get_current_admin_user)
+):
     # Only show customers in the users list (restaurants are managed in restaurants tab)
-    query = {"role": "customer"}
-    
-    users = await db.users.find(query, {"_id": 0, "password_hash": 0}).to_list(1000)
-    
-    # Add stats for each user
+    query = {"role": "customer", "status": status or {"$ne": "deleting"}}
+    if search:
+        pattern = {"$regex": re.escape(search.strip()), "$options": "i"}
+        query["$or"] = [{"email": pattern}, {"name": pattern}]
+    try:
+        query.update(keyset_filter("created_at", "user_id", cursor))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if "$or" in query and cursor:
+        # Both the search and the cursor use $or
+        query = {"$and": [{"$or": query.pop("$or")}, query]}
+
+    users = await analytics_db.users.find(query, {"_id": 0, "password_hash": 0}).sort([("created_at", -1), ("user_id", -1)]).limit(limit).to_list(limit)
+
+    # Two grouped counts for the page instead of two count queries per user
+    user_ids = [user['user_id'] for user in users]
+    order_counts, reservation_counts = await asyncio.gather(
+        grouped_counts(analytics_db.orders, "user_id", user_ids),
+        grouped_counts(analytics_db.reservations, "user_id", user_ids)
+    )
     for user in users:
-        order_count = await db.orders.count_documents({"user_id": user['user_id']})
-        reservation_count = await db.reservations.count_documents({"user_id": user['user_id']})
-        user['order_count'] = order_count
-        user['reservation_count'] = reservation_count
-    
+        user['order_count'] = order_counts.get(user['user_id'], 0)
+        user['reservation_count'] = reservation_counts.get(user['user_id'], 0)
+
+    cursor = next_cursor(users, limit, "created_at", "user_id")
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
     return users
 
 @api_router.put("/admin/users/{user_id}/status")
@@ -1172,17 +1866,22 @@ async def admin_update_user_status(user_id: str, request: Request, current_user:
     if status not in ['active', 'suspended']:
         raise HTTPException(status_code=400, detail="Invalid status")
     
+    # A user being deleted stays that way while their data is cascaded
     result = await db.users.update_one(
-        {"user_id": user_id},
+        {"user_id": user_id, "status": {"$ne": "deleting"}},
         {"$set": {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     
     if result.matched_count == 0:
+        if await db.users.find_one({"user_id": user_id}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="User is being deleted")
         raise HTTPException(status_code=404, detail="User not found")
-    
+
+    revocation_list.set_user_suspended(user_id, status == 'suspended')
+    await invalidation_bus.publish(db, "user", user_id)
     return {"message": f"User {status} successfully"}
 
-@api_router.delete("/admin/users/{user_id}")
+@api_router.delete("/admin/users/{user_id}", status_code=202)
 async def admin_delete_user(user_id: str, current_user: dict = Depends(get_current_admin_user)):
     user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
     if not user:
@@ -1191,30 +1890,399 @@ async def admin_delete_user(user_id: str, current_user: dict = Depends(get_curre
     if user['role'] == 'admin':
         raise HTTPException(status_code=400, detail="Cannot delete admin user")
     
-    # Delete user
-    await db.users.delete_one({"user_id": user_id})
-    
-    # If restaurant owner, delete their restaurant too
+    # Signed out and hidden at once; dependent data is cleaned up by a background job
+    result = await db.users.update_one(
+        {"user_id": user_id, "status": {"$ne": "deleting"}},
+        {"$set": {"status": "deleting", "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    if result.modified_count:
+        await platform_stats.user_deleted(db, user['role'])
+    revocation_list.set_user_suspended(user_id, True)
+    await invalidation_bus.publish(db, "user", user_id)
+
+    # If restaurant owner, their restaurants go with them
     if user['role'] == 'restaurant':
-        restaurant = await db.restaurants.find_one({"owner_id": user_id}, {"_id": 0})
-        if restaurant:
-            await db.restaurants.delete_one({"restaurant_id": restaurant['restaurant_id']})
-            await db.menu_categories.delete_many({"restaurant_id": restaurant['restaurant_id']})
-            await db.menu_items.delete_many({"restaurant_id": restaurant['restaurant_id']})
-    
-    return {"message": "User deleted successfully"}
-
-# Include the router in the main app
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+        for restaurant_id in await db.restaurants.distinct("restaurant_id", {"owner_id": user_id}):
+            await mark_restaurant_deleting(restaurant_id)
+
+    job = await deletion_jobs.create(db, "user", user_id)
+    return {"message": "User deletion started", "job": job}
+
+# ============= ADMIN JOBS =============
+
+@api_router.get("/admin/jobs")
+async def admin_list_jobs(status: Optional[str] = None, current_user: dict = Depends(get_current_admin_user)):
+    query = {"status": status} if status else {}
+    return await db.deletion_jobs.find(query, {"_id": 0, "lease_until": 0}).sort("created_at", -1).to_list(100)
+
+@api_router.get("/admin/jobs/{job_id}")
+async def admin_get_job(job_id: str, current_user: dict = Depends(get_current_admin_user)):
+    job = await db.deletion_jobs.find_one({"job_id": job_id}, {"_id": 0, "lease_until": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.post("/admin/jobs/{job_id}/retry")
+async def admin_retry_job(job_id: str, current_user: dict = Depends(get_current_admin_user)):
+    if not await deletion_jobs.retry(db, job_id):
+        raise HTTPException(status_code=400, detail="Only failed jobs can be retried")
+    return {"message": "Job queued for retry"}
+
+# ============= ADMIN EXPORTS =============
+
+@api_router.get("/admin/export/{collection}")
+async def admin_export(
+    collection: str,
+    format: str = "csv",
+    gzip: bool = False,
+    status: Optional[str] = None,
+    restaurant_id: Optional[str] = None,
+    customer_id: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    if collection not in EXPORTS:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Invalid format")
+
+    collection_name, id_field, columns = EXPORTS[collection]
+    try:
+        query = created_at_range(date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if status:
+        query["payment_status" if collection == "transactions" else "status"] = status
+    if restaurant_id:
+        query["restaurant_id"] = restaurant_id
+    if customer_id:
+        query["user_id"] = customer_id
+
+    cursor = db[collection_name].find(query, {"_id": 0}).sort([("created_at", 1), (id_field, 1)]).batch_size(EXPORT_BATCH_SIZE)
+    filename = f"{collection}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("text/csv" if format == "csv" else "application/x-ndjson")
+    return StreamingResponse(
+        stream_export(cursor, columns, format, gzip=gzip, batch_size=EXPORT_BATCH_SIZE),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# ============= ADMIN SYSTEM =============
+
+@api_router.get("/admin/cache/availability")
+async def admin_get_availability_cache(current_user: dict = Depends(get_current_admin_user)):
+    return availability_calendar.memory_report()
+
+@api_router.get("/admin/system/auth-crypto")
+async def admin_get_auth_crypto_stats(current_user: dict = Depends(get_current_admin_user)):
+    return auth_crypto.stats()
+
+@api_router.get("/admin/system/revocations")
+async def admin_get_revocation_stats(current_user: dict = Depends(get_current_admin_user)):
+    return revocation_list.stats()
+
+@api_router.get("/admin/system/invalidation-bus")
+async def admin_get_invalidation_bus_stats(current_user: dict = Depends(get_current_admin_user)):
+    return invalidation_bus.stats()
+
+@api_router.get("/admin/system/rate-limits")
+async def admin_get_rate_limit_stats(current_user: dict = Depends(get_current_admin_user)):
+    return {"ip": ip_rate_limiter.stats(), "email": email_rate_limiter.stats()}
+
+@api_router.get("/admin/system/payment-gateway")
+async def admin_get_payment_gateway_stats(current_user: dict = Depends(get_current_admin_user)):
+    return payment_gateway.stats()
+
+@api_router.get("/admin/system/payment-reconciler")
+async def admin_get_payment_reconciler_stats(current_user: dict = Depends(get_current_admin_user)):
+    return payment_reconciler.stats()
+
+@api_router.get("/admin/system/platform-stats")
+async def admin_get_platform_stats_status(current_user: dict = Depends(get_current_admin_user)):
+    return platform_stats.stats()
+
+@api_router.post("/admin/system/platform-stats/rebuild")
+async def admin_rebuild_platform_stats(current_user: dict = Depends(get_current_admin_user)):
+    await platform_stats.rebuild(db)
+    return await platform_stats.read(db)
+
+@api_router.get("/admin/system/singleflight")
+async def admin_get_singleflight_stats(current_user: dict = Depends(get_current_admin_user)):
+    return {flight.name: flight.stats() for flight in (restaurant_reads, menu_reads, admin_stats_reads, payment_status_reads)}
+
+@api_router.get("/admin/system/payment-events")
+async def admin_get_payment_event_stats(current_user: dict = Depends(get_current_admin_user)):
+    return {**payment_event_journal.stats(), **await payment_event_journal.backlog(txn_db)}
+
+@api_router.post("/admin/payments/events/replay")
+async def admin_replay_payment_events(
+    since: Optional[str] = None,
+    session_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    if not since and not session_id:
+        raise HTTPException(status_code=400, detail="Provide since or session_id")
+    replayed = await payment_event_journal.replay(txn_db, since=since, session_id=session_id)
+    return {"message": "Payment events queued for replay", "replayed": replayed}
+
+# ============= PROFILING =============
+
+@api_router.get("/admin/profiling/profiles")
+async def admin_list_profiles(current_user: dict = Depends(get_current_admin_user)):
+    return sampling_profiler.stats()
+
+@api_router.get("/admin/profiling/profiles/{profile_id}")
+async def admin_get_profile(
+    profile_id: str,
+    format: str = "json",
+    current_user: dict = Depends(get_current_admin_user)
+):
+    if format not in ("json", "folded"):
+        raise HTTPException(status_code=400, detail="Invalid format")
+    profile = sampling_profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        return Response(
+            content=profile.folded(),
+            media_type="text/plain",
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+        )
+    return {**profile.summary(), "top_functions": profile.top_functions(), "stacks": profile.folded()}
+
+@api_router.post("/admin/profiling/sample")
+async def admin_sample_worker(
+    seconds: float = Query(5, gt=0, le=60),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    # Everything this worker's event loop runs during the window
+    profile = sampling_profiler.start(f"worker window {seconds}s")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampling_profiler.stop(profile)
+    return {**profile.summary(), "top_functions": profile.top_functions()}
+
+@api_router.get("/admin/profiling/memory")
+async def admin_get_memory_status(current_user: dict = Depends(get_current_admin_user)):
+    return memory_profiler.status()
+
+@api_router.post("/admin/profiling/memory/start")
+async def admin_start_memory_tracing(
+    frames: int = Query(TRACEMALLOC_FRAMES, ge=1, le=100),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    return memory_profiler.start(frames)
+
+@api_router.post("/admin/profiling/memory/stop")
+async def admin_stop_memory_tracing(current_user: dict = Depends(get_current_admin_user)):
+    return memory_profiler.stop()
+
+@api_router.get("/admin/profiling/memory/snapshot")
+async def admin_memory_snapshot(
+    top: int = Query(25, ge=1, le=200),
+    group_by: str = "lineno",
+    compare: bool = False,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="Invalid group_by")
+    try:
+        # Snapshotting walks every traced block; keep it off the event loop
+        return await asyncio.to_thread(memory_profiler.snapshot, top, group_by, compare)
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="Memory tracing is off; POST /api/admin/profiling/memory/start first")
+
+# ============= METRICS =============
+
+metrics_registry.gauge_callback(
+    "dinedash_http_requests_in_flight", "HTTP requests currently being served", lambda: MetricsMiddleware.in_flight)
+mongo_pools = {"main": mongo_pool_metrics, "analytics": analytics_pool_metrics}
+mongo_pool_max_sizes = {"main": MONGO_MAX_POOL_SIZE, "analytics": ANALYTICS_MAX_POOL_SIZE}
+mongo_workloads = [
+    describe_workload("main"),
+    describe_workload("main", read_preference(CATALOG_READ_PREFERENCE, CATALOG_MAX_STALENESS_SECONDS)),
+    describe_workload("main", concern=write_concern(TRANSACTIONAL_WRITE_CONCERN, TRANSACTIONAL_WTIMEOUT_MS)),
+    describe_workload(
+        "analytics", read_preference(ANALYTICS_READ_PREFERENCE, ANALYTICS_MAX_STALENESS_SECONDS), timeout_ms=ANALYTICS_MAX_TIME_MS),
+]
+metrics_registry.gauge_callback(
+    "dinedash_mongo_pool_connections", "Open MongoDB connections, by pool",
+    lambda: {name: pool.open for name, pool in mongo_pools.items()}, label_name="pool")
+metrics_registry.gauge_callback(
+    "dinedash_mongo_pool_checked_out", "MongoDB connections checked out by operations, by pool",
+    lambda: {name: pool.checked_out for name, pool in mongo_pools.items()}, label_name="pool")
+metrics_registry.gauge_callback(
+    "dinedash_mongo_pool_max_size", "Configured maximum connections per MongoDB server, by pool",
+    lambda: mongo_pool_max_sizes, label_name="pool")
+metrics_registry.counter_callback(
+    "dinedash_mongo_pool_checkout_failures_total", "Failed MongoDB connection checkouts, by pool",
+    lambda: {name: pool.checkout_failures for name, pool in mongo_pools.items()}, label_name="pool")
+metrics_registry.gauge_callback(
+    "dinedash_mongo_workload_info", "Read preference, write concern and timeout of each MongoDB workload",
+    lambda: {(name, *(str(value) for value in settings.values())): 1 for name, settings in zip(
+        ("default", "catalog", "transactional", "analytics"), mongo_workloads)},
+    label_name=("workload", *mongo_workloads[0].keys()))
+metrics_registry.gauge_callback(
+    "dinedash_notifications_in_flight", "Notifications waiting on the email provider", lambda: notifications_in_flight)
+metrics_registry.gauge_callback(
+    "dinedash_payment_reconcile_queue", "Payment sessions queued for an immediate status check",
+    lambda: payment_reconciler.stats()["nudged_pending"])
+metrics_registry.counter_callback(
+    "dinedash_calendar_cache_hits_total", "Availability calendar cache hits", lambda: availability_calendar.hits)
+metrics_registry.counter_callback(
+    "dinedash_calendar_cache_misses_total", "Availability calendar cache misses", lambda: availability_calendar.misses)
+metrics_registry.counter_callback(
+    "dinedash_calendar_cache_evictions_total", "Availability calendar cache evictions", lambda: availability_calendar.evictions)
+metrics_registry.gauge_callback(
+    "dinedash_calendar_cache_bytes", "Bytes held by the availability calendar cache",
+    lambda: availability_calendar.memory_report()["total_bytes"])
+metrics_registry.counter_callback(
+    "dinedash_singleflight_calls_total", "Reads routed through single-flight, by cache",
+    lambda: {flight.name: flight.calls for flight in (restaurant_reads, menu_reads, admin_stats_reads, payment_status_reads)},
+    label_name="cache")
+metrics_registry.counter_callback(
+    "dinedash_singleflight_coalesced_total", "Reads served by joining an in-flight query, by cache",
+    lambda: {flight.name: flight.coalesced for flight in (restaurant_reads, menu_reads, admin_stats_reads, payment_status_reads)},
+    label_name="cache")
+metrics_registry.gauge_callback(
+    "dinedash_invalidation_lag_seconds", "Seconds since this worker last applied every published cache invalidation",
+    invalidation_bus.lag)
+metrics_registry.gauge_callback(
+    "dinedash_invalidation_fresh", "1 while the invalidation lag is within the staleness bound and caches are used",
+    lambda: int(invalidation_bus.is_fresh()))
+metrics_registry.counter_callback(
+    "dinedash_invalidation_events_published_total", "Cache invalidations published by this worker", lambda: invalidation_bus.published)
+metrics_registry.counter_callback(
+    "dinedash_invalidation_events_applied_total", "Cache invalidations from other workers applied", lambda: invalidation_bus.applied)
+metrics_registry.counter_callback(
+    "dinedash_invalidation_resets_total", "Whole-cache flushes after the invalidation stream was lost", lambda: invalidation_bus.resets)
+metrics_registry.gauge_callback(
+    "dinedash_auth_crypto_in_flight", "Password hashes queued or running", lambda: auth_crypto.stats()["in_flight"])
+metrics_registry.counter_callback(
+    "dinedash_payment_gateway_errors_total", "Failed payment provider calls", lambda: payment_gateway.errors)
+
+@metrics_router.get("/metrics")
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+async def ensure_indexes():
+    await db.reservations.create_index([("restaurant_id", 1), ("date", 1), ("time", 1)])
+    await db.reservations.create_index([("created_at", -1), ("reservation_id", -1)])
+    await db.reservations.create_index([("user_id", 1), ("created_at", -1)])
+    await db.reservations.create_index([("restaurant_id", 1), ("created_at", -1)])
+    await db.orders.create_index([("created_at", -1), ("order_id", -1)])
+    await db.orders.create_index([("restaurant_id", 1), ("created_at", -1)])
+    await db.orders.create_index([("user_id", 1), ("created_at", -1)])
+    await db.reservation_slots.create_index([("restaurant_id", 1), ("date", 1), ("time", 1)], unique=True)
+    await db.users.create_index("status")
+    await db.users.create_index([("role", 1), ("created_at", -1), ("user_id", -1)])
+    await db.restaurants.create_index("status")
+    await db.payment_transactions.create_index("session_id")
+    await db.payment_transactions.create_index([("payment_status", 1), ("next_check_at", 1)])
+    await db.payment_transactions.create_index([("created_at", -1), ("transaction_id", -1)])
+    await db.payment_events.create_index("event_id", unique=True)
+    await db.analytics_rollups.create_index([("scope", 1), ("grain", 1), ("bucket", 1)])
+    await db.deletion_jobs.create_index("job_id", unique=True)
+    await db.deletion_jobs.create_index([("status", 1), ("created_at", 1)])
+    for collection in ("menu_items", "menu_categories", "reviews", "favorites"):
+        await db[collection].create_index("restaurant_id")
+    for collection in ("reviews", "favorites", "payment_transactions"):
+        await db[collection].create_index("user_id")
+    await db.payment_events.create_index([("applied_at", 1), ("received_at", 1)])
+    await db.payment_events.create_index("session_id")
+    if RATE_LIMIT_BACKEND == 'mongo':
+        await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+
+async def start_background_workers():
+    await revocation_list.load(db)
+    start_background_task(revocation_list.sync_forever(db))
+    if INVALIDATION_BUS_ENABLED:
+        await invalidation_bus.ensure_collection(db)
+        start_background_task(invalidation_bus.run_forever(db))
+    start_background_task(payment_reconciler.run_forever(txn_db))
+    start_background_task(payment_event_journal.run_forever(txn_db))
+    start_background_task(platform_stats.run_forever(db))
+    start_background_task(deletion_jobs.run_forever(db))
 
-@app.on_event("shutdown")
 async def shutdown_db_client():
+    tasks = list(background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await payment_gateway.close()
     client.close()
+    analytics_client.close()
+    auth_crypto.shutdown()
+
+# Routes whose reads go to the analytics pool (ANALYTICS_MONGO_URL, maxTimeMS)
+ANALYTICS_ENDPOINTS = {
+    get_restaurant_analytics,
+    get_restaurant_insights,
+    get_admin_dashboard_stats,
+    get_admin_analytics,
+    admin_get_all_restaurants,
+    admin_get_all_orders,
+    admin_get_all_reservations,
+    admin_get_all_users,
+}
+
+async def mongo_error_handler(request: Request, exc: PyMongoError):
+    # Covers analytics maxTimeMS/timeoutMS expiries and waitQueueTimeoutMS
+    # checkouts on either pool; both mean the database is shedding load
+    if not exc.timeout:
+        raise exc
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    pool = "analytics" if request.scope.get("endpoint") in ANALYTICS_ENDPOINTS else "main"
+    mongo_timeouts.inc(pool, route)
+    logger.warning(f"MongoDB operation timed out on {request.method} {route} ({pool} pool): {exc}")
+    detail = "Query timed out, try a narrower range" if pool == "analytics" else "Database is busy, please retry"
+    return JSONResponse(status_code=503, content={"detail": detail})
+
+# ============= APP =============
+
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    await ensure_indexes()
+    await start_background_workers()
+    try:
+        yield
+    finally:
+        await shutdown_db_client()
+
+# `uvicorn server:create_app --factory`, or the module-level `app` below
+def create_app() -> FastAPI:
+    application = FastAPI(lifespan=lifespan)
+    application.include_router(api_router)
+    application.include_router(metrics_router)
+    application.add_exception_handler(PyMongoError, mongo_error_handler)
+
+    # Added before CORS so throttled responses still carry CORS headers
+    application.add_middleware(AuthRateLimitMiddleware, limiter=ip_rate_limiter, proxy_hops=RATE_LIMIT_PROXY_HOPS)
+
+    application.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Total-Count", "X-Next-Cursor", "X-Profile-Id"],
+    )
+
+    application.add_middleware(ProfilingMiddleware, profiler=sampling_profiler, is_admin=is_admin_request, sample_rate=PROFILE_SAMPLE_RATE)
+
+    application.add_middleware(
+        QueryAccountingMiddleware,
+        max_queries=QUERY_BUDGET_MAX_QUERIES,
+        max_repeats=QUERY_BUDGET_MAX_REPEATS,
+        strict=QUERY_BUDGET_STRICT
+    )
+
+    # Added last so it is outermost and times the full middleware stack
+    application.add_middleware(MetricsMiddleware, requests=http_requests, latency=http_request_latency)
+    return application
+
+app = create_app()
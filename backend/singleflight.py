@@ -0,0 +1,53 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+When many requests ask for the same thing at the same moment (a payment
+status right after checkout, a popular restaurant's menu, the admin
+dashboard), only the first caller runs the query; the others await its
+result. Nothing is cached: once the computation finishes the key is free and
+the next caller runs it again.
+
+The shared computation runs in its own task, so a caller that disconnects
+does not cancel it for everyone else. Results are shared objects and must be
+treated as read-only by callers.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": len(self._in_flight),
+            "coalesce_ratio": round(self.coalesced / self.calls, 3) if self.calls else 0.0,
+        }
@@ -0,0 +1,222 @@
+"""
+Unit tests for analytics rollup bucketing
+Tests: range bounds, day/hour bucket planning, cancellation deltas,
+backfill racing live increments
+"""
+import asyncio
+import copy
+from datetime import datetime, timezone
+
+import pytest
+from pymongo import DeleteOne
+from pymongo.errors import DuplicateKeyError
+
+from analytics_rollups import (
+    PLATFORM_SCOPE, AnalyticsRollups, bucket_keys, cancellation_delta, next_bucket, parse_range_bound, plan_buckets,
+)
+
+
+class TestRangeBounds:
+    """Ranges are hour-aligned UTC; date-only ends include the whole day"""
+
+    def test_date_only_end_is_exclusive_next_day(self):
+        assert parse_range_bound("2026-03-04", end=True) == datetime(2026, 3, 5, tzinfo=timezone.utc)
+
+    def test_end_inside_an_hour_includes_it(self):
+        assert parse_range_bound("2026-03-04T10:15:00+00:00", end=True) == datetime(2026, 3, 4, 11, tzinfo=timezone.utc)
+        assert parse_range_bound("2026-03-04T10:15:00+00:00") == datetime(2026, 3, 4, 10, tzinfo=timezone.utc)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_range_bound("soon")
+
+
+class TestPlanBuckets:
+    """Whole days use day buckets, partial days fall back to hours"""
+
+    def test_full_days_only(self):
+        days, hours = plan_buckets(parse_range_bound("2026-03-01"), parse_range_bound("2026-03-31", end=True))
+        assert len(days) == 31 and hours == []
+
+    def test_partial_edges(self):
+        start = datetime(2026, 3, 1, 22, tzinfo=timezone.utc)
+        end = datetime(2026, 3, 3, 2, tzinfo=timezone.utc)
+        days, hours = plan_buckets(start, end)
+        assert days == ["2026-03-02"]
+        assert hours == ["2026-03-01T22", "2026-03-01T23", "2026-03-03T00", "2026-03-03T01"]
+        print(f"✓ {len(days)} day + {len(hours)} hour buckets")
+
+
+class TestBucketing:
+    def test_bucket_keys_from_iso_string(self):
+        assert bucket_keys("2026-03-04T10:11:12.5+00:00") == ("2026-03-04T10", "2026-03-04")
+
+    def test_cancellation_delta(self):
+        assert cancellation_delta("PLACED", "CANCELLED") == 1
+        assert cancellation_delta("CANCELLED", "PLACED") == -1
+        assert cancellation_delta("PLACED", "ACCEPTED") == 0
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if isinstance(condition, dict) and "$exists" in condition:
+            if (key in doc) != condition["$exists"]:
+                return False
+        elif isinstance(condition, dict) and "$ne" in condition:
+            if doc.get(key) == condition["$ne"]:
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeRollups:
+    """Just enough of analytics_rollups for the live increments and the backfill"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def _update(self, query, update, upsert):
+        matched = [d for d in self.docs.values() if matches(d, query)]
+        if matched:
+            doc = matched[0]
+        elif not upsert:
+            return Result(matched_count=0, upserted_id=None)
+        elif query["_id"] in self.docs:
+            raise DuplicateKeyError("duplicate key")
+        else:
+            doc = self.docs[query["_id"]] = {"_id": query["_id"]}
+            doc.update(update.get("$setOnInsert", {}))
+        doc.update(update.get("$set", {}))
+        for key, value in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + value
+        return Result(matched_count=len(matched), upserted_id=None if matched else doc["_id"])
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            if isinstance(op, DeleteOne):
+                await self.delete_one(op._filter)
+            else:
+                try:
+                    self._update(op._filter, op._doc, op._upsert)
+                except DuplicateKeyError:
+                    pass
+        return Result(matched_count=0, upserted_count=0)
+
+    async def update_one(self, query, update, upsert=False):
+        return self._update(query, update, upsert)
+
+    async def delete_one(self, query):
+        for key, doc in list(self.docs.items()):
+            if matches(doc, query):
+                del self.docs[key]
+                return Result(deleted_count=1)
+        return Result(deleted_count=0)
+
+    def find(self, query, projection=None):
+        return Cursor([copy.deepcopy(d) for d in self.docs.values() if matches(d, query)])
+
+    async def find_one(self, query, projection=None):
+        found = self.find(query).docs
+        return found[0] if found else None
+
+
+class FakeDB:
+    def __init__(self):
+        self.analytics_rollups = FakeRollups()
+
+
+def order(order_id, created_at, total=100.0, restaurant_id="r1"):
+    return {
+        "order_id": order_id, "restaurant_id": restaurant_id, "created_at": created_at,
+        "total_amount": total, "payment_status": "paid", "status": "PLACED",
+    }
+
+
+class SourceOrders:
+    """Stands in for the orders aggregation, so a live order can land mid-backfill"""
+
+    def __init__(self, orders, during_first_aggregate=None):
+        self.orders = orders
+        self.during_first_aggregate = during_first_aggregate
+
+    async def aggregate(self, match):
+        snapshot = [o for o in self.orders if self._matches(o, match)]
+        if self.during_first_aggregate:
+            hook, self.during_first_aggregate = self.during_first_aggregate, None
+            await hook()
+        buckets = {}
+        for o in snapshot:
+            hour, day = bucket_keys(o["created_at"])
+            for scope in (PLATFORM_SCOPE, o["restaurant_id"]):
+                for key in (("hour", scope, hour), ("day", scope, day)):
+                    values = buckets.setdefault(key, {"orders": 0, "order_revenue": 0})
+                    values["orders"] += 1
+                    values["order_revenue"] += o["total_amount"]
+        return buckets
+
+    @staticmethod
+    def _matches(o, match):
+        created = match.get("created_at")
+        if created and not created["$gte"] <= o["created_at"] < created["$lt"]:
+            return False
+        return match.get("restaurant_id", o["restaurant_id"]) == o["restaurant_id"]
+
+
+class TestBackfill:
+    """The backfill rebuilds buckets without losing increments that land while it runs"""
+
+    def test_next_bucket(self):
+        assert next_bucket("hour", "2026-03-04T23") == "2026-03-05T00"
+        assert next_bucket("day", "2026-02-28") == "2026-03-01"
+
+    def test_live_increment_during_backfill_is_kept(self):
+        async def scenario():
+            db = FakeDB()
+            rollups = AnalyticsRollups()
+            existing = order("o1", "2026-03-04T10:05:00+00:00")
+            await rollups.order_created(db, existing)
+            source = SourceOrders([existing])
+
+            async def live_order():
+                # Committed after the aggregation read the orders, counted only by its $inc
+                late = order("o2", "2026-03-04T10:30:00+00:00", total=50.0)
+                source.orders.append(late)
+                await rollups.order_created(db, late)
+
+            source.during_first_aggregate = live_order
+            rollups._aggregate = lambda db, match: source.aggregate(match)
+            await rollups.backfill(db)
+            return db.analytics_rollups.docs
+
+        docs = asyncio.run(scenario())
+        for bucket_id in ("hour:platform:2026-03-04T10", "day:r1:2026-03-04"):
+            assert docs[bucket_id]["orders"] == 2
+            assert docs[bucket_id]["order_revenue"] == 150.0
+        print("✓ Live increment survives the rebuild")
+
+    def test_stale_bucket_is_removed(self):
+        async def scenario():
+            db = FakeDB()
+            rollups = AnalyticsRollups()
+            # Counted, but the order no longer exists
+            await rollups.order_created(db, order("gone", "2026-03-01T09:00:00+00:00"))
+            source = SourceOrders([])
+            rollups._aggregate = lambda db, match: source.aggregate(match)
+            await rollups.backfill(db)
+            return db.analytics_rollups.docs
+
+        assert asyncio.run(scenario()) == {}
@@ -0,0 +1,50 @@
+"""
+Unit tests for the bounded bcrypt executor
+Tests: hash/verify round trip, admission control, rehash detection
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("bcrypt")
+
+from auth_crypto import AuthCryptoExecutor, AuthCryptoSaturated, hash_cost
+
+
+class TestAuthCryptoExecutor:
+    """Password hashing off the event loop"""
+
+    def test_hash_and_verify_round_trip(self):
+        """Hashes use the configured cost and verify correctly"""
+        executor = AuthCryptoExecutor(workers=1, max_queue=4, rounds=4)
+
+        async def run():
+            hashed = await executor.hash_password("secret")
+            return hashed, await executor.verify_password("secret", hashed), await executor.verify_password("wrong", hashed)
+
+        hashed, good, bad = asyncio.run(run())
+        executor.shutdown()
+        assert hash_cost(hashed) == 4
+        assert good is True
+        assert bad is False
+        assert executor.stats()["hash_time"]["count"] == 1
+        assert executor.stats()["verify_time"]["count"] == 2
+
+    def test_rejects_when_saturated(self):
+        """Work beyond workers + queue is refused instead of queued"""
+        executor = AuthCryptoExecutor(workers=1, max_queue=1, rounds=4)
+
+        async def run():
+            return await asyncio.gather(*(executor.hash_password("pw") for _ in range(4)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        executor.shutdown()
+        assert sum(isinstance(r, AuthCryptoSaturated) for r in results) == 2
+        assert executor.stats()["rejected"] == 2
+
+    def test_needs_rehash_on_cost_change(self):
+        """Hashes made at another cost factor are flagged for rehash"""
+        executor = AuthCryptoExecutor(rounds=12)
+        assert executor.needs_rehash("$2b$10$abcdefghijklmnopqrstuv") is True
+        assert executor.needs_rehash("$2b$12$abcdefghijklmnopqrstuv") is False
+        assert executor.needs_rehash("not-a-hash") is False
@@ -0,0 +1,130 @@
+"""
+Unit tests for the in-process availability calendar cache
+Tests: matrix building, incremental deltas, racing builds, LRU eviction and memory reporting
+"""
+import asyncio
+from datetime import date
+
+from availability_cache import AvailabilityCalendarCache, reservation_seat_delta
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.rows:
+            raise StopAsyncIteration
+        return self.rows.pop(0)
+
+
+class FakeCollection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+        self.on_aggregate = None
+
+    def aggregate(self, pipeline):
+        self.calls += 1
+        if self.on_aggregate:
+            self.on_aggregate()
+        return FakeCursor(self.rows)
+
+
+class FakeDB:
+    def __init__(self, rows=()):
+        self.reservations = FakeCollection(list(rows))
+
+
+RESTAURANT = {"restaurant_id": "r1", "seat_capacity": 30, "slot_length_minutes": 60}
+START = date(2026, 3, 1)
+
+
+class TestAvailabilityCalendarCache:
+    """Calendar matrix and cache behaviour"""
+
+    def test_load_builds_remaining_seats(self):
+        """Aggregated bookings are subtracted from capacity in the right slot"""
+        db = FakeDB([{"_id": {"date": "2026-03-02", "time": "19:30"}, "seats": 8}])
+        cache = AvailabilityCalendarCache(horizon_days=7)
+        calendar = asyncio.run(cache.load(db, RESTAURANT, START, 3))
+
+        rows = calendar.rows(START, 3)
+        assert len(rows) == 3
+        assert len(rows[0]) == 24
+        assert rows[1][19] == 22
+        assert rows[0][19] == 30
+
+    def test_lookup_hit_avoids_database(self):
+        """A covered window is served from memory"""
+        db = FakeDB()
+        cache = AvailabilityCalendarCache(horizon_days=14)
+        asyncio.run(cache.load(db, RESTAURANT, START, 7))
+
+        assert cache.lookup("r1", date(2026, 3, 5), 7) is not None
+        assert cache.lookup("r1", date(2026, 3, 10), 7) is None
+        assert db.reservations.calls == 1
+
+    def test_apply_delta_updates_cached_matrix(self):
+        """Reservation changes adjust the cached entry in place"""
+        cache = AvailabilityCalendarCache(horizon_days=7)
+        asyncio.run(cache.load(FakeDB(), RESTAURANT, START, 7))
+
+        cache.apply_delta("r1", "2026-03-01", "12:00", 4)
+        cache.apply_delta("r1", "2026-03-01", "12:45", reservation_seat_delta("CONFIRMED", "CANCELLED", 2))
+        assert cache.lookup("r1", START, 1).rows(START, 1)[0][12] == 28
+
+    def test_build_racing_a_write_is_not_cached(self):
+        """A change that lands mid-build keeps the stale matrix out of the cache"""
+        db = FakeDB()
+        cache = AvailabilityCalendarCache(horizon_days=7)
+        db.reservations.on_aggregate = lambda: cache.apply_delta("r1", "2026-03-01", "12:00", 2)
+        asyncio.run(cache.load(db, RESTAURANT, START, 7))
+
+        assert cache.lookup("r1", START, 1) is None
+        assert cache._loading == {} and cache._versions == {}
+
+    def test_change_bookkeeping_is_bounded(self):
+        """Changes to restaurants nobody is building leave nothing behind"""
+        cache = AvailabilityCalendarCache(horizon_days=7, max_restaurants=2)
+        for i in range(50):
+            asyncio.run(cache.load(FakeDB(), dict(RESTAURANT, restaurant_id=f"r{i}"), START, 7))
+            cache.apply_delta(f"r{i}", "2026-03-01", "12:00", 1)
+            cache.invalidate(f"gone{i}")
+
+        assert len(cache.memory_report()["per_restaurant"]) == 2
+        assert cache._loading == {} and cache._versions == {}
+
+    def test_clear_drops_every_entry(self):
+        """A reset of the invalidation stream empties the cache"""
+        cache = AvailabilityCalendarCache(horizon_days=7)
+        asyncio.run(cache.load(FakeDB(), RESTAURANT, START, 7))
+        asyncio.run(cache.load(FakeDB(), {**RESTAURANT, "restaurant_id": "r2"}, START, 7))
+
+        cache.clear()
+        assert cache.lookup("r1", START, 1) is None
+        assert cache.memory_report()["total_bytes"] == 0
+
+    def test_lru_eviction_by_bytes(self):
+        """Least recently used restaurants are evicted once over budget"""
+        cache = AvailabilityCalendarCache(horizon_days=7)
+        first = asyncio.run(cache.load(FakeDB(), RESTAURANT, START, 7))
+        cache.max_bytes = first.nbytes * 2
+        asyncio.run(cache.load(FakeDB(), dict(RESTAURANT, restaurant_id="r2"), START, 7))
+        cache.lookup("r1", START, 7)
+        asyncio.run(cache.load(FakeDB(), dict(RESTAURANT, restaurant_id="r3"), START, 7))
+
+        report = cache.memory_report()
+        assert set(report["per_restaurant"]) == {"r1", "r3"}
+        assert report["evictions"] == 1
+        assert report["total_bytes"] == sum(e["bytes"] for e in report["per_restaurant"].values())
+
+    def test_seat_delta_transitions(self):
+        """Only moves in and out of the active set change seat counts"""
+        assert reservation_seat_delta(None, "PENDING_PAYMENT", 3) == 3
+        assert reservation_seat_delta("PENDING_PAYMENT", "CONFIRMED", 3) == 0
+        assert reservation_seat_delta("SEATED", "COMPLETED", 3) == -3
+        assert reservation_seat_delta("CANCELLED", "NO_SHOW", 3) == 0
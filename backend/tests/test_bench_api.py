@@ -0,0 +1,43 @@
+"""
+Unit tests for the benchmark report helpers
+Tests: latency summaries, baseline regression detection, startup phases
+"""
+from benchmarks.bench_api import compare, summarize
+from benchmarks.bench_startup import compare_startup, summarize_runs
+
+
+class TestBenchReport:
+    """Summaries and baseline comparison"""
+
+    def test_summarize_percentiles(self):
+        summary = summarize([i / 1000 for i in range(1, 101)], errors=2, elapsed=0.5)
+        assert summary["requests"] == 100 and summary["errors"] == 2
+        assert summary["throughput_rps"] == 200.0
+        assert summary["p50_ms"] == 51.0 and summary["p95_ms"] == 95.0 and summary["p99_ms"] == 99.0
+
+    def test_compare_flags_only_regressions(self):
+        baseline = {
+            "menu": {"p95_ms": 10.0, "throughput_rps": 100.0},
+            "orders": {"p95_ms": 10.0, "throughput_rps": 100.0},
+        }
+        results = {
+            "menu": {"p95_ms": 11.0, "throughput_rps": 95.0},
+            "orders": {"p95_ms": 15.0, "throughput_rps": 70.0},
+            "new_scenario": {"p95_ms": 1.0, "throughput_rps": 1.0},
+        }
+        regressions = compare(results, baseline, tolerance=0.2)
+        assert len(regressions) == 2
+        assert all(line.startswith("orders:") for line in regressions)
+        print(f"✓ {regressions}")
+
+
+class TestStartupReport:
+    """Startup phases are compared by median"""
+
+    def test_medians_and_regressions(self):
+        runs = [{"import_ms": value, "startup_ms": 0.2} for value in (500.0, 520.0, 900.0)]
+        results = summarize_runs(runs)
+        assert results["import_ms"] == {"median_ms": 520.0, "min_ms": 500.0, "max_ms": 900.0}
+        baseline = {"import_ms": {"median_ms": 400.0}, "startup_ms": {"median_ms": 0.1}}
+        # Sub-millisecond phases never count as regressions
+        assert compare_startup(results, baseline, tolerance=0.2) == ["import_ms: median 400.0ms -> 520.0ms"]
@@ -0,0 +1,27 @@
+"""
+Unit tests for background cascade deletion plans
+Tests: step ordering, anonymization of financial records
+"""
+from deletion_jobs import DELETED_USER_ID, restaurant_steps, user_steps
+
+
+class TestDeletionPlans:
+    """The entity document is always removed last, after its dependents"""
+
+    def test_restaurant_document_goes_last(self):
+        steps = restaurant_steps("r1")
+        assert steps[-1].collection == "restaurants" and steps[-1].update is None
+        assert {s.collection for s in steps if s.update is None} >= {"menu_items", "menu_categories", "reviews", "favorites"}
+
+    def test_restaurant_orders_are_flagged_not_deleted(self):
+        orders = next(s for s in restaurant_steps("r1") if s.collection == "orders")
+        assert orders.update == {"$set": {"restaurant_deleted": True}}
+        # Flagged orders no longer match, so a resumed job skips them
+        assert orders.query["restaurant_deleted"] == {"$ne": True}
+
+    def test_user_financial_records_are_anonymized(self):
+        steps = {s.collection: s for s in user_steps("u1")}
+        for collection in ("orders", "reservations", "payment_transactions"):
+            assert steps[collection].update["$set"]["user_id"] == DELETED_USER_ID
+        assert steps["orders"].update["$set"]["delivery_address"] == ""
+        assert user_steps("u1")[-1].collection == "users"
@@ -0,0 +1,184 @@
+"""
+Unit tests for the cross-worker invalidation bus
+Tests: publishing, applying other workers' events, staleness bound, reset after a lost stream
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from invalidation_bus import InvalidationBus
+
+
+class FakeTailCursor:
+    """Yields the queued events, then reports one empty await and dies"""
+
+    def __init__(self, events):
+        self.events = list(events)
+        self.alive = True
+        self.await_ms = None
+
+    def max_await_time_ms(self, ms):
+        self.await_ms = ms
+        return self
+
+    async def next(self):
+        if self.events:
+            return self.events.pop(0)
+        self.alive = False
+        raise StopAsyncIteration
+
+
+class FakeCollection:
+    def __init__(self, events=(), capped=True):
+        self.inserted = []
+        self.cursor = FakeTailCursor(events)
+        self.filters = []
+        self.capped = capped
+
+    async def options(self):
+        return {"capped": True, "size": 1024} if self.capped else {}
+
+    async def find_one(self, query, projection=None):
+        return self.inserted[0] if self.inserted else None
+
+    async def insert_one(self, doc):
+        self.inserted.append(doc)
+
+    def find(self, query, cursor_type=None):
+        self.filters.append(query)
+        return self.cursor
+
+
+class FakeDB:
+    def __init__(self, events=(), capped=True):
+        self.collection = FakeCollection(events, capped)
+        self.created = []
+
+    async def create_collection(self, name, **options):
+        self.created.append((name, options))
+
+    def __getitem__(self, name):
+        return self.collection
+
+
+def event(entity, entity_id, origin="other", age=0.0):
+    return {
+        "entity": entity,
+        "entity_id": entity_id,
+        "version": 1,
+        "origin": origin,
+        "published_at": datetime.now(timezone.utc) - timedelta(seconds=age),
+    }
+
+
+class TestPublishAndApply:
+    """Events from other workers reach the subscribed handlers"""
+
+    def test_publish_records_origin_and_version(self):
+        bus = InvalidationBus()
+        db = FakeDB()
+        asyncio.run(bus.ensure_collection(db))
+        asyncio.run(bus.publish(db, "restaurant", "r1"))
+        asyncio.run(bus.publish(db, "restaurant", "r2"))
+        marker, first, second = db.collection.inserted
+        assert marker["entity"] == "bus"
+        assert first["origin"] == bus.worker_id
+        assert (first["entity"], first["entity_id"]) == ("restaurant", "r1")
+        assert second["version"] == first["version"] + 1
+        assert bus.published == 2
+
+    def test_publish_is_a_no_op_until_set_up(self):
+        bus = InvalidationBus()
+        db = FakeDB()
+        asyncio.run(bus.publish(db, "restaurant", "r1"))
+        assert db.collection.inserted == []
+        assert bus.published == 0
+
+    def test_uncapped_collection_is_refused(self):
+        bus = InvalidationBus()
+        db = FakeDB(capped=False)
+        with pytest.raises(RuntimeError):
+            asyncio.run(bus.ensure_collection(db))
+        assert not bus.ready
+
+    def test_sync_and_async_handlers(self):
+        bus = InvalidationBus()
+        evicted, refreshed = [], []
+
+        async def refresh(entity_id):
+            refreshed.append(entity_id)
+
+        bus.subscribe("restaurant", evicted.append)
+        bus.subscribe("restaurant", refresh)
+        asyncio.run(bus.apply(event("restaurant", "r1")))
+        assert evicted == ["r1"]
+        assert refreshed == ["r1"]
+        assert bus.applied == 1
+
+    def test_own_events_are_skipped(self):
+        bus = InvalidationBus()
+        evicted = []
+        bus.subscribe("calendar", evicted.append)
+        asyncio.run(bus.apply(event("calendar", "r1", origin=bus.worker_id)))
+        assert evicted == []
+
+    def test_failing_handler_does_not_stop_others(self):
+        bus = InvalidationBus()
+        evicted = []
+        bus.subscribe("user", lambda user_id: 1 / 0)
+        bus.subscribe("user", evicted.append)
+        asyncio.run(bus.apply(event("user", "u1")))
+        assert evicted == ["u1"]
+        assert bus.handler_failures == 1
+
+
+class TestStaleness:
+    """Caches are bypassed once the worker falls too far behind"""
+
+    def test_unstarted_bus_is_fresh(self):
+        bus = InvalidationBus(max_staleness=1.0)
+        assert bus.is_fresh()
+
+    def test_lag_beyond_bound_is_not_fresh(self):
+        bus = InvalidationBus(max_staleness=1.0)
+        bus.started = True
+        asyncio.run(bus.apply(event("calendar", "r1", age=3.0)))
+        assert bus.lag() >= 3.0
+        assert not bus.is_fresh()
+        asyncio.run(bus.apply(event("calendar", "r2")))
+        assert bus.is_fresh()
+
+    def test_empty_await_marks_caught_up(self):
+        bus = InvalidationBus(max_staleness=1.0, await_seconds=0.5)
+        bus.started = True
+        bus.caught_up_at = time.time() - 10
+        db = FakeDB([event("calendar", "r1", age=10.0)])
+        asyncio.run(bus.tail(db, time.time() - 20))
+        assert db.collection.cursor.await_ms == 500
+        assert bus.applied == 1
+        assert bus.is_fresh()
+        print("✓ An empty await on the tailable cursor bounds the lag")
+
+
+class TestReset:
+    """A lost stream flushes every cache and replays a window"""
+
+    def test_reset_runs_handlers_and_returns_replay_start(self):
+        bus = InvalidationBus(max_staleness=1.0, replay_seconds=5.0)
+        bus.started = True
+        bus.caught_up_at = time.time() - 60
+        cleared = []
+
+        async def reload():
+            cleared.append("revocations")
+
+        bus.on_reset(lambda: cleared.append("calendar"))
+        bus.on_reset(reload)
+        before = time.time()
+        since = asyncio.run(bus.reset())
+        assert cleared == ["calendar", "revocations"]
+        assert before - 5.0 <= since <= time.time() - 5.0
+        assert bus.resets == 1
+        assert bus.is_fresh()
@@ -0,0 +1,100 @@
+"""
+Unit tests for admin listing helpers
+Tests: batch joins with one query per collection, keyset cursors, date ranges,
+field projections
+"""
+import asyncio
+
+import pytest
+
+from listing import batch_join, created_at_range, decode_cursor, encode_cursor, keyset_filter, parse_fields
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def to_list(self, length):
+        return self.rows
+
+
+class FakeCollection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def find(self, query, projection):
+        self.queries.append(query)
+        ids = set(next(iter(query.values()))["$in"])
+        key = next(iter(query))
+        return FakeCursor([
+            {k: v for k, v in row.items() if k in projection} for row in self.rows if row[key] in ids
+        ])
+
+
+class TestBatchJoin:
+    """Foreign keys for a page are resolved with a single $in query"""
+
+    def test_one_query_for_many_documents(self):
+        restaurants = FakeCollection([{"restaurant_id": "r1", "name": "One"}, {"restaurant_id": "r2", "name": "Two"}])
+        docs = [{"restaurant_id": rid} for rid in ("r1", "r2", "r1", "missing")]
+
+        asyncio.run(batch_join(docs, "restaurant_id", restaurants, "restaurant_id", {"name": 1}, "restaurant_name",
+                               transform=lambda r: r["name"], default="Unknown"))
+
+        assert [d["restaurant_name"] for d in docs] == ["One", "Two", "One", "Unknown"]
+        assert len(restaurants.queries) == 1
+        print(f"✓ 4 documents joined with {len(restaurants.queries)} query")
+
+
+class TestKeysetCursor:
+    """Cursors resume strictly after the last row"""
+
+    def test_round_trip(self):
+        cursor = encode_cursor(("2026-01-01T00:00:00+00:00", "o-9"))
+        assert decode_cursor(cursor) == ["2026-01-01T00:00:00+00:00", "o-9"]
+
+    def test_filter_for_descending_order(self):
+        cursor = encode_cursor(("2026-01-01", "o-9"))
+        assert keyset_filter("created_at", "order_id", cursor) == {"$or": [
+            {"created_at": {"$lt": "2026-01-01"}},
+            {"created_at": "2026-01-01", "order_id": {"$lt": "o-9"}},
+        ]}
+
+    def test_garbage_cursor_is_rejected(self):
+        with pytest.raises(ValueError):
+            keyset_filter("created_at", "order_id", "not-a-cursor")
+
+    def test_operator_values_are_rejected(self):
+        for values in (({"$gt": ""}, "o-9"), ("2026-01-01", ["o-9"]), ("2026-01-01", None), (True, "o-9")):
+            with pytest.raises(ValueError):
+                keyset_filter("created_at", "order_id", encode_cursor(values))
+
+
+class TestCreatedAtRange:
+    """ISO string bounds; a date-only upper bound covers the whole day"""
+
+    def test_date_only_bounds(self):
+        assert created_at_range("2026-03-01", "2026-03-31") == {
+            "created_at": {"$gte": "2026-03-01", "$lt": "2026-04-01"}
+        }
+
+    def test_invalid_date(self):
+        with pytest.raises(ValueError):
+            created_at_range("yesterday", None)
+
+
+class TestParseFields:
+    """Requested fields become an inclusion projection that never returns _id"""
+
+    def test_required_fields_are_always_included(self):
+        assert parse_fields("status, total_amount", ("created_at", "order_id")) == {
+            "_id": 0, "created_at": 1, "order_id": 1, "status": 1, "total_amount": 1,
+        }
+        assert parse_fields(None, ("created_at",)) is None
+
+    def test_id_and_operators_are_rejected(self):
+        with pytest.raises(ValueError):
+            parse_fields("status,_id", ("created_at",))
+        with pytest.raises(ValueError):
+            parse_fields("$where", ("created_at",))
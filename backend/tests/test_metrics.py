@@ -0,0 +1,73 @@
+"""
+Unit tests for the Prometheus metrics registry
+Tests: counter/histogram exposition, callback metrics, route-template labels
+"""
+import asyncio
+
+from metrics import MetricsMiddleware, Registry
+
+
+class TestExposition:
+    """Samples render in the Prometheus text format"""
+
+    def test_counter_and_labels(self):
+        registry = Registry()
+        counter = registry.counter("requests_total", "Requests", ["route"])
+        counter.inc('/a"b')
+        counter.inc('/a"b', amount=2)
+        text = registry.render()
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{route="/a\\"b"} 3' in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        text = registry.render()
+        assert 'latency_seconds_bucket{le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{le="1"} 3' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+        assert "latency_seconds_count 4" in text
+        print("✓ histogram exposition")
+
+    def test_callback_metrics_read_at_scrape_time(self):
+        registry = Registry()
+        state = {"hits": 1}
+        registry.counter_callback("hits_total", "Hits", lambda: state["hits"])
+        registry.gauge_callback("queue", "Queue", lambda: {"a": 1, "b": 2}, label_name="cache")
+        state["hits"] = 5
+        text = registry.render()
+        assert "hits_total 5" in text
+        assert 'queue{cache="b"} 2' in text
+
+    def test_callback_with_several_labels(self):
+        registry = Registry()
+        registry.gauge_callback("info", "Info", lambda: {("catalog", "nearest"): 1}, label_name=("workload", "mode"))
+        assert 'info{workload="catalog",mode="nearest"} 1' in registry.render()
+
+
+class TestMiddleware:
+    """Requests are labelled by the matched route template"""
+
+    def test_route_template_and_status(self):
+        registry = Registry()
+        requests = registry.counter("req", "Requests", ["method", "route", "status"])
+        latency = registry.histogram("lat", "Latency", ["method", "route"])
+
+        class Route:
+            path = "/api/items/{item_id}"
+
+        async def app(scope, receive, send):
+            scope["route"] = Route()
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+
+        async def send(message):
+            pass
+
+        middleware = MetricsMiddleware(app, requests=requests, latency=latency)
+        asyncio.run(middleware({"type": "http", "method": "GET", "path": "/api/items/42"}, None, send))
+        text = registry.render()
+        assert 'req{method="GET",route="/api/items/{item_id}",status="404"} 1' in text
+        assert 'lat_count{method="GET",route="/api/items/{item_id}"} 1' in text
+        assert MetricsMiddleware.in_flight == 0
@@ -0,0 +1,64 @@
+"""
+Unit tests for per-workload MongoDB settings
+Tests: read preferences and staleness bounds, write concerns, client options
+"""
+import pytest
+
+from mongo_config import client_options, describe_workload, read_preference, write_concern
+
+
+class TestReadPreference:
+    """Environment modes map to driver read preferences"""
+
+    def test_primary_ignores_staleness(self):
+        preference = read_preference("primary", 120)
+        assert preference.mongos_mode == "primary"
+
+    def test_bounded_staleness(self):
+        preference = read_preference("nearest", 120)
+        assert preference.mongos_mode == "nearest"
+        assert preference.max_staleness == 120
+
+    def test_staleness_below_server_minimum_is_rejected(self):
+        with pytest.raises(ValueError):
+            read_preference("secondaryPreferred", 30)
+
+    def test_unknown_mode_is_rejected(self):
+        with pytest.raises(ValueError):
+            read_preference("fastest")
+
+
+class TestWriteConcern:
+    """Numeric w values become node counts"""
+
+    def test_majority_with_timeout(self):
+        assert write_concern("majority", 5000).document == {"w": "majority", "wtimeout": 5000}
+
+    def test_numeric_w(self):
+        assert write_concern("2").document == {"w": 2}
+
+
+class TestClientOptions:
+    """Unset options are left to the driver"""
+
+    def test_defaults_are_omitted(self):
+        assert client_options(50) == {"maxPoolSize": 50, "minPoolSize": 0}
+
+    def test_timeout_and_appname(self):
+        options = client_options(10, timeout_ms=15000, wait_queue_timeout_ms=2000, appname="analytics")
+        assert options["timeoutMS"] == 15000
+        assert options["waitQueueTimeoutMS"] == 2000
+        assert options["appname"] == "analytics"
+
+    def test_describe_workload(self):
+        description = describe_workload("main", read_preference("nearest", 120), write_concern("majority", 5000))
+        assert description == {
+            "pool": "main",
+            "read_preference": "nearest",
+            "max_staleness_seconds": 120,
+            "write_concern": "majority",
+            "wtimeout_ms": 5000,
+            "timeout_ms": 0,
+        }
+        assert describe_workload("analytics", timeout_ms=15000)["read_preference"] == "primary"
+        print("✓ Workload description reports the configured settings")
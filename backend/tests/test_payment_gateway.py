@@ -0,0 +1,122 @@
+"""
+Unit tests for the Stripe payment gateway
+Tests: webhook signature verification, circuit breaker trial calls
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+
+import httpx
+import pytest
+
+from payment_gateway import CircuitBreaker, PaymentGateway, PaymentGatewayError, PaymentGatewayUnavailable
+
+PAYLOAD = json.dumps({
+    "id": "evt_1",
+    "type": "checkout.session.completed",
+    "data": {"object": {"id": "cs_1", "payment_status": "paid", "metadata": {"order_id": "o1"}}},
+}).encode()
+
+
+def sign(payload: bytes, secret: str, timestamp: int = None) -> str:
+    timestamp = timestamp or int(time.time())
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def gateway_with(handler, **kwargs) -> PaymentGateway:
+    gateway = PaymentGateway("sk_test", api_base="http://stripe.test", **kwargs)
+    gateway._client = httpx.AsyncClient(base_url="http://stripe.test", transport=httpx.MockTransport(handler))
+    return gateway
+
+
+class TestWebhookSignature:
+    """Only events signed with the configured secret are accepted"""
+
+    def test_missing_secret_fails_closed(self):
+        gateway = PaymentGateway("sk_test")
+        with pytest.raises(PaymentGatewayError) as error:
+            gateway.handle_webhook(PAYLOAD, sign(PAYLOAD, "whsec"))
+        assert error.value.status_code == 503
+
+    def test_missing_header_is_rejected(self):
+        gateway = PaymentGateway("sk_test", webhook_secret="whsec")
+        with pytest.raises(PaymentGatewayError) as error:
+            gateway.handle_webhook(PAYLOAD, None)
+        assert error.value.status_code == 400
+
+    def test_bad_signature_is_rejected(self):
+        gateway = PaymentGateway("sk_test", webhook_secret="whsec")
+        with pytest.raises(PaymentGatewayError) as error:
+            gateway.handle_webhook(PAYLOAD, sign(PAYLOAD, "forged"))
+        assert error.value.status_code == 400
+
+    def test_stale_timestamp_is_rejected(self):
+        gateway = PaymentGateway("sk_test", webhook_secret="whsec")
+        with pytest.raises(PaymentGatewayError):
+            gateway.handle_webhook(PAYLOAD, sign(PAYLOAD, "whsec", int(time.time()) - 3600))
+
+    def test_valid_signature_is_parsed(self):
+        gateway = PaymentGateway("sk_test", webhook_secret="whsec")
+        event = gateway.handle_webhook(PAYLOAD, sign(PAYLOAD, "whsec"))
+        assert (event.event_id, event.session_id, event.payment_status) == ("evt_1", "cs_1", "paid")
+
+
+class TestCircuitBreaker:
+    """The half-open trial slot is always released"""
+
+    def half_open_gateway(self, handler) -> PaymentGateway:
+        gateway = gateway_with(handler, failure_threshold=1, reset_timeout=0.0)
+        gateway.breaker.record_failure()
+        assert gateway.breaker.state == "half_open"
+        return gateway
+
+    def test_failed_trial_reopens(self):
+        def handler(request):
+            return httpx.Response(503)
+
+        gateway = self.half_open_gateway(handler)
+        with pytest.raises(PaymentGatewayUnavailable):
+            asyncio.run(gateway.get_checkout_status("cs_1"))
+        assert not gateway.breaker.trial_in_flight
+
+    def test_unexpected_error_releases_trial(self):
+        def handler(request):
+            raise RuntimeError("bug in transport")
+
+        gateway = self.half_open_gateway(handler)
+        with pytest.raises(RuntimeError):
+            asyncio.run(gateway.get_checkout_status("cs_1"))
+        assert not gateway.breaker.trial_in_flight
+
+    def test_cancelled_trial_releases_slot(self):
+        started = asyncio.Event()
+
+        async def handler(request):
+            started.set()
+            await asyncio.sleep(10)
+
+        async def scenario():
+            gateway = self.half_open_gateway(handler)
+            task = asyncio.create_task(gateway.get_checkout_status("cs_1"))
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return gateway
+
+        gateway = asyncio.run(scenario())
+        assert not gateway.breaker.trial_in_flight
+        # The next call is let through as a new trial instead of being rejected
+        gateway.breaker.before_call()
+        assert gateway.breaker.trial_in_flight
+        print("✓ A cancelled trial call does not wedge the breaker open")
+
+    def test_only_one_trial_at_a_time(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+        breaker.record_failure()
+        breaker.before_call()
+        with pytest.raises(PaymentGatewayUnavailable):
+            breaker.before_call()
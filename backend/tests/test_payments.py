@@ -0,0 +1,391 @@
+"""
+Unit tests for the payment confirmation paths
+Tests: webhook journal (duplicates, leases, replay), reconciler checks and
+backoff, reconciler/webhook races, status long-poll wake-ups, fake Stripe
+"""
+import asyncio
+import copy
+import itertools
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import fake_stripe
+from payment_events import PaymentEventJournal
+from payment_gateway import CheckoutStatus, PaymentGateway, WebhookEvent
+from payment_reconciler import PaymentReconciler, StatusWaiters
+
+
+COMPARISONS = {
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$ne": lambda value, operand: value != operand,
+}
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, option) for option in condition):
+                return False
+        elif isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$exists":
+                    if (key in doc) != operand:
+                        return False
+                elif not COMPARISONS[op](doc.get(key), operand):
+                    return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """Just enough of a Motor collection for the journal and the reconciler"""
+
+    def __init__(self, unique: str = None):
+        self.docs = []
+        self.unique = unique
+        self._ids = itertools.count(1)
+
+    async def insert_one(self, doc):
+        if self.unique and any(d.get(self.unique) == doc[self.unique] for d in self.docs):
+            raise DuplicateKeyError("duplicate key")
+        self.docs.append({"_id": next(self._ids), **doc})
+
+    def _apply(self, doc, update):
+        for key, value in update.get("$set", {}).items():
+            doc[key] = value
+        for key, value in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + value
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+
+    async def find_one_and_update(self, query, update, projection=None, sort=None, return_document=ReturnDocument.BEFORE):
+        candidates = [d for d in self.docs if matches(d, query)]
+        for field, direction in reversed(sort or []):
+            candidates.sort(key=lambda d: d.get(field) or "", reverse=direction < 0)
+        if not candidates:
+            return None
+        doc = candidates[0]
+        before = copy.deepcopy(doc)
+        self._apply(doc, update)
+        return copy.deepcopy(doc if return_document == ReturnDocument.AFTER else before)
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if matches(doc, query):
+                self._apply(doc, update)
+                return
+
+    async def update_many(self, query, update):
+        matched = [d for d in self.docs if matches(d, query)]
+        for doc in matched:
+            self._apply(doc, update)
+        return type("Result", (), {"modified_count": len(matched)})()
+
+    async def count_documents(self, query):
+        return sum(1 for d in self.docs if matches(d, query))
+
+
+class FakeDB:
+    def __init__(self):
+        self.payment_events = FakeCollection(unique="event_id")
+        self.payment_transactions = FakeCollection()
+        self.orders = FakeCollection()
+
+
+class FakeGateway:
+    def __init__(self, payment_status="paid", status="complete"):
+        self.payment_status = payment_status
+        self.status = status
+        self.calls = 0
+
+    async def get_checkout_status(self, session_id):
+        self.calls += 1
+        # Let the other path run while the provider call is in flight
+        await asyncio.sleep(0)
+        return CheckoutStatus(status=self.status, payment_status=self.payment_status, amount_total=500, currency="inr")
+
+
+class PaymentBook:
+    """Mirrors confirm_payment: an atomic pending -> paid flip gates the notifications,
+    the reference's own payment_status gates revenue, and the reference write always runs"""
+
+    def __init__(self, db):
+        self.db = db
+        self.side_effects = []
+        self.revenue = []
+
+    async def confirm(self, session_id):
+        transaction = await self.db.payment_transactions.find_one_and_update(
+            {"session_id": session_id, "payment_status": {"$ne": "paid"}},
+            {"$set": {"payment_status": "paid"}},
+            return_document=ReturnDocument.AFTER
+        )
+        flipped = transaction is not None
+        if not flipped:
+            paid = [d for d in self.db.payment_transactions.docs
+                    if d["session_id"] == session_id and d["payment_status"] == "paid"]
+            if not paid:
+                return None
+            transaction = paid[0]
+        order = await self.db.orders.find_one_and_update(
+            {"order_id": transaction.get("reference_id")},
+            {"$set": {"payment_status": "paid"}},
+            return_document=ReturnDocument.BEFORE
+        )
+        if order and order.get("payment_status") != "paid":
+            self.revenue.append(order["order_id"])
+        if flipped:
+            self.side_effects.append(session_id)
+        return transaction if flipped else None
+
+    async def apply_event(self, event):
+        if event["payment_status"] == "paid":
+            await self.confirm(event["session_id"])
+
+
+def webhook(event_id="evt_1", session_id="cs_1") -> WebhookEvent:
+    return WebhookEvent(
+        event_id=event_id,
+        event_type="checkout.session.completed",
+        session_id=session_id,
+        payment_status="paid",
+        payload={"id": event_id},
+    )
+
+
+async def pending_transaction(db, session_id="cs_1", **fields):
+    await db.orders.insert_one({"order_id": f"order_{session_id}", "payment_status": "pending"})
+    await db.payment_transactions.insert_one({
+        "session_id": session_id,
+        "reference_id": f"order_{session_id}",
+        "payment_status": "pending",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **fields,
+    })
+
+
+class TestEventJournal:
+    """Webhooks are journaled once and applied exactly once"""
+
+    def test_duplicate_event_is_applied_once(self):
+        async def scenario():
+            db = FakeDB()
+            book = PaymentBook(db)
+            await pending_transaction(db)
+            journal = PaymentEventJournal(book.apply_event)
+            first = await journal.record(db, webhook())
+            retry = await journal.record(db, webhook())
+            applied = await journal.drain(db)
+            return journal, book, first, retry, applied
+
+        journal, book, first, retry, applied = asyncio.run(scenario())
+        assert (first, retry) == (True, False)
+        assert journal.duplicates == 1
+        assert applied == 1
+        assert book.side_effects == ["cs_1"]
+
+    def test_leased_event_is_not_claimed_twice(self):
+        async def scenario():
+            db = FakeDB()
+            journal = PaymentEventJournal(PaymentBook(db).apply_event)
+            await journal.record(db, webhook())
+            claimed = await journal._claim(db)
+            again = await journal._claim(db)
+            return claimed, again
+
+        claimed, again = asyncio.run(scenario())
+        assert claimed["attempts"] == 1 and "lease_until" in claimed
+        assert again is None
+
+    def test_failed_event_is_retried_then_dead_lettered(self):
+        async def failing(event):
+            raise RuntimeError("boom")
+
+        async def scenario():
+            db = FakeDB()
+            journal = PaymentEventJournal(failing, lease_seconds=0, max_attempts=2)
+            await journal.record(db, webhook())
+            await journal.drain(db)
+            return journal, await journal.backlog(db), db.payment_events.docs[0]
+
+        journal, backlog, doc = asyncio.run(scenario())
+        assert journal.failures == 2
+        assert backlog == {"pending": 0, "dead_lettered": 1}
+        assert doc["last_error"] == "boom"
+
+    def test_replay_reapplies_without_double_side_effects(self):
+        async def scenario():
+            db = FakeDB()
+            book = PaymentBook(db)
+            await pending_transaction(db)
+            journal = PaymentEventJournal(book.apply_event)
+            await journal.record(db, webhook())
+            await journal.drain(db)
+            replayed = await journal.replay(db, session_id="cs_1")
+            await journal.drain(db)
+            return journal, book, replayed
+
+        journal, book, replayed = asyncio.run(scenario())
+        assert replayed == 1
+        assert journal.applied == 2
+        assert book.side_effects == ["cs_1"]
+        assert book.revenue == ["order_cs_1"]
+        print("✓ Replayed events go through the idempotent confirmation again")
+
+    def test_replay_repairs_reference_left_unpaid(self):
+        async def scenario():
+            db = FakeDB()
+            book = PaymentBook(db)
+            # The transaction flip landed but the process died before the order write
+            await pending_transaction(db, payment_status="paid")
+            journal = PaymentEventJournal(book.apply_event)
+            await journal.record(db, webhook())
+            await journal.drain(db)
+            return book, db.orders.docs[0]
+
+        book, order = asyncio.run(scenario())
+        assert order["payment_status"] == "paid"
+        assert book.revenue == ["order_cs_1"]
+        assert book.side_effects == []
+
+
+class TestReconciler:
+    """Pending sessions are checked, confirmed or backed off"""
+
+    def test_paid_session_is_confirmed(self):
+        async def scenario():
+            db = FakeDB()
+            book = PaymentBook(db)
+            await pending_transaction(db)
+            reconciler = PaymentReconciler(FakeGateway(), book.confirm, checks_per_second=0)
+            checked = await reconciler.reconcile_once(db)
+            return reconciler, book, checked
+
+        reconciler, book, checked = asyncio.run(scenario())
+        assert checked == 1
+        assert reconciler.confirmed == 1
+        assert book.side_effects == ["cs_1"]
+
+    def test_unpaid_session_backs_off(self):
+        async def scenario():
+            db = FakeDB()
+            gateway = FakeGateway(payment_status="unpaid", status="open")
+            reconciler = PaymentReconciler(gateway, PaymentBook(db).confirm, checks_per_second=0)
+            await pending_transaction(db)
+            first = await reconciler.reconcile_once(db)
+            second = await reconciler.reconcile_once(db)
+            return first, second, db.payment_transactions.docs[0]
+
+        first, second, doc = asyncio.run(scenario())
+        assert (first, second) == (1, 0)
+        assert doc["check_count"] == 1
+        assert doc["next_check_at"] > (datetime.now(timezone.utc) + timedelta(seconds=5)).isoformat()
+
+    def test_expired_session_is_marked(self):
+        async def scenario():
+            db = FakeDB()
+            reconciler = PaymentReconciler(
+                FakeGateway(payment_status="unpaid", status="expired"), PaymentBook(db).confirm, checks_per_second=0)
+            await pending_transaction(db)
+            await reconciler.reconcile_once(db)
+            return db.payment_transactions.docs[0]["payment_status"]
+
+        assert asyncio.run(scenario()) == "expired"
+
+    def test_nudged_session_skips_its_backoff(self):
+        async def scenario():
+            db = FakeDB()
+            future = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+            await pending_transaction(db, next_check_at=future)
+            book = PaymentBook(db)
+            reconciler = PaymentReconciler(FakeGateway(), book.confirm, checks_per_second=0)
+            idle = await reconciler.reconcile_once(db)
+            reconciler.nudge("cs_1")
+            nudged = await reconciler.reconcile_once(db)
+            return idle, nudged, book
+
+        idle, nudged, book = asyncio.run(scenario())
+        assert (idle, nudged) == (0, 1)
+        assert book.side_effects == ["cs_1"]
+
+    def test_reconciler_and_webhook_race_on_one_session(self):
+        async def scenario():
+            db = FakeDB()
+            book = PaymentBook(db)
+            await pending_transaction(db)
+            reconciler = PaymentReconciler(FakeGateway(), book.confirm, checks_per_second=0)
+            journal = PaymentEventJournal(book.apply_event)
+            await journal.record(db, webhook())
+            await asyncio.gather(reconciler.reconcile_once(db), journal.drain(db))
+            return reconciler, journal, book
+
+        reconciler, journal, book = asyncio.run(scenario())
+        assert journal.applied == 1
+        assert reconciler.checked == 1
+        assert book.side_effects == ["cs_1"]
+        print("✓ Webhook and reconciler confirm the same session exactly once")
+
+
+class TestStatusWaiters:
+    """Long-polling status requests wake on confirmation"""
+
+    def test_notify_wakes_waiter(self):
+        async def scenario():
+            waiters = StatusWaiters()
+            waiting = asyncio.create_task(waiters.wait("cs_1", 5))
+            await asyncio.sleep(0)
+            waiters.notify("cs_1")
+            return await waiting, waiters._events
+
+        woke, events = asyncio.run(scenario())
+        assert woke is True
+        assert events == {}
+
+    def test_timeout_cleans_up(self):
+        async def scenario():
+            waiters = StatusWaiters()
+            woke = await waiters.wait("cs_1", 0.01)
+            return woke, waiters._events
+
+        woke, events = asyncio.run(scenario())
+        assert woke is False
+        assert events == {}
+
+
+class TestFakeStripe:
+    """The offline Stripe stand-in speaks the gateway's protocol"""
+
+    def test_parse_stripe_form(self):
+        form = fake_stripe.parse_stripe_form([
+            ("line_items[0][price_data][currency]", "inr"),
+            ("line_items[0][quantity]", "1"),
+            ("metadata[order_id]", "o1"),
+        ])
+        assert form == {
+            "line_items": {"0": {"price_data": {"currency": "inr"}, "quantity": "1"}},
+            "metadata": {"order_id": "o1"},
+        }
+
+    def test_checkout_round_trip_through_gateway(self):
+        async def scenario():
+            gateway = PaymentGateway("sk_test", api_base="http://fake-stripe")
+            gateway._client = httpx.AsyncClient(
+                base_url="http://fake-stripe", transport=httpx.ASGITransport(app=fake_stripe.app))
+            session = await gateway.create_checkout_session(
+                12.5, "inr", "http://app/success", "http://app/cancel", metadata={"order_id": "o1"})
+            before = await gateway.get_checkout_status(session.session_id)
+            await gateway._http().post(f"/v1/test/sessions/{session.session_id}/pay")
+            after = await gateway.get_checkout_status(session.session_id)
+            await gateway.close()
+            return before, after
+
+        before, after = asyncio.run(scenario())
+        assert (before.payment_status, after.payment_status) == ("unpaid", "paid")
+        assert after.amount_total == 1250
+        assert after.metadata == {"order_id": "o1"}
@@ -0,0 +1,157 @@
+"""
+Unit tests for materialized platform stats
+Tests: pending counter deltas on status changes, day bucketing,
+rebuild agreeing with the live hooks
+"""
+import asyncio
+import copy
+from datetime import datetime, timezone
+
+from platform_stats import (
+    PENDING_ORDER_STATUSES, PENDING_RESERVATION_STATUSES, PlatformStats, day_key, status_count_delta,
+)
+
+
+class TestStatusCountDelta:
+    """Pending counters move only when a status crosses the pending boundary"""
+
+    def test_order_leaving_pending(self):
+        assert status_count_delta("PREPARING", "OUT_FOR_DELIVERY", PENDING_ORDER_STATUSES) == -1
+        assert status_count_delta("CANCELLED", "PLACED", PENDING_ORDER_STATUSES) == 1
+
+    def test_transitions_within_a_group_are_neutral(self):
+        assert status_count_delta("PLACED", "ACCEPTED", PENDING_ORDER_STATUSES) == 0
+        assert status_count_delta("CONFIRMED", "SEATED", PENDING_RESERVATION_STATUSES) == 0
+
+    def test_payment_confirmation(self):
+        assert status_count_delta("PENDING_PAYMENT", "CONFIRMED", PENDING_RESERVATION_STATUSES) == -1
+
+
+class TestDayKey:
+    """Activity buckets are UTC calendar days"""
+
+    def test_iso_string_and_datetime(self):
+        assert day_key("2026-03-04T10:11:12+00:00") == "2026-03-04"
+        assert day_key(datetime(2026, 3, 4, 23, 59, tzinfo=timezone.utc)) == "2026-03-04"
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if isinstance(condition, dict):
+            if doc.get(key) == condition["$ne"]:
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    """Documents plus just enough of count_documents and the rebuild's $facet"""
+
+    def __init__(self):
+        self.docs = []
+
+    async def count_documents(self, query):
+        return sum(1 for doc in self.docs if matches(doc, query))
+
+    def aggregate(self, pipeline):
+        facet = pipeline[0]["$facet"]
+        group = facet["totals"][0]["$group"]
+        pending_statuses = group["pending"]["$sum"]["$cond"][0]["$in"][1]
+        amount_field = group["revenue"]["$sum"]["$cond"][1][1:]
+        since = facet["by_day"][0]["$match"]["created_at"]["$gte"]
+        by_day = {}
+        for doc in self.docs:
+            if doc["created_at"] >= since:
+                by_day[doc["created_at"][:10]] = by_day.get(doc["created_at"][:10], 0) + 1
+        totals = [{
+            "count": len(self.docs),
+            "pending": sum(1 for doc in self.docs if doc["status"] in pending_statuses),
+            "revenue": sum(doc[amount_field] for doc in self.docs if doc["payment_status"] == "paid"),
+        }] if self.docs else []
+        return Cursor([{"totals": totals, "by_day": [{"_id": day, "count": n} for day, n in by_day.items()]}])
+
+
+class FakeStats:
+    def __init__(self):
+        self.doc = None
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.doc = copy.deepcopy(doc)
+
+    async def update_one(self, query, update):
+        for path, value in update["$inc"].items():
+            node = self.doc
+            *parents, leaf = path.split(".")
+            for part in parents:
+                node = node.setdefault(part, {})
+            node[leaf] = node.get(leaf, 0) + value
+
+    async def find_one(self, query):
+        return copy.deepcopy(self.doc)
+
+
+class FakeDB:
+    def __init__(self):
+        self.users = FakeCollection()
+        self.restaurants = FakeCollection()
+        self.orders = FakeCollection()
+        self.reservations = FakeCollection()
+        self.platform_stats = FakeStats()
+
+
+class TestRebuildMatchesHooks:
+    """A rebuild lands where the incremental hooks already are"""
+
+    def test_create_status_change_and_delete(self):
+        async def scenario():
+            db = FakeDB()
+            stats = PlatformStats()
+            await stats.rebuild(db)
+            now = datetime.now(timezone.utc).isoformat()
+
+            for user_id, role in (("u1", "customer"), ("u2", "customer"), ("o1", "restaurant")):
+                db.users.docs.append({"user_id": user_id, "role": role, "status": "active"})
+                await stats.user_created(db, role)
+            for restaurant_id in ("r1", "r2"):
+                db.restaurants.docs.append({"restaurant_id": restaurant_id, "status": "approved"})
+                await stats.restaurant_created(db)
+
+            order = {"order_id": "a", "status": "PLACED", "payment_status": "pending", "total_amount": 40.0, "created_at": now}
+            db.orders.docs.append(order)
+            await stats.order_created(db, order)
+            order["status"] = "OUT_FOR_DELIVERY"
+            await stats.order_status_changed(db, "PLACED", "OUT_FOR_DELIVERY")
+            order["payment_status"] = "paid"
+            await stats.payment_confirmed(db, "order", 40.0)
+
+            reservation = {"reservation_id": "b", "status": "PENDING_PAYMENT", "payment_status": "pending", "amount": 300.0, "created_at": now}
+            db.reservations.docs.append(reservation)
+            await stats.reservation_created(db, reservation)
+            reservation.update(status="CONFIRMED", payment_status="paid")
+            await stats.reservation_status_changed(db, "PENDING_PAYMENT", "CONFIRMED")
+            await stats.payment_confirmed(db, "reservation", 300.0)
+
+            # Marked for deletion; the cascade has not removed them yet
+            db.users.docs[0]["status"] = "deleting"
+            await stats.user_deleted(db, "customer")
+            db.restaurants.docs[1]["status"] = "deleting"
+            await stats.restaurant_deleted(db)
+
+            live = await stats.read(db)
+            await stats.rebuild(db)
+            return live, await stats.read(db)
+
+        live, rebuilt = asyncio.run(scenario())
+        assert live == rebuilt
+        assert (live["total_users"], live["total_restaurants"]) == (1, 1)
+        assert live["total_revenue"] == 340.0 and live["pending_orders"] == 0 and live["recent_orders"] == 1
+        print("✓ Rebuild agrees with the hooks")
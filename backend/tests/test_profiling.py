@@ -0,0 +1,66 @@
+"""
+Unit tests for the sampling profiler and memory snapshots
+Tests: collapsed stacks, sampling a busy thread, tracemalloc snapshots
+"""
+import sys
+import time
+
+import pytest
+
+from profiling import MemoryProfiler, SamplingProfiler, collapse_stack
+
+
+def busy_leaf(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestSamplingProfiler:
+    """Samples are collapsed root-first and counted per profile"""
+
+    def test_collapse_stack_is_root_first(self):
+        def inner():
+            return collapse_stack(sys._getframe())
+
+        stack = inner()
+        assert stack.split(";")[-1].startswith("inner (test_profiling.py:")
+        assert "test_collapse_stack_is_root_first" in stack.split(";")[-2]
+
+    def test_samples_busy_code(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profile = profiler.start("busy")
+        busy_leaf(0.1)
+        profiler.stop(profile)
+        assert profile.summary()["samples"] > 5
+        assert profile.top_functions(1)[0]["function"].startswith("busy_leaf")
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in profile.folded().splitlines())
+        assert profiler.get(profile.profile_id) is profile
+        print(f"✓ {profile.summary()['samples']} samples")
+
+    def test_sampler_thread_exits_when_idle(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.stop(profiler.start("short"))
+        time.sleep(0.05)
+        assert profiler._thread is None
+
+
+class TestMemoryProfiler:
+    """Snapshots need tracing and rank allocation sites"""
+
+    def test_snapshot_requires_tracing(self):
+        with pytest.raises(RuntimeError):
+            MemoryProfiler().snapshot()
+
+    def test_top_sites_and_diff(self):
+        memory = MemoryProfiler()
+        memory.start(frames=5)
+        try:
+            memory.snapshot(top=5)
+            hoard = [bytearray(1024) for _ in range(200)]
+            report = memory.snapshot(top=5, compare=True)
+            assert report["compared"] and report["top"][0]["size_diff_bytes"] >= 200 * 1024
+            assert "test_profiling.py" in report["top"][0]["site"]
+            del hoard
+        finally:
+            memory.stop()
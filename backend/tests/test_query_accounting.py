@@ -0,0 +1,92 @@
+"""
+Unit tests for per-request query accounting
+Tests: query shapes, listener attribution, N+1 detection, strict-mode budget
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from query_accounting import (
+    QueryAccountingMiddleware, QueryBudgetExceeded, QueryMonitor, current_queries, query_shape, track_queries
+)
+
+monitor = QueryMonitor()
+
+
+def run_find(collection, filter_, docs=1):
+    command = {"find": collection, "filter": filter_}
+    monitor.started(SimpleNamespace(command_name="find", command=command))
+    monitor.succeeded(SimpleNamespace(
+        command_name="find", duration_micros=2000, reply={"cursor": {"firstBatch": [{}] * docs}}
+    ))
+
+
+class TestQueryShape:
+    """Shapes keep structure and drop values"""
+
+    def test_values_are_blanked(self):
+        a = query_shape("find", {"find": "users", "filter": {"user_id": "u1"}})
+        b = query_shape("find", {"find": "users", "filter": {"user_id": "u2"}})
+        assert a == b == "find users {'user_id': '?'}"
+
+    def test_operators_are_kept(self):
+        shape = query_shape("find", {"find": "orders", "filter": {"status": {"$in": ["A", "B"]}}})
+        assert "$in" in shape and "'A'" not in shape
+
+
+class TestAccounting:
+    """Commands are attributed to the active request"""
+
+    def test_counts_docs_and_time(self):
+        with track_queries() as queries:
+            run_find("restaurants", {}, docs=3)
+            run_find("reviews", {"restaurant_id": "r1"}, docs=2)
+        assert queries.queries == 2 and queries.documents == 5
+        assert queries.duration == pytest.approx(0.004)
+        assert 'desc="2 queries, 5 docs"' in queries.server_timing()
+
+    def test_ignored_outside_a_request(self):
+        assert current_queries.get() is None
+        run_find("users", {})
+
+    def test_repeated_shape_is_flagged(self):
+        with track_queries() as queries:
+            run_find("restaurants", {})
+            for i in range(6):
+                run_find("users", {"user_id": f"u{i}"})
+        problems = queries.violations(max_queries=50, max_repeats=5)
+        assert problems == ["6x find users {'user_id': '?'}"]
+        print(f"✓ N+1 flagged: {problems[0]}")
+
+
+class TestMiddleware:
+    """Server-Timing header and strict budget enforcement"""
+
+    def run(self, middleware):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(middleware({"type": "http", "method": "GET", "path": "/x"}, None, send))
+        return sent
+
+    def test_server_timing_header(self):
+        async def app(scope, receive, send):
+            run_find("restaurants", {})
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        sent = self.run(QueryAccountingMiddleware(app))
+        assert (b"server-timing", b'db;dur=2.0;desc="1 queries, 1 docs"') in sent[0]["headers"]
+
+    def test_strict_mode_raises_over_budget(self):
+        async def app(scope, receive, send):
+            for i in range(4):
+                run_find("users", {"user_id": i})
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        with pytest.raises(QueryBudgetExceeded):
+            self.run(QueryAccountingMiddleware(app, max_queries=3, strict=True))
+        # Non-strict only logs
+        self.run(QueryAccountingMiddleware(app, max_queries=3))
@@ -0,0 +1,67 @@
+"""
+Unit tests for auth rate limiting
+Tests: token bucket refill, 429 from the ASGI middleware, client IP resolution
+"""
+import asyncio
+
+from rate_limit import AuthRateLimitMiddleware, RateLimiter, client_ip
+
+
+class TestRateLimiter:
+    """In-memory token bucket"""
+
+    def test_bucket_allows_burst_then_rejects(self):
+        """Up to limit attempts pass, the next is told how long to wait"""
+        limiter = RateLimiter("email", limit=3, period_seconds=60)
+
+        async def run():
+            return [await limiter.hit("a@test.com") for _ in range(4)]
+
+        results = asyncio.run(run())
+        assert results[:3] == [0.0, 0.0, 0.0]
+        assert 0 < results[3] <= 20
+        assert limiter.stats()["rejected"] == 1
+
+    def test_keys_are_independent_and_bounded(self):
+        """Each key has its own bucket and old keys are evicted"""
+        limiter = RateLimiter("ip", limit=1, period_seconds=60, max_keys=2)
+
+        async def run():
+            return [await limiter.hit(key) for key in ("1.1.1.1", "2.2.2.2", "3.3.3.3")]
+
+        assert asyncio.run(run()) == [0.0, 0.0, 0.0]
+        assert limiter.stats()["tracked_keys"] == 2
+
+
+class TestAuthRateLimitMiddleware:
+    """Cheap 429 rejection before the app runs"""
+
+    def test_rejects_after_limit_without_calling_app(self):
+        """Over-limit login attempts never reach the application"""
+        calls = []
+
+        async def app(scope, receive, send):
+            calls.append(scope["path"])
+
+        middleware = AuthRateLimitMiddleware(app, RateLimiter("ip", limit=2, period_seconds=60))
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def run():
+            scope = {"type": "http", "method": "POST", "path": "/api/auth/customer/login", "client": ("9.9.9.9", 1), "headers": []}
+            for _ in range(3):
+                await middleware(scope, None, send)
+            await middleware(dict(scope, path="/api/restaurants", method="GET"), None, send)
+
+        asyncio.run(run())
+        assert calls == ["/api/auth/customer/login"] * 2 + ["/api/restaurants"]
+        assert sent[0]["status"] == 429
+
+    def test_client_ip_honours_proxy_hops(self):
+        """X-Forwarded-For is only trusted as far as configured"""
+        scope = {"client": ("10.0.0.1", 1), "headers": [(b"x-forwarded-for", b"6.6.6.6, 1.2.3.4")]}
+        assert client_ip(scope) == "10.0.0.1"
+        assert client_ip(scope, proxy_hops=1) == "1.2.3.4"
+        assert client_ip(scope, proxy_hops=5) == "6.6.6.6"
@@ -0,0 +1,163 @@
+"""
+Concurrency harness for the reservation booking path
+Fires many concurrent create_reservation calls at the same slots through
+httpx.AsyncClient against the in-process ASGI app and a local mongod, reports
+throughput and latency percentiles, and checks seat_capacity is never exceeded.
+
+Configure with LOAD_TEST_MONGO_URL, LOAD_TEST_REQUESTS, LOAD_TEST_CONCURRENCY.
+"""
+import asyncio
+import os
+import time
+import uuid
+
+import pytest
+
+MONGO_URL = os.environ.get('LOAD_TEST_MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = f"dinedash_loadtest_{uuid.uuid4().hex[:8]}"
+TOTAL_REQUESTS = int(os.environ.get('LOAD_TEST_REQUESTS', '2000'))
+CONCURRENCY = int(os.environ.get('LOAD_TEST_CONCURRENCY', '200'))
+SEAT_CAPACITY = 20
+SLOTS = [("2030-01-15", "19:00"), ("2030-01-15", "20:00"), ("2030-01-16", "19:00")]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+@pytest.fixture(scope="module")
+def server_module():
+    """Import the app against a throwaway database on a local mongod"""
+    pymongo = pytest.importorskip("pymongo")
+    pytest.importorskip("httpx")
+    try:
+        pymongo.MongoClient(MONGO_URL, serverSelectionTimeoutMS=1000).admin.command("ping")
+    except Exception:
+        pytest.skip(f"No mongod reachable at {MONGO_URL}")
+
+    os.environ['MONGO_URL'] = MONGO_URL
+    os.environ['DB_NAME'] = DB_NAME
+    server = pytest.importorskip("server")
+    yield server
+    pymongo.MongoClient(MONGO_URL).drop_database(server.db.name)
+
+
+async def run_booking_storm(server):
+    import httpx
+
+    await server.ensure_indexes()
+    restaurant_id = str(uuid.uuid4())
+    await server.db.restaurants.insert_one({
+        "restaurant_id": restaurant_id,
+        "owner_id": str(uuid.uuid4()),
+        "name": "Load Test Bistro",
+        "seat_capacity": SEAT_CAPACITY,
+        "slot_length_minutes": 60,
+    })
+
+    tokens = [server.create_token(str(uuid.uuid4()), f"load{i}@test.com", "customer") for i in range(CONCURRENCY)]
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+    statuses = {}
+
+    async def book(client, i):
+        date, slot_time = SLOTS[i % len(SLOTS)]
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/reservations",
+                json={"restaurant_id": restaurant_id, "date": date, "time": slot_time, "party_size": 1 + i % 4},
+                headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+            )
+            latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(book(client, i) for i in range(TOTAL_REQUESTS)))
+        elapsed = time.perf_counter() - started
+
+    booked = {}
+    async for reservation in server.db.reservations.find({"restaurant_id": restaurant_id}, {"_id": 0}):
+        key = (reservation['date'], reservation['time'])
+        booked[key] = booked.get(key, 0) + reservation['party_size']
+
+    latencies.sort()
+    return {
+        "requests": TOTAL_REQUESTS,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": TOTAL_REQUESTS / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "statuses": statuses,
+        "booked": booked,
+    }
+
+
+async def run_status_race(server):
+    import httpx
+
+    await server.ensure_indexes()
+    owner_id = str(uuid.uuid4())
+    restaurant_id = str(uuid.uuid4())
+    await server.db.restaurants.insert_one({
+        "restaurant_id": restaurant_id,
+        "owner_id": owner_id,
+        "name": "Status Race Bistro",
+        "seat_capacity": 4,
+        "slot_length_minutes": 60,
+    })
+    owner = {"Authorization": f"Bearer {server.create_token(owner_id, 'owner@test.com', 'restaurant')}"}
+    customer = {"Authorization": f"Bearer {server.create_token(str(uuid.uuid4()), 'guest@test.com', 'customer')}"}
+    slot = {"restaurant_id": restaurant_id, "date": "2030-02-01", "time": "19:00"}
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        first = (await client.post("/api/reservations", json={**slot, "party_size": 4}, headers=customer)).json()
+        url = f"/api/reservations/{first['reservation_id']}/status"
+        # Both cancellations read the same old status; only one may release the seats
+        cancels = await asyncio.gather(*(client.put(url, json={"status": "CANCELLED"}, headers=owner) for _ in range(10)))
+        second = await client.post("/api/reservations", json={**slot, "party_size": 4}, headers=customer)
+        # The slot is full again, so the first reservation cannot be re-confirmed
+        reconfirm = await client.put(url, json={"status": "CONFIRMED"}, headers=owner)
+
+    counter = await server.db.reservation_slots.find_one(slot, {"_id": 0, "booked": 1})
+    return {
+        "cancel_statuses": sorted(response.status_code for response in cancels),
+        "second_status": second.status_code,
+        "reconfirm_status": reconfirm.status_code,
+        "booked": counter['booked'],
+    }
+
+
+class TestReservationConcurrency:
+    """Booking correctness and latency under contention"""
+
+    def test_concurrent_bookings_never_exceed_capacity(self, server_module):
+        """Thousands of concurrent bookings against a handful of slots"""
+        report = asyncio.run(run_booking_storm(server_module))
+        print(
+            f"Reservation storm: {report['requests']} requests in {report['elapsed_seconds']:.2f}s "
+            f"({report['throughput_rps']:.0f} req/s), p50 {report['p50_ms']:.1f}ms, p99 {report['p99_ms']:.1f}ms, "
+            f"statuses {report['statuses']}, booked {report['booked']}"
+        )
+
+        assert set(report['statuses']) <= {200, 400}, f"Unexpected statuses: {report['statuses']}"
+        for slot, seats in report['booked'].items():
+            assert seats <= SEAT_CAPACITY, f"Slot {slot} overbooked: {seats} > {SEAT_CAPACITY}"
+        # Every slot is oversubscribed, so each should end up (nearly) full
+        for slot in SLOTS:
+            assert report['booked'].get(slot, 0) > SEAT_CAPACITY - 4
+
+    def test_concurrent_status_changes_keep_slot_counter(self, server_module):
+        """Racing status changes release seats once and re-claims respect capacity"""
+        report = asyncio.run(run_status_race(server_module))
+        assert report['cancel_statuses'].count(200) >= 1
+        assert set(report['cancel_statuses']) <= {200, 409}
+        assert report['second_status'] == 200
+        assert report['reconfirm_status'] == 409
+        assert report['booked'] == 4
@@ -0,0 +1,180 @@
+"""
+Unit tests for sales insight counters
+Tests: per-order increments, local-hour bucketing, cancellation reversal,
+menu-only item keys, hook failures, concurrent cancellations
+"""
+import asyncio
+import copy
+
+from sales_insights import SalesInsights, field_key
+
+ORDER = {
+    "restaurant_id": "r1",
+    "created_at": "2026-03-02T23:30:00+00:00",
+    "total_amount": 45.0,
+    "items": [
+        {"item_id": "i1", "name": "Dosa", "price": 10.0, "quantity": 2},
+        {"item_id": "i.2", "name": "Chai", "price": 5.0, "quantity": 1},
+        {"item_id": "i1", "name": "Dosa", "price": 10.0, "quantity": 2},
+    ],
+}
+MENU = ("i1", "i.2")
+
+
+class TestIncrements:
+    """One order becomes one $inc covering every item and demand cell"""
+
+    def test_items_and_totals(self):
+        inc = SalesInsights()._increments(ORDER, 1, MENU)
+        assert inc["orders"] == 1 and inc["revenue"] == 45.0
+        assert inc["items.i1.quantity"] == 4 and inc["items.i1.revenue"] == 40.0
+        # A repeated line counts the order once
+        assert inc["items.i1.orders"] == 1
+        assert inc["items.i%2E2.quantity"] == 1
+        assert inc["hours.23"] == 1 and inc["weekday_hours.0.23"] == 1
+        print(f"✓ {len(inc)} counters per order")
+
+    def test_utc_offset_shifts_local_hour(self):
+        inc = SalesInsights(utc_offset_minutes=330)._increments(ORDER, 1)
+        assert inc["hours.5"] == 1 and inc["weekday_hours.1.5"] == 1
+
+    def test_cancellation_is_exact_inverse(self):
+        insights = SalesInsights()
+        placed, cancelled = insights._increments(ORDER, 1, MENU), insights._increments(ORDER, -1, MENU)
+        assert all(placed[path] + cancelled[path] == 0 for path in placed)
+
+    def test_field_key_escapes_path_operators_reversibly(self):
+        assert field_key("a.b$c") == "a%2Eb%24c"
+        assert len({field_key("i.2"), field_key("i_2"), field_key("i%2E2")}) == 3
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeMenu:
+    def __init__(self, item_ids):
+        self.item_ids = item_ids
+
+    def find(self, query, projection=None):
+        wanted = query.get("item_id", {}).get("$in", self.item_ids)
+        return Cursor([{"item_id": item_id} for item_id in self.item_ids if item_id in wanted])
+
+
+class FakeInsights:
+    """One document per restaurant, updated with dotted $inc/$set paths"""
+
+    def __init__(self, fail=False):
+        self.docs = {}
+        self.fail = fail
+
+    async def update_one(self, query, update, upsert=False):
+        if self.fail:
+            raise RuntimeError("write failed")
+        doc = self.docs.setdefault(query["_id"], {})
+        for op, fields in update.items():
+            for path, value in fields.items():
+                node = doc
+                *parents, leaf = path.split(".")
+                assert all(parents) and leaf, f"invalid path {path}"
+                for part in parents:
+                    node = node.setdefault(part, {})
+                node[leaf] = node.get(leaf, 0) + value if op == "$inc" else value
+
+    async def find_one(self, query, projection=None):
+        doc = self.docs.get(query["_id"])
+        return copy.deepcopy(doc) if doc is not None else None
+
+
+class FakeOrders:
+    def __init__(self, orders):
+        self.docs = {order["order_id"]: order for order in orders}
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None):
+        # Let the other request run before this write; the write itself is atomic
+        await asyncio.sleep(0)
+        doc = self.docs.get(query["order_id"])
+        if doc is None:
+            return None
+        before = copy.deepcopy(doc)
+        doc.update(update["$set"])
+        return before
+
+
+class FakeDB:
+    def __init__(self, menu=MENU, fail=False, orders=()):
+        self.menu_items = FakeMenu(list(menu))
+        self.sales_insights = FakeInsights(fail)
+        self.orders = FakeOrders(orders)
+
+
+def placed(items):
+    return {**ORDER, "status": "PLACED", "items": items}
+
+
+class TestHooks:
+    """The live hooks key only on menu items and never fail the request"""
+
+    def test_unknown_and_empty_item_ids_are_skipped(self):
+        db = FakeDB()
+        order = placed([
+            {"item_id": "i1", "name": "Dosa", "price": 10.0, "quantity": 1},
+            {"item_id": "", "name": "Blank", "price": 1.0, "quantity": 1},
+            {"item_id": "made-up", "name": "Forged", "price": 1.0, "quantity": 1},
+        ])
+        asyncio.run(SalesInsights().order_created(db, order))
+
+        doc = db.sales_insights.docs["r1"]
+        assert set(doc["items"]) == {"i1"}
+        assert doc["orders"] == 1
+
+    def test_cancellation_reverses_only_counted_items(self):
+        async def scenario():
+            db = FakeDB(menu=("i1",))
+            insights = SalesInsights()
+            order = placed([
+                {"item_id": "i1", "name": "Dosa", "price": 10.0, "quantity": 2},
+                {"item_id": "made-up", "name": "Forged", "price": 1.0, "quantity": 1},
+            ])
+            await insights.order_created(db, order)
+            await insights.order_status_changed(db, order, "PLACED", "CANCELLED")
+            return db.sales_insights.docs["r1"]
+
+        doc = asyncio.run(scenario())
+        assert set(doc["items"]) == {"i1"}
+        assert doc["items"]["i1"]["quantity"] == 0 and doc["orders"] == 0
+
+    def test_failed_update_is_logged_not_raised(self):
+        asyncio.run(SalesInsights().order_created(FakeDB(fail=True), placed(ORDER["items"])))
+
+
+async def change_order_status(db, insights, order_id, status):
+    """Mirrors the order status routes: the delta comes from the status the write replaced"""
+    previous = await db.orders.find_one_and_update({"order_id": order_id}, {"$set": {"status": status}})
+    await insights.order_status_changed(db, previous, previous.get("status"), status)
+
+
+class TestConcurrentStatusChanges:
+    """Two cancellations of one order reverse its counters once"""
+
+    def test_double_cancel_moves_counters_once(self):
+        async def scenario():
+            order = {**placed(ORDER["items"]), "order_id": "o1"}
+            db = FakeDB(orders=[copy.deepcopy(order)])
+            insights = SalesInsights()
+            await insights.order_created(db, order)
+            await asyncio.gather(
+                change_order_status(db, insights, "o1", "CANCELLED"),
+                change_order_status(db, insights, "o1", "CANCELLED"),
+            )
+            return db.sales_insights.docs["r1"]
+
+        doc = asyncio.run(scenario())
+        assert doc["orders"] == 0 and doc["revenue"] == 0
+        assert doc["items"]["i1"] == {"quantity": 0, "revenue": 0, "orders": 0, "name": "Dosa"}
+        assert doc["hours"]["23"] == 0
+        print("✓ Second cancellation sees CANCELLED and applies no delta")
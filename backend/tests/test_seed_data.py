@@ -0,0 +1,71 @@
+"""
+Unit tests for the synthetic data generator helpers
+Tests: count_arg parsing, weighted picking, batching
+"""
+import os
+import random
+from collections import Counter
+
+import pytest
+
+# seed_data builds its (lazy) Motor client at import time
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'dinedash_test')
+
+from seed_data import WeightedPicker, batched, count_arg, zipf_weights
+
+
+class TestCountArg:
+    """Counts accept plain integers and scientific notation"""
+
+    def test_plain_and_scientific(self):
+        assert count_arg("1000") == 1000
+        assert count_arg("1e6") == 1000000
+        assert count_arg("2.5e3") == 2500
+
+    def test_rejects_garbage(self):
+        with pytest.raises(ValueError):
+            count_arg("lots")
+
+
+class TestWeightedPicker:
+    """Picks stay in range and follow the weights"""
+
+    def test_zero_weight_is_never_picked(self):
+        picker = WeightedPicker([1, 0, 1], random.Random(1))
+        picks = {picker.pick() for _ in range(1000)}
+        assert picks == {0, 2}
+
+    def test_follows_weights(self):
+        picker = WeightedPicker([3, 1], random.Random(7))
+        counts = Counter(picker.pick() for _ in range(20000))
+        assert 0.72 < counts[0] / 20000 < 0.78
+
+    def test_zipf_head_dominates(self):
+        picker = WeightedPicker(zipf_weights(100, 1.1), random.Random(3))
+        counts = Counter(picker.pick() for _ in range(10000))
+        assert counts[0] > counts[9] > counts[99]
+        assert set(counts) <= set(range(100))
+
+
+class TestBatched:
+    """Documents are grouped into full batches plus a remainder"""
+
+    def test_remainder_batch(self):
+        assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+
+    def test_exact_multiple_and_empty(self):
+        assert list(batched(range(4), 2)) == [[0, 1], [2, 3]]
+        assert list(batched([], 5)) == []
+
+    def test_consumes_generators_lazily(self):
+        consumed = []
+
+        def documents():
+            for i in range(10):
+                consumed.append(i)
+                yield i
+
+        first = next(batched(documents(), 4))
+        assert first == [0, 1, 2, 3]
+        assert consumed == [0, 1, 2, 3]
@@ -0,0 +1,81 @@
+"""
+Unit tests for single-flight request coalescing
+Tests: concurrent callers share one execution, errors propagate, keys are freed
+"""
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """Concurrent identical calls run once"""
+
+    def test_concurrent_callers_share_one_execution(self):
+        """Ten callers for one key trigger a single query"""
+        flight = SingleFlight("test")
+        runs = []
+
+        async def load():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return {"value": 42}
+
+        async def run():
+            return await asyncio.gather(*(flight.do("k", load) for _ in range(10)))
+
+        results = asyncio.run(run())
+        assert len(runs) == 1
+        assert all(result is results[0] for result in results)
+        stats = flight.stats()
+        assert stats["executions"] == 1 and stats["coalesced"] == 9 and stats["in_flight"] == 0
+        print(f"✓ Coalesced: {stats}")
+
+    def test_key_is_freed_after_completion(self):
+        """Nothing is cached; a later call runs again"""
+        flight = SingleFlight("test")
+        runs = []
+
+        async def load():
+            runs.append(1)
+            return len(runs)
+
+        async def run():
+            return [await flight.do("k", load), await flight.do("k", load)]
+
+        assert asyncio.run(run()) == [1, 2]
+
+    def test_errors_reach_every_waiter(self):
+        """A failing query fails every coalesced caller"""
+        flight = SingleFlight("test")
+
+        async def load():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def run():
+            return await asyncio.gather(*(flight.do("k", load) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.stats()["errors"] == 1
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        """A disconnecting client leaves the shared query running"""
+        flight = SingleFlight("test")
+
+        async def load():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        async def run():
+            first = asyncio.ensure_future(flight.do("k", load))
+            second = asyncio.ensure_future(flight.do("k", load))
+            await asyncio.sleep(0)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        assert asyncio.run(run()) == "done"
@@ -1,4 +1,8 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
+import axios from 'axios';
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
 
 const AuthContext = createContext();
 
@@ -25,11 +29,14 @@ export const AuthProvider = ({ children }) => {
     setLoading(false);
   }, []);
 
-  const login = (tokenData, userData) => {
+  const login = (tokenData, userData, refreshToken) => {
     setToken(tokenData);
     setUser(userData);
     localStorage.setItem('auth_token', tokenData);
     localStorage.setItem('auth_user', JSON.stringify(userData));
+    if (refreshToken) {
+      localStorage.setItem('auth_refresh_token', refreshToken);
+    }
   };
 
   const logout = () => {
@@ -37,8 +44,47 @@ export const AuthProvider = ({ children }) => {
     setUser(null);
     localStorage.removeItem('auth_token');
     localStorage.removeItem('auth_user');
+    localStorage.removeItem('auth_refresh_token');
   };
 
+  // Access tokens are short-lived: on a 401, trade the refresh token for a new one and retry once
+  useEffect(() => {
+    let refreshing = null;
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      async (error) => {
+        const original = error.config;
+        const refreshToken = localStorage.getItem('auth_refresh_token');
+        if (
+          error.response?.status !== 401 ||
+          !refreshToken ||
+          !original ||
+          original._retried ||
+          original.url?.endsWith('/auth/refresh')
+        ) {
+          return Promise.reject(error);
+        }
+
+        original._retried = true;
+        try {
+          refreshing = refreshing || axios.post(`${API}/auth/refresh`, { refresh_token: refreshToken });
+          const response = await refreshing;
+          const newToken = response.data.token;
+          setToken(newToken);
+          localStorage.setItem('auth_token', newToken);
+          original.headers = { ...original.headers, Authorization: `Bearer ${newToken}` };
+          return axios(original);
+        } catch (refreshError) {
+          logout();
+          return Promise.reject(error);
+        } finally {
+          refreshing = null;
+        }
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   const value = {
     user,
     token,
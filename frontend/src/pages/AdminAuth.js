@@ -36,7 +36,7 @@ const AdminAuth = () => {
         email: response.data.email,
         name: response.data.name,
         role: response.data.role
-      });
+      }, response.data.refresh_token);
 
       toast.success('Welcome, Admin!');
       navigate('/admin');
@@ -37,7 +37,7 @@ const CustomerAuth = () => {
         email: response.data.email,
         name: response.data.name,
         role: response.data.role
-      });
+      }, response.data.refresh_token);
       
       toast.success(isLogin ? 'Login successful!' : 'Account created successfully!');
       navigate('/');
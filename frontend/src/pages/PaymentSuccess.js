@@ -36,13 +36,15 @@ const PaymentSuccess = () => {
 
   const checkPaymentStatus = async (sessionId) => {
     let attempts = 0;
-    const maxAttempts = 10;
-    const pollInterval = 2000;
+    const maxAttempts = 4;
+    const pollInterval = 1000;
 
     const poll = async () => {
       try {
+        // The server holds the request open (up to `wait` seconds) until the payment settles
         const response = await axios.get(`${API}/payments/status/${sessionId}`, {
-          headers: { Authorization: `Bearer ${token}` }
+          headers: { Authorization: `Bearer ${token}` },
+          params: { wait: 15 }
         });
         
         console.log('Payment status response:', response.data);
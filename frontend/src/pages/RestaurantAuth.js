@@ -53,7 +53,7 @@ const RestaurantAuth = () => {
           email: response.data.email,
           name: response.data.name,
           role: response.data.role
-        });
+        }, response.data.refresh_token);
         toast.success('Login successful!');
         navigate('/restaurant-dashboard');
       } else {
@@ -89,7 +89,7 @@ const RestaurantAuth = () => {
         email: authData.email,
         name: authData.name,
         role: authData.role
-      });
+      }, authData.refresh_token);
       
       toast.success('Restaurant profile created successfully!');
       navigate('/restaurant-dashboard');